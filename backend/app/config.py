@@ -8,6 +8,82 @@ class Settings(BaseSettings):
     supabase_url: str = ""
     supabase_key: str = ""
 
+    # Media serving: when set, /media responses carry only headers and the
+    # front proxy streams the file from this internal location.
+    media_accel_redirect_prefix: str = ""
+    media_accel_redirect_header: str = "X-Accel-Redirect"
+
+    # Object storage: "local" (backend/media) or "s3" (any S3-compatible
+    # endpoint; run local_s3.py for a development stand-in)
+    storage_backend: str = "local"
+    s3_bucket: str = "gpt-bhojan"
+    s3_endpoint_url: str = ""
+    s3_region: str = "us-east-1"
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    s3_public_base_url: str = ""
+    s3_presign_expiry_s: int = 3600
+    s3_max_pool_connections: int = 32
+    s3_multipart_threshold_mb: int = 8
+    s3_max_concurrency: int = 8
+
+    # Originals uploaded directly to storage via presigned URLs
+    upload_presign_expiry_s: int = 900
+    max_upload_mb: int = 25
+    # Resumable chunked uploads are dropped after this long without progress
+    upload_expiry_s: int = 24 * 3600
+    # Progressive analysis sessions (preview first, original later)
+    progressive_session_ttl_s: int = 600
+
+    # Post-response persistence stage (see app/services/persistence.py)
+    persistence_queue_size: int = 256
+    persistence_workers: int = 2
+    persistence_max_attempts: int = 5
+    persistence_spool_dir: str = ""
+
+    # Label merges learned by the pipeline (JSON); empty means
+    # backend/label_merges.json
+    label_merges_path: str = ""
+
+    # Plate analysis detail when the client sends no X-Analysis-Detail:
+    # "full" or "compact" (short fields, no prose, output capped at
+    # compact_analysis_max_tokens); see app/services/gpt_service.py
+    analysis_detail: str = "full"
+    compact_analysis_max_tokens: int = 500
+    # How detection waits on the plate analysis: "wait" (for the whole
+    # reply), "stream" (stream it and start on the completed items list) or
+    # "split" (a short items-only call, capped at items_call_max_tokens,
+    # runs alongside the full one); see app/services/pipeline.py
+    analysis_handoff: str = "wait"
+    items_call_max_tokens: int = 200
+    # Analyses expected in flight at once (sync routes run on Starlette's
+    # 40-thread pool); sizes the threads the stream and split hand-offs
+    # make their GPT calls on
+    analysis_concurrency: int = 40
+
+    # Pipeline mode: "two_call" (GPT classifies box crops, then checks masked
+    # crops) or "fused" (one batched GPT call names and checks masked crops);
+    # see app/services/pipeline.py
+    pipeline_mode: str = "two_call"
+
+    # Mask-quality gate for the GPT crop check (app/services/mask_quality.py):
+    # calibration written by calibrate_mask_quality.py, the JSONL log of GPT
+    # verdicts it reads, and the share of confidently scored items checked
+    # by GPT anyway so the log spans all scores.  Empty paths mean backend/.
+    mask_quality_calibration_path: str = ""
+    mask_quality_log_path: str = ""
+    mask_quality_sample_rate: float = 0.05
+
+    # Meal log database: postgresql://… (asyncpg pool) or sqlite:///path;
+    # empty means sqlite at backend/bhojan.sqlite3
+    database_url: str = ""
+    db_pool_min: int = 1
+    db_pool_max: int = 10
+    # Until auth lands, requests without an X-User-Id header belong to this user
+    default_user_id: str = "local"
+    # Timezone for requests without an X-Timezone header (local-day rollups)
+    default_timezone: str = "UTC"
+
     model_config = {
         "env_file": str(Path(__file__).resolve().parent.parent.parent / ".env"),
         "env_file_encoding": "utf-8",
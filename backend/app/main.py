@@ -1,19 +1,27 @@
+import asyncio
 from contextlib import asynccontextmanager
-from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from app.config import settings  # noqa: F401 — validates env on startup
-from app.routers import health, analyze, meals, food_items
+from app.routers import health, analyze, meals, food_items, media, uploads, dashboard
+from app.services import db, persistence, resumable_uploads
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: config is already validated by importing settings
+    # Startup: config is already validated by importing settings.
+    # The database comes first: spooled jobs replayed by the persistence
+    # stage may be meal inserts.
+    await db.connect()
+    persistence.start()
+    resumable_uploads.sweep_expired()
     yield
-    # Shutdown: nothing to clean up yet
+    # Shutdown: finish (or spool) writes still in flight.  Off the event
+    # loop, because meal inserts on the workers need the loop to complete.
+    await asyncio.to_thread(persistence.stop)
+    await db.close()
 
 
 app = FastAPI(
@@ -39,8 +47,8 @@ app.include_router(health.router)
 app.include_router(analyze.router)
 app.include_router(meals.router)
 app.include_router(food_items.router)
+app.include_router(uploads.router)
+app.include_router(dashboard.router)
 
-# Serve saved visualizations and crops
-media_dir = Path(__file__).resolve().parent.parent / "media"
-media_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/media", StaticFiles(directory=str(media_dir)), name="media")
+# Serve saved visualizations and crops (content-hash URLs, ETags, ranges)
+app.include_router(media.router)
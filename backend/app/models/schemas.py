@@ -0,0 +1,242 @@
+from datetime import date, datetime
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class HealthResponse(BaseModel):
+    status: str
+    openai: bool
+    replicate: bool
+
+
+class FoodAnalysis(BaseModel):
+    description: str = ""
+    items: str = ""
+    calories: str = ""
+    total_calories: str = ""
+    health_score: str = ""
+    rationale: str = ""
+    macronutrient_estimate: str = ""
+    eat_frequency: str = ""
+    ideal_comparison: str = ""
+    mood_impact: str = ""
+    satiety_score: str = ""
+    bloat_score: str = ""
+    tasty_score: str = ""
+    addiction_score: str = ""
+    summary: str = ""
+
+
+class EatFrequency(str, Enum):
+    daily = "daily"
+    occasional = "occasional"
+    rare = "rare"
+
+
+class MealMetrics(BaseModel):
+    """The analysis's numbers, typed: read off the structured reply
+    (app.utils.parsing.structured_metrics), or parsed out of the text for
+    legacy meals."""
+
+    total_calories: int | None = None
+    health_score: float | None = None
+    satiety_score: float | None = None
+    bloat_score: float | None = None
+    tasty_score: float | None = None
+    addiction_score: float | None = None
+    protein_g: float | None = None
+    fat_g: float | None = None
+    carbs_g: float | None = None
+    eat_frequency: EatFrequency | None = None
+
+
+class Detection(BaseModel):
+    bbox: list[float]
+    label: str
+    confidence: float
+
+
+class DetectionResult(BaseModel):
+    detections: list[Detection] = Field(default_factory=list)
+
+
+class SegmentedFoodItem(BaseModel):
+    label: str
+    crop_url: str
+    confidence: float = 1.0
+
+
+class SegmentationResult(BaseModel):
+    segmented_items: list[SegmentedFoodItem] = Field(default_factory=list)
+    visualization_url: str | None = None
+    item_count: int = 0
+
+
+class AnalyzeResponse(BaseModel):
+    analysis: FoodAnalysis
+    metrics: MealMetrics = Field(default_factory=MealMetrics)
+    detections: DetectionResult = Field(default_factory=DetectionResult)
+    segmentation: SegmentationResult = Field(default_factory=SegmentationResult)
+    timing: dict[str, float | str] = Field(default_factory=dict)
+    # Set once the result has been queued for the meal log
+    meal_id: str | None = None
+
+
+class FoodItemRecord(BaseModel):
+    id: str
+    meal_id: str | None = None
+    label: str = ""
+    crop_url: str | None = None
+    confidence: float = 1.0
+    liked: bool = False
+    created_at: datetime | None = None
+
+
+class FoodStats(BaseModel):
+    label: str  # canonical label
+    meals: int
+    first_seen: datetime | None = None
+    last_seen: datetime | None = None
+    last_7_days: int = 0
+    last_30_days: int = 0
+    health_mean: float | None = None
+    liked: bool = False
+
+
+class FoodSearchHit(BaseModel):
+    label: str  # canonical label
+    variants: list[str] = Field(default_factory=list)  # most common raw labels
+    items: int
+    score: float
+
+
+class MealRecord(BaseModel):
+    id: str
+    timestamp: datetime | None = None
+    image_url: str | None = None
+    health_score: float | None = None
+    metrics: MealMetrics | None = None
+    analysis: FoodAnalysis | None = None
+    segmentation: SegmentationResult | None = None
+    items: list[FoodItemRecord] = Field(default_factory=list)
+
+
+class MealPage(BaseModel):
+    meals: list[MealRecord] = Field(default_factory=list)
+    # Pass back as ?cursor= for the next page; None on the last page
+    next_cursor: str | None = None
+
+
+class MealSearchHit(BaseModel):
+    id: str
+    timestamp: datetime
+    health_score: float | None = None
+    description: str = ""
+    snippet: str = ""  # matched text, terms wrapped in <mark>…</mark>
+    rank: float
+
+
+class TrendPoint(BaseModel):
+    start: date  # the day, or the Monday of the ISO week
+    meal_count: int
+    health_mean: float | None = None
+    health_min: float | None = None
+    health_max: float | None = None
+    calories_total: int = 0
+    satiety_mean: float | None = None
+    bloat_mean: float | None = None
+
+
+class TrendsResponse(BaseModel):
+    period: str
+    points: list[TrendPoint] = Field(default_factory=list)
+
+
+class StreakStatus(BaseModel):
+    rule: str
+    name: str
+    unit: str  # "day" or "meal"
+    target: int
+    current: int
+    best: int
+    last_day: date | None = None
+    achieved: bool = False
+
+
+class StreaksResponse(BaseModel):
+    streaks: list[StreakStatus] = Field(default_factory=list)
+
+
+class EarnedBadge(BaseModel):
+    key: str
+    name: str
+    description: str
+    earned_at: datetime
+
+
+class BadgesResponse(BaseModel):
+    earned: list[EarnedBadge] = Field(default_factory=list)
+    available: int = 0
+
+
+class MealCluster(BaseModel):
+    label: str  # breakfast, lunch, snack, dinner or late night
+    center: str  # local "HH:MM"
+    center_minute: int
+    meals: int
+    share: float
+    spread_minutes: float
+
+
+class MealTimingResponse(BaseModel):
+    meal_count: int = 0
+    days: int = 0
+    meals_per_day: float | None = None
+    clusters: list[MealCluster] = Field(default_factory=list)
+    regularity: float | None = None  # 0–1, 1 = same times every day
+    median_gap_hours: float | None = None
+    longest_gap_hours: float | None = None
+    overnight_fast_hours: float | None = None
+    late_night_share: float | None = None
+    late_night_days_recent: int = 0
+    late_night_days_share: float | None = None
+    late_night_flag: bool = False
+
+
+class LikeRequest(BaseModel):
+    # Omitted → toggle the current value
+    liked: bool | None = None
+
+
+class PresignUploadRequest(BaseModel):
+    content_type: str = "image/jpeg"
+
+
+class PresignUploadResponse(BaseModel):
+    key: str
+    url: str
+    method: str = "PUT"
+    headers: dict[str, str] = Field(default_factory=dict)
+    expires_in: int
+
+
+class AnalyzeObjectRequest(BaseModel):
+    key: str
+
+
+class CreateUploadRequest(BaseModel):
+    size: int = Field(gt=0)
+    content_type: str = "image/jpeg"
+
+
+class UploadStatus(BaseModel):
+    id: str
+    offset: int
+    size: int
+    expires_at: float
+
+
+class AnalyzeSessionResponse(BaseModel):
+    session_id: str
+    expires_in: int
@@ -1,15 +1,23 @@
 import asyncio
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 
-from app.models.schemas import AnalyzeResponse
+from app.config import settings
+from app.models.schemas import (
+    AnalyzeObjectRequest,
+    AnalyzeResponse,
+    AnalyzeSessionResponse,
+)
+from app.routers.deps import get_analysis_detail, get_timezone, get_user_id
+from app.services import progressive, repository
 from app.services.pipeline import run_pipeline
+from app.services.storage import get_storage
+from app.services.uploads import fetch_normalized, is_original_key, max_upload_bytes
 
 router = APIRouter(prefix="/api", tags=["analyze"])
 
 
-@router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_food(file: UploadFile = File(...)):
+async def _read_image(file: UploadFile) -> bytes:
     if file.content_type not in ("image/jpeg", "image/png", "image/webp"):
         raise HTTPException(
             status_code=400,
@@ -19,6 +27,90 @@ async def analyze_food(file: UploadFile = File(...)):
     image_bytes = await file.read()
     if len(image_bytes) == 0:
         raise HTTPException(status_code=400, detail="Empty file uploaded.")
+    return image_bytes
+
+
+@router.post("/analyze", response_model=AnalyzeResponse)
+async def analyze_food(
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_user_id),
+    tz: str = Depends(get_timezone),
+    detail: str = Depends(get_analysis_detail),
+):
+    image_bytes = await _read_image(file)
+
+    result = await asyncio.to_thread(run_pipeline, image_bytes, detail=detail)
+    result.meal_id = await asyncio.to_thread(
+        repository.record_meal, result, user_id, tz, image_bytes=image_bytes
+    )
+    return result
+
+
+@router.post("/analyze/sessions", response_model=AnalyzeSessionResponse, status_code=202)
+async def start_progressive_analysis(
+    preview: UploadFile = File(...),
+    detail: str = Depends(get_analysis_detail),
+):
+    """Start GPT analysis on a small preview while the original uploads."""
+    preview_bytes = await _read_image(preview)
+
+    session_id = await asyncio.to_thread(progressive.start_session, preview_bytes, detail)
+    return AnalyzeSessionResponse(
+        session_id=session_id,
+        expires_in=settings.progressive_session_ttl_s,
+    )
+
+
+@router.post("/analyze/sessions/{session_id}/original", response_model=AnalyzeResponse)
+async def complete_progressive_analysis(
+    session_id: str,
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_user_id),
+    tz: str = Depends(get_timezone),
+):
+    """Finish a session: crops and segmentation run on the full-resolution original."""
+    image_bytes = await _read_image(file)
+
+    try:
+        result = await asyncio.to_thread(
+            progressive.complete_session, session_id, image_bytes
+        )
+    except progressive.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Analysis session not found or expired.")
+    result.meal_id = await asyncio.to_thread(
+        repository.record_meal, result, user_id, tz, image_bytes=image_bytes
+    )
+    return result
+
+
+@router.post("/analyze/object", response_model=AnalyzeResponse)
+async def analyze_uploaded_object(
+    body: AnalyzeObjectRequest,
+    user_id: str = Depends(get_user_id),
+    tz: str = Depends(get_timezone),
+    detail: str = Depends(get_analysis_detail),
+):
+    """Analyze an original the client uploaded directly to storage."""
+    if not is_original_key(body.key):
+        raise HTTPException(status_code=400, detail="Unknown upload key.")
+
+    try:
+        size = await asyncio.to_thread(get_storage().size, body.key)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded.")
+    if size > max_upload_bytes():
+        raise HTTPException(status_code=413, detail="Image is too large.")
+
+    try:
+        image_bytes = await asyncio.to_thread(fetch_normalized, body.key)
+    except OSError:
+        raise HTTPException(status_code=400, detail="Upload is not a readable image.")
 
-    result = await asyncio.to_thread(run_pipeline, image_bytes)
+    result = await asyncio.to_thread(run_pipeline, image_bytes, detail=detail)
+    # The original is already in storage; the meal links to it there
+    result.meal_id = await asyncio.to_thread(
+        repository.record_meal, result, user_id, tz, image_url=f"/media/{body.key}"
+    )
     return result
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.models.schemas import (
+    BadgesResponse,
+    EarnedBadge,
+    MealTimingResponse,
+    StreaksResponse,
+    StreakStatus,
+    TrendPoint,
+    TrendsResponse,
+)
+from app.routers.deps import get_today, get_user_id
+from app.services import badges, db, meal_timing, rollups, streaks
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+
+MAX_TREND_DAYS = 3 * 366
+
+
+def _mean(total: float, count: int) -> float | None:
+    return round(total / count, 2) if count else None
+
+
+@router.get("/trends", response_model=TrendsResponse)
+async def get_trends(
+    period: Literal["day", "week"] = "week",
+    since: date | None = None,
+    until: date | None = None,
+    user_id: str = Depends(get_user_id),
+    today: date = Depends(get_today),
+):
+    """Health trend points from the rollup tables; defaults to the last 12 weeks / 30 days."""
+    until = until or today
+    since = since or until - timedelta(weeks=12 if period == "week" else 30)
+    if since > until or (until - since).days > MAX_TREND_DAYS:
+        raise HTTPException(status_code=400, detail="Invalid date range.")
+
+    async with db.get_db().acquire() as conn:
+        rows = await rollups.trends(conn, user_id, period, since, until)
+    return TrendsResponse(
+        period=period,
+        points=[
+            TrendPoint(
+                start=row["start"],
+                meal_count=row["meal_count"],
+                health_mean=_mean(row["health_sum"], row["health_count"]),
+                health_min=row["health_min"],
+                health_max=row["health_max"],
+                calories_total=row["calories_sum"],
+                satiety_mean=_mean(row["satiety_sum"], row["satiety_count"]),
+                bloat_mean=_mean(row["bloat_sum"], row["bloat_count"]),
+            )
+            for row in rows
+        ],
+    )
+
+
+@router.get("/streaks", response_model=StreaksResponse)
+async def get_streaks(
+    user_id: str = Depends(get_user_id),
+    today: date = Depends(get_today),
+):
+    """Current and best run of every streak rule; day runs lapse after the user's midnight."""
+    async with db.get_db().acquire() as conn:
+        rows = await streaks.get_streaks(conn, user_id, today)
+    return StreaksResponse(streaks=[StreakStatus(**row) for row in rows])
+
+
+@router.get("/badges", response_model=BadgesResponse)
+async def get_badges(user_id: str = Depends(get_user_id)):
+    """Earned badges, most recent first, out of the whole catalogue."""
+    async with db.get_db().acquire() as conn:
+        rows = await badges.get_badges(conn, user_id)
+    return BadgesResponse(earned=[EarnedBadge(**row) for row in rows], available=len(badges.BADGES))
+
+
+@router.get("/meal-timing", response_model=MealTimingResponse)
+async def get_meal_timing(
+    user_id: str = Depends(get_user_id),
+    today: date = Depends(get_today),
+):
+    """When meals happen: time-of-day clusters, regularity, gaps and late-night eating."""
+    async with db.get_db().acquire() as conn:
+        result = await meal_timing.get_meal_timing(conn, user_id, today)
+    return MealTimingResponse(**result)
@@ -0,0 +1,34 @@
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import Depends, Header, HTTPException
+
+from app.config import settings
+from app.services.gpt_service import ANALYSIS_DETAILS
+
+
+async def get_user_id(x_user_id: str | None = Header(default=None)) -> str:
+    return x_user_id or settings.default_user_id
+
+
+async def get_timezone(x_timezone: str | None = Header(default=None)) -> str:
+    """The client's IANA timezone (e.g. ``Asia/Kolkata``), for local-day bucketing."""
+    tz = x_timezone or settings.default_timezone
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+    return tz
+
+
+async def get_analysis_detail(x_analysis_detail: str | None = Header(default=None)) -> str:
+    """How much of the plate analysis to generate: ``full`` or ``compact`` (scores, no prose)."""
+    detail = x_analysis_detail or settings.analysis_detail
+    if detail not in ANALYSIS_DETAILS:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis detail: {detail}")
+    return detail
+
+
+async def get_today(tz: str = Depends(get_timezone)) -> date:
+    """Today's date in the client's timezone."""
+    return datetime.now(timezone.utc).astimezone(ZoneInfo(tz)).date()
@@ -1,20 +1,84 @@
-from fastapi import APIRouter
+from datetime import date
+from typing import Literal
 
-from app.models.schemas import FoodItemRecord
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.models.schemas import FoodItemRecord, FoodSearchHit, FoodStats, LikeRequest
+from app.routers.deps import get_today, get_user_id
+from app.services import db, food_stats, label_search, repository
 
 router = APIRouter(prefix="/api", tags=["food-items"])
 
 
 @router.get("/food-items", response_model=list[FoodItemRecord])
-async def list_food_items():
-    return []
+async def list_food_items(
+    liked: bool | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_user_id),
+):
+    return await repository.list_food_items(user_id, liked=liked, limit=limit)
+
+
+@router.get("/food-items/search", response_model=list[FoodSearchHit])
+async def search_food_items(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    user_id: str = Depends(get_user_id),
+):
+    """Typo-tolerant label search, best match first."""
+    return await label_search.search(user_id, q, limit)
+
+
+@router.get("/food-items/search/autocomplete", response_model=list[FoodSearchHit])
+async def autocomplete_food_items(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    user_id: str = Depends(get_user_id),
+):
+    """Labels with a word starting with ``prefix``, most eaten first."""
+    return await label_search.complete(user_id, prefix, limit)
+
+
+@router.get("/food-items/library", response_model=list[FoodStats])
+async def food_library(
+    sort: Literal["frequent", "recent"] = "frequent",
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_user_id),
+    today: date = Depends(get_today),
+):
+    """One entry per food eaten, with how often and how recently, from the food_stats index."""
+    async with db.get_db().acquire() as conn:
+        return await food_stats.library(conn, user_id, today, sort=sort, limit=limit)
+
+
+@router.get("/food-items/library/{label}", response_model=FoodStats)
+async def food_library_entry(
+    label: str,
+    user_id: str = Depends(get_user_id),
+    today: date = Depends(get_today),
+):
+    async with db.get_db().acquire() as conn:
+        stats = await food_stats.get_stats(conn, user_id, label, today)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Food not in library.")
+    return stats
 
 
 @router.get("/food-items/{item_id}", response_model=FoodItemRecord)
-async def get_food_item(item_id: str):
-    return FoodItemRecord(id=item_id)
+async def get_food_item(item_id: str, user_id: str = Depends(get_user_id)):
+    item = await repository.get_food_item(user_id, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Food item not found.")
+    return item
 
 
-@router.patch("/food-items/{item_id}/like")
-async def toggle_like(item_id: str):
-    return {"id": item_id, "liked": True}
+@router.patch("/food-items/{item_id}/like", response_model=FoodItemRecord)
+async def toggle_like(
+    item_id: str,
+    body: LikeRequest | None = None,
+    user_id: str = Depends(get_user_id),
+):
+    item = await repository.set_liked(user_id, item_id, body.liked if body else None)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Food item not found.")
+    return item
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from app.models.schemas import HealthResponse
+from app.services import metrics
 from app.services.gpt_service import check_api_key
 from app.services.detection import check_replicate_token
 
@@ -14,3 +15,8 @@ async def health_check():
         openai=check_api_key(),
         replicate=check_replicate_token(),
     )
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
@@ -1,20 +1,74 @@
-from fastapi import APIRouter
+from datetime import datetime
 
-from app.models.schemas import MealRecord
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.models.schemas import MealPage, MealRecord, MealSearchHit
+from app.routers.deps import get_user_id
+from app.services import meal_search, repository
 
 router = APIRouter(prefix="/api", tags=["meals"])
 
 
-@router.get("/meals", response_model=list[MealRecord])
-async def list_meals():
-    return []
+@router.get("/meals", response_model=MealPage)
+async def list_meals(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    min_score: float | None = Query(None, ge=0, le=10),
+    max_score: float | None = Query(None, ge=0, le=10),
+    label: str | None = None,
+    user_id: str = Depends(get_user_id),
+):
+    try:
+        meals, next_cursor = await repository.list_meals(
+            user_id,
+            limit=limit,
+            cursor=cursor,
+            since=since,
+            until=until,
+            min_score=min_score,
+            max_score=max_score,
+            label=label,
+        )
+    except repository.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return MealPage(meals=meals, next_cursor=next_cursor)
+
+
+@router.get("/meals/search", response_model=list[MealSearchHit])
+async def search_meals(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    min_score: float | None = Query(None, ge=0, le=10),
+    max_score: float | None = Query(None, ge=0, le=10),
+    user_id: str = Depends(get_user_id),
+):
+    """Full-text search over meal analyses, best match first, with highlighted snippets."""
+    hits = await meal_search.search(
+        user_id,
+        q,
+        limit=limit,
+        since=since,
+        until=until,
+        min_score=min_score,
+        max_score=max_score,
+    )
+    return [MealSearchHit(timestamp=hit.pop("logged_at"), **hit) for hit in hits]
 
 
 @router.get("/meals/{meal_id}", response_model=MealRecord)
-async def get_meal(meal_id: str):
-    return MealRecord(id=meal_id)
+async def get_meal(meal_id: str, user_id: str = Depends(get_user_id)):
+    meal = await repository.get_meal(user_id, meal_id)
+    if meal is None:
+        raise HTTPException(status_code=404, detail="Meal not found.")
+    return meal
 
 
 @router.delete("/meals/{meal_id}")
-async def delete_meal(meal_id: str):
+async def delete_meal(meal_id: str, user_id: str = Depends(get_user_id)):
+    if not await repository.delete_meal(user_id, meal_id):
+        raise HTTPException(status_code=404, detail="Meal not found.")
     return {"deleted": meal_id}
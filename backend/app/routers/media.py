@@ -0,0 +1,229 @@
+"""Media serving for saved visualizations and crops.
+
+Files written by ``image_store`` are named by the SHA-256 of their bytes,
+so a URL never changes meaning: those responses are marked immutable and
+carry the digest as a strong ETag.  Conditional GETs are answered with 304
+and single byte ranges with 206.  When ``media_accel_redirect_prefix`` is
+set the byte transfer is handed to the front proxy instead.  With a
+remote storage backend the client is redirected to the object's URL.
+
+A URL can be handed out before its write has finished (see
+``app.services.persistence``); in that window the bytes are served from
+memory.
+"""
+
+import mimetypes
+import re
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+
+from app.config import settings
+from app.services.image_store import MEDIA_DIR, pending_bytes
+from app.services.storage import LocalStorage, StorageBackend, get_storage
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# Presigned redirect targets expire, so the redirect itself is short-lived
+REDIRECT_CACHE_CONTROL = "private, max-age=300"
+CHUNK_SIZE = 64 * 1024
+
+_CONTENT_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _resolve(path: str) -> Path:
+    """Map a URL path onto a file inside MEDIA_DIR, rejecting traversal."""
+    root = MEDIA_DIR.resolve()
+    target = (root / path).resolve()
+    if not target.is_relative_to(root) or not target.is_file():
+        raise HTTPException(status_code=404, detail="Not found")
+    if any(part.startswith(".") for part in target.relative_to(root).parts):
+        raise HTTPException(status_code=404, detail="Not found")
+    return target
+
+
+def _is_content_addressed(path: Path) -> bool:
+    return bool(_CONTENT_HASH_RE.match(path.stem))
+
+
+def _etag(path: Path, size: int, mtime_ns: int) -> str:
+    if _is_content_addressed(path):
+        return f'"{path.stem}"'
+    # Legacy uuid-named files: the (size, mtime) pair changes whenever the
+    # bytes do, which is all a validator needs.
+    return f'"{size:x}-{mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, per RFC 9110 section 13.1.2)."""
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None for headers we choose to ignore (multi-range, other units),
+    in which case the full body is sent.  Raises 416 for unsatisfiable ranges.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise _range_not_satisfiable(size)
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise _range_not_satisfiable(size)
+    return start, min(end, size - 1)
+
+
+def _range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+def _iter_file(path: Path, start: int, length: int):
+    with path.open("rb") as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and _etag_matches(if_none_match, etag)
+
+
+def _send(request: Request, headers: dict, size: int, media_type: str, read) -> Response:
+    """200, 206 or HEAD response for ``size`` bytes, honouring Range / If-Range.
+
+    ``read(start, length)`` yields the body's chunks.
+    """
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range.strip() == headers["ETag"]:
+            byte_range = _parse_range(range_header, size)
+
+    if byte_range is None:
+        start, length, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    return StreamingResponse(
+        read(start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+def _serve_pending(path: str, request: Request) -> Response:
+    """Bytes whose write is still queued, served as the stored file will be."""
+    digest = Path(path).stem
+    data = pending_bytes(digest) if _CONTENT_HASH_RE.match(digest) else None
+    if data is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return _send(
+        request, headers, len(data), media_type, lambda start, length: iter([data[start:start + length]])
+    )
+
+
+def _serve_remote(path: str, storage: StorageBackend, request: Request) -> Response:
+    if any(part.startswith(".") for part in Path(path).parts):
+        raise HTTPException(status_code=404, detail="Not found")
+    digest = Path(path).stem
+    if _CONTENT_HASH_RE.match(digest) and pending_bytes(digest) is not None:
+        return _serve_pending(path, request)
+    url = storage.public_url(path)
+    if url is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    stable = settings.s3_public_base_url and _CONTENT_HASH_RE.match(digest)
+    return RedirectResponse(
+        url,
+        status_code=307,
+        headers={
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if stable else REDIRECT_CACHE_CONTROL
+        },
+    )
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_media(path: str, request: Request):
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        return _serve_remote(path, storage, request)
+
+    try:
+        target = _resolve(path)
+    except HTTPException:
+        return _serve_pending(path, request)
+    stat = target.stat()
+    size = stat.st_size
+    etag = _etag(target, size, stat.st_mtime_ns)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            IMMUTABLE_CACHE_CONTROL
+            if _is_content_addressed(target)
+            else REVALIDATE_CACHE_CONTROL
+        ),
+        "Accept-Ranges": "bytes",
+    }
+    media_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.media_accel_redirect_prefix:
+        # The proxy reads the file itself (and handles Range); we only
+        # decide whether the client may have it and how it is cached.
+        prefix = settings.media_accel_redirect_prefix.rstrip("/")
+        relative = target.relative_to(MEDIA_DIR.resolve()).as_posix()
+        headers[settings.media_accel_redirect_header] = f"{prefix}/{relative}"
+        return Response(headers=headers, media_type=media_type)
+
+    return _send(
+        request, headers, size, media_type, lambda start, length: _iter_file(target, start, length)
+    )
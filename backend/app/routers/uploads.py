@@ -0,0 +1,142 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+
+from app.config import settings
+from app.models.schemas import (
+    AnalyzeResponse,
+    CreateUploadRequest,
+    PresignUploadRequest,
+    PresignUploadResponse,
+    UploadStatus,
+)
+from app.routers.deps import get_analysis_detail, get_timezone, get_user_id
+from app.services import repository, resumable_uploads
+from app.services.pipeline import run_pipeline
+from app.services.uploads import CONTENT_TYPE_EXTENSIONS, presign_original_upload
+
+router = APIRouter(prefix="/api/uploads", tags=["uploads"])
+
+
+def _check_content_type(content_type: str) -> None:
+    if content_type not in CONTENT_TYPE_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported image type: {content_type}. Use JPEG, PNG, or WebP.",
+        )
+
+
+def _upload_headers(state: resumable_uploads.UploadState) -> dict[str, str]:
+    return {
+        "Upload-Offset": str(state.offset),
+        "Upload-Length": str(state.size),
+        "Upload-Expires": str(int(state.expires_at)),
+        "Cache-Control": "no-store",
+    }
+
+
+def _status(state: resumable_uploads.UploadState) -> UploadStatus:
+    return UploadStatus(
+        id=state.id, offset=state.offset, size=state.size, expires_at=state.expires_at
+    )
+
+
+@router.post("/presign", response_model=PresignUploadResponse)
+async def presign_upload(body: PresignUploadRequest):
+    _check_content_type(body.content_type)
+
+    presigned = presign_original_upload(body.content_type)
+    if presigned is None:
+        raise HTTPException(
+            status_code=501,
+            detail="Direct uploads need an object-storage backend (STORAGE_BACKEND=s3).",
+        )
+
+    key, url = presigned
+    return PresignUploadResponse(
+        key=key,
+        url=url,
+        headers={"Content-Type": body.content_type},
+        expires_in=settings.upload_presign_expiry_s,
+    )
+
+
+# ── Resumable chunked uploads ───────────────────────────────────────
+
+
+@router.post("", status_code=201, response_model=UploadStatus)
+async def create_upload(body: CreateUploadRequest, response: Response):
+    _check_content_type(body.content_type)
+    try:
+        state = await asyncio.to_thread(
+            resumable_uploads.create_upload, body.size, body.content_type
+        )
+    except resumable_uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Image is too large.")
+    response.headers["Location"] = f"{router.prefix}/{state.id}"
+    response.headers.update(_upload_headers(state))
+    return _status(state)
+
+
+@router.head("/{upload_id}")
+async def upload_offset(upload_id: str):
+    try:
+        state = resumable_uploads.get_upload(upload_id)
+    except resumable_uploads.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found or expired.")
+    return Response(status_code=200, headers=_upload_headers(state))
+
+
+@router.patch("/{upload_id}", status_code=204)
+async def append_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+):
+    try:
+        state = await resumable_uploads.append_chunk(
+            upload_id, upload_offset, request.stream()
+        )
+    except resumable_uploads.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found or expired.")
+    except resumable_uploads.OffsetMismatch as exc:
+        raise HTTPException(
+            status_code=409,
+            detail=str(exc),
+            headers={"Upload-Offset": str(exc.offset)},
+        )
+    except resumable_uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Chunk runs past the declared size.")
+    return Response(status_code=204, headers=_upload_headers(state))
+
+
+@router.post("/{upload_id}/finalize", response_model=AnalyzeResponse)
+async def finalize_upload(
+    upload_id: str,
+    user_id: str = Depends(get_user_id),
+    tz: str = Depends(get_timezone),
+    detail: str = Depends(get_analysis_detail),
+):
+    # Held through the analysis, so a retry arriving meanwhile waits for
+    # the recorded result instead of starting a second one
+    async with resumable_uploads.upload_lock(upload_id):
+        try:
+            finished = await asyncio.to_thread(resumable_uploads.finished_result, upload_id)
+            if finished is not None:
+                return AnalyzeResponse.model_validate_json(finished)
+            image_bytes = await asyncio.to_thread(resumable_uploads.read_upload, upload_id)
+        except resumable_uploads.UploadNotFound:
+            raise HTTPException(status_code=404, detail="Upload not found or expired.")
+        except resumable_uploads.UploadIncomplete:
+            raise HTTPException(status_code=409, detail="Upload is not complete yet.")
+        except OSError:
+            raise HTTPException(status_code=400, detail="Upload is not a readable image.")
+
+        result = await asyncio.to_thread(run_pipeline, image_bytes, detail=detail)
+        result.meal_id = await asyncio.to_thread(
+            repository.record_meal, result, user_id, tz, image_bytes=image_bytes
+        )
+        await asyncio.to_thread(
+            resumable_uploads.complete_upload, upload_id, result.model_dump_json()
+        )
+    return result
@@ -0,0 +1,274 @@
+"""Badges: an event-driven rule engine over the meal log.
+
+Every badge declares the event key it listens on and keeps a few bytes
+of state (a counter, a run length, the last day it counted).  An event —
+a logged meal — expands into keys: its kind (``meal``) plus one key per
+tag (``meal:spinach``, ``meal:healthy``, …).  The engine indexes badges by
+key, so a meal only touches the badges of its own tags and the few that
+listen on every meal; the other few hundred are never looked at.  Earned
+badges drop their state and are skipped from then on.
+
+Per-user state is one JSON row in ``badge_state``, read and written in the
+meal insert's transaction.  ``replay`` rebuilds it from the meal history
+in logging order; deleting a meal replays that user, since counters and
+runs cannot be un-counted reliably.
+"""
+
+import json
+import re
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from app.services.db import Connection
+from app.services.streaks import HEALTHY_SCORE, MealFacts, all_meal_facts
+
+
+@dataclass(frozen=True)
+class Event:
+    kind: str  # "meal"; the prefix of every key the event expands into
+    at: datetime
+    day: date  # local day
+    tags: frozenset[str]
+
+    def keys(self) -> Iterator[str]:
+        yield self.kind
+        for tag in self.tags:
+            yield f"{self.kind}:{tag}"
+
+
+def meal_tags(labels: Iterable[str], metrics: dict) -> frozenset[str]:
+    """Food words from the labels plus derived tags from the typed metrics."""
+    tags = set()
+    for label in labels:
+        tags.add(label)
+        tags.update(re.findall(r"[a-z]+", label))
+    health = metrics.get("health_score")
+    if health is not None:
+        tags.add("healthy" if health >= HEALTHY_SCORE else "treat" if health <= 4 else "okay")
+    calories = metrics.get("total_calories")
+    if calories is not None and calories <= 500:
+        tags.add("light")
+    protein = metrics.get("protein_g")
+    if protein is not None and protein >= 25:
+        tags.add("high_protein")
+    return frozenset(tags)
+
+
+def meal_event(meal: MealFacts, day: date, metrics: dict) -> Event:
+    return Event("meal", meal.logged_at, day, meal_tags(meal.labels, metrics))
+
+
+# ── Badge kinds ──────────────────────────────────────────────────────
+
+
+@dataclass(frozen=True)
+class Badge(ABC):
+    key: str
+    name: str
+    description: str
+    on: str  # event key this badge is evaluated for
+    target: int
+
+    @abstractmethod
+    def update(self, state: dict, event: Event) -> bool:
+        """Fold ``event`` into ``state``; True once the badge is earned."""
+
+
+@dataclass(frozen=True)
+class Count(Badge):
+    """``target`` events on ``on``."""
+
+    def update(self, state: dict, event: Event) -> bool:
+        state["n"] = state.get("n", 0) + 1
+        return state["n"] >= self.target
+
+
+@dataclass(frozen=True)
+class InARow(Badge):
+    """``target`` consecutive ``on`` events tagged ``tag``; anything else resets."""
+
+    tag: str = ""
+
+    def update(self, state: dict, event: Event) -> bool:
+        state["run"] = state.get("run", 0) + 1 if self.tag in event.tags else 0
+        return state["run"] >= self.target
+
+
+@dataclass(frozen=True)
+class Days(Badge):
+    """``on`` events on ``target`` different local days."""
+
+    def update(self, state: dict, event: Event) -> bool:
+        day = event.day.isoformat()
+        if state.get("last") is None or day > state["last"]:
+            state["n"], state["last"] = state.get("n", 0) + 1, day
+        return state["n"] >= self.target
+
+
+@dataclass(frozen=True)
+class DayStreak(Badge):
+    """``on`` events on ``target`` consecutive local days."""
+
+    def update(self, state: dict, event: Event) -> bool:
+        last = state.get("last")
+        if last is not None and event.day <= date.fromisoformat(last):
+            return False
+        yesterday = (event.day - timedelta(days=1)).isoformat()
+        state["run"] = state.get("run", 0) + 1 if last == yesterday else 1
+        state["last"] = event.day.isoformat()
+        return state["run"] >= self.target
+
+
+# ── Catalogue ────────────────────────────────────────────────────────
+
+FOODS = [
+    "spinach", "palak", "dal", "rice", "roti", "chapati", "paratha", "idli",
+    "dosa", "upma", "poha", "sambar", "rajma", "chole", "paneer", "curd",
+    "yogurt", "raita", "egg", "chicken", "fish", "salad", "cucumber", "tomato",
+    "carrot", "broccoli", "beans", "okra", "cauliflower", "cabbage", "lentils",
+    "oats", "banana", "apple", "mango", "papaya", "orange", "nuts", "sprouts",
+    "khichdi",
+]
+FOOD_TARGETS = [1, 10, 25, 50, 100]
+
+
+def _catalogue() -> list[Badge]:
+    badges: list[Badge] = [
+        InARow("healthy_legend", "Healthy Legend", "Spinach five meals in a row", "meal", 5, tag="spinach"),
+        InARow("green_machine", "Green Machine", "Ten healthy meals in a row", "meal", 10, tag="healthy"),
+    ]
+    for n in (1, 10, 50, 100, 250, 500, 1000):
+        badges.append(Count(f"meals_{n}", f"{n} meals", f"Log {n} meals", "meal", n))
+    for n in (1, 10, 50, 100, 250):
+        badges.append(Count(f"healthy_{n}", f"{n} healthy meals", f"{n} meals scoring {HEALTHY_SCORE:g}+", "meal:healthy", n))
+    for n in (10, 50):
+        badges.append(Count(f"light_{n}", f"{n} light meals", f"{n} meals under 500 kcal", "meal:light", n))
+        badges.append(Count(f"protein_{n}", f"{n} protein-rich meals", f"{n} meals with 25 g protein or more", "meal:high_protein", n))
+    for n in (7, 30, 100, 365):
+        badges.append(Days(f"days_{n}", f"{n} days logged", f"Log meals on {n} different days", "meal", n))
+    for n in (3, 7, 14, 30):
+        badges.append(DayStreak(f"healthy_streak_{n}", f"{n}-day healthy streak", f"A healthy meal {n} days running", "meal:healthy", n))
+    for food in FOODS:
+        for n in FOOD_TARGETS:
+            title = food.capitalize() if n == 1 else f"{food.capitalize()} ×{n}"
+            badges.append(Count(f"{food}_{n}", title, f"Eat {food} {n} times", f"meal:{food}", n))
+    return badges
+
+
+BADGES = _catalogue()
+BADGES_BY_KEY = {badge.key: badge for badge in BADGES}
+
+
+class Engine:
+    """Badges indexed by the event key they listen on."""
+
+    def __init__(self, badges: list[Badge]):
+        self.badges = badges
+        self.by_key: dict[str, list[Badge]] = {}
+        for badge in badges:
+            self.by_key.setdefault(badge.on, []).append(badge)
+
+    def evaluate(self, state: dict, event: Event) -> list[str]:
+        """Apply one event to a user's state in place; returns the newly earned keys."""
+        progress = state.setdefault("progress", {})
+        earned = state.setdefault("earned", {})
+        new = []
+        for key in event.keys():
+            for badge in self.by_key.get(key, ()):
+                if badge.key in earned:
+                    continue
+                if badge.update(progress.setdefault(badge.key, {}), event):
+                    earned[badge.key] = event.at.isoformat()
+                    progress.pop(badge.key, None)
+                    new.append(badge.key)
+        return new
+
+
+engine = Engine(BADGES)
+
+
+# ── Storage ──────────────────────────────────────────────────────────
+
+
+async def _load(conn: Connection, user_id: str) -> dict:
+    lock = " FOR UPDATE" if conn.dialect == "postgres" else ""
+    value = await conn.fetchval(f"SELECT state FROM badge_state WHERE user_id = $1{lock}", user_id)
+    return json.loads(value) if value else {}
+
+
+async def _save(conn: Connection, user_id: str, state: dict) -> None:
+    await conn.execute(
+        "INSERT INTO badge_state (user_id, state) VALUES ($1, $2) "
+        "ON CONFLICT (user_id) DO UPDATE SET state = excluded.state",
+        user_id, json.dumps(state, separators=(",", ":")),
+    )
+
+
+async def on_meal_added(conn: Connection, user_id: str, event: Event) -> list[str]:
+    """Call in the insert transaction. Returns the badges this meal earned."""
+    state = await _load(conn, user_id)
+    if "last_at" in state and event.at < datetime.fromisoformat(state["last_at"]):
+        # Logged out of order: runs and day counts depend on order
+        await replay(conn, user_id)
+        return []
+    new = engine.evaluate(state, event)
+    state["last_at"] = event.at.isoformat()
+    await _save(conn, user_id, state)
+    return new
+
+
+async def on_meal_removed(conn: Connection, user_id: str) -> None:
+    """Call in the delete transaction, after the meal row is gone."""
+    await replay(conn, user_id)
+
+
+async def history(conn: Connection, user_id: str) -> list[Event]:
+    """Every meal of a user as an event, in logging order."""
+    facts = await all_meal_facts(conn, user_id)
+    rows = await conn.fetch(
+        "SELECT id, local_day, tz, total_calories, protein_g FROM meals WHERE user_id = $1",
+        user_id,
+    )
+    extra = {row["id"]: row for row in rows}
+    events = []
+    for meal in facts:
+        row = extra[meal.id]
+        day = row["local_day"] or meal.logged_at.astimezone(ZoneInfo(row["tz"] or "UTC")).date()
+        metrics = {
+            "health_score": meal.health_score,
+            "total_calories": row["total_calories"],
+            "protein_g": row["protein_g"],
+        }
+        events.append(meal_event(meal, day, metrics))
+    return events
+
+
+async def replay(conn: Connection, user_id: str) -> dict:
+    """Rebuild a user's badge state from their whole history."""
+    state: dict = {}
+    for event in await history(conn, user_id):
+        engine.evaluate(state, event)
+        state["last_at"] = event.at.isoformat()
+    await _save(conn, user_id, state)
+    return state
+
+
+async def get_badges(conn: Connection, user_id: str) -> list[dict]:
+    """Earned badges, most recent first, in one lookup."""
+    state = json.loads(await conn.fetchval(
+        "SELECT state FROM badge_state WHERE user_id = $1", user_id
+    ) or "{}")
+    earned = [
+        {
+            "key": key,
+            "name": BADGES_BY_KEY[key].name,
+            "description": BADGES_BY_KEY[key].description,
+            "earned_at": datetime.fromisoformat(at),
+        }
+        for key, at in state.get("earned", {}).items()
+        if key in BADGES_BY_KEY
+    ]
+    return sorted(earned, key=lambda badge: badge["earned_at"], reverse=True)
@@ -0,0 +1,290 @@
+"""Async, pooled database access for Postgres and SQLite.
+
+``DATABASE_URL`` selects the backend:
+
+- ``postgresql://…`` — an asyncpg pool.  asyncpg prepares every statement
+  on first use and caches it per connection, so repeated queries skip
+  parse/plan.
+- ``sqlite:///path`` (default ``backend/bhojan.sqlite3``) — a small pool of
+  aiosqlite connections in WAL mode, with sqlite3's statement cache, for
+  local development and tests.
+
+SQL is written once, Postgres-style, with ``$1`` placeholders; the SQLite
+side rewrites them to ``?1``, which SQLite binds natively.  Rows come back
+as plain dicts, and timestamps as aware ``datetime`` objects on both.
+"""
+
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = Path(__file__).resolve().parent.parent.parent / "bhojan.sqlite3"
+
+_PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+
+
+# ── SQLite type mapping ──────────────────────────────────────────────
+# Columns declared TIMESTAMPTZ / DATE / BOOLEAN round-trip as Python types.
+# Timestamps are stored as fixed-width UTC text so they sort correctly.
+
+
+def _adapt_datetime(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _convert_timestamptz(raw: bytes) -> datetime:
+    return datetime.fromisoformat(raw.decode().replace("Z", "+00:00"))
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(bool, int)
+sqlite3.register_converter("TIMESTAMPTZ", _convert_timestamptz)
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter("BOOLEAN", lambda raw: bool(int(raw)))
+
+
+class Connection(ABC):
+    """Dialect-neutral wrapper around one pooled connection."""
+
+    dialect: str
+
+    @abstractmethod
+    async def execute(self, sql: str, *args) -> None:
+        ...
+
+    @abstractmethod
+    async def executemany(self, sql: str, rows: list[tuple]) -> None:
+        ...
+
+    @abstractmethod
+    async def fetch(self, sql: str, *args) -> list[dict]:
+        ...
+
+    async def fetchrow(self, sql: str, *args) -> dict | None:
+        rows = await self.fetch(sql, *args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, sql: str, *args):
+        row = await self.fetchrow(sql, *args)
+        return next(iter(row.values())) if row else None
+
+
+class _PostgresConnection(Connection):
+    dialect = "postgres"
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def execute(self, sql: str, *args) -> None:
+        await self._conn.execute(sql, *args)
+
+    async def executemany(self, sql: str, rows: list[tuple]) -> None:
+        await self._conn.executemany(sql, rows)
+
+    async def fetch(self, sql: str, *args) -> list[dict]:
+        return [dict(r) for r in await self._conn.fetch(sql, *args)]
+
+
+class _SqliteConnection(Connection):
+    dialect = "sqlite"
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @staticmethod
+    def _sql(sql: str) -> str:
+        return _PLACEHOLDER_RE.sub(r"?\1", sql)
+
+    async def execute(self, sql: str, *args) -> None:
+        await self._conn.execute(self._sql(sql), args)
+
+    async def executemany(self, sql: str, rows: list[tuple]) -> None:
+        await self._conn.executemany(self._sql(sql), rows)
+
+    async def fetch(self, sql: str, *args) -> list[dict]:
+        async with self._conn.execute(self._sql(sql), args) as cursor:
+            columns = [c[0] for c in cursor.description or ()]
+            return [dict(zip(columns, row)) for row in await cursor.fetchall()]
+
+
+class Database(ABC):
+    """A connection pool for one dialect."""
+
+    dialect: str
+
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+    @abstractmethod
+    def acquire(self):
+        """``async with db.acquire() as conn`` — autocommit connection."""
+
+    @abstractmethod
+    def transaction(self):
+        """``async with db.transaction() as conn`` — commits on exit."""
+
+
+class PostgresDatabase(Database):
+    dialect = "postgres"
+
+    def __init__(self, dsn: str, min_size: int, max_size: int):
+        self._dsn = dsn
+        self._min_size = min_size
+        self._max_size = max_size
+        self._pool = None
+
+    async def connect(self) -> None:
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(
+            self._dsn,
+            min_size=self._min_size,
+            max_size=self._max_size,
+            statement_cache_size=512,
+        )
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Connection]:
+        async with self._pool.acquire() as conn:
+            yield _PostgresConnection(conn)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Connection]:
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                yield _PostgresConnection(conn)
+
+
+class SqliteDatabase(Database):
+    dialect = "sqlite"
+
+    def __init__(self, path: str, size: int):
+        self._path = path
+        self._size = size
+        self._pool: asyncio.Queue | None = None
+        self._conns: list = []
+
+    async def connect(self) -> None:
+        import aiosqlite
+
+        if self._path != ":memory:":
+            Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+        self._pool = asyncio.Queue()
+        # A :memory: database is private to its connection, so use just one
+        size = 1 if self._path == ":memory:" else self._size
+        for _ in range(size):
+            conn = await aiosqlite.connect(
+                self._path,
+                isolation_level=None,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                cached_statements=256,
+            )
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute("PRAGMA foreign_keys=ON")
+            await conn.execute("PRAGMA busy_timeout=5000")
+            self._conns.append(conn)
+            self._pool.put_nowait(conn)
+
+    async def close(self) -> None:
+        for conn in self._conns:
+            await conn.close()
+        self._conns = []
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Connection]:
+        conn = await self._pool.get()
+        try:
+            yield _SqliteConnection(conn)
+        finally:
+            self._pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Connection]:
+        async with self.acquire() as conn:
+            # IMMEDIATE takes the write lock up front, so two writers never
+            # both read-then-upgrade and deadlock.
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+            await conn.execute("COMMIT")
+
+
+_db: Database | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: int | None = None
+
+
+def get_db() -> Database:
+    global _db
+    if _db is None:
+        url = settings.database_url or f"sqlite:///{DEFAULT_SQLITE_PATH}"
+        if url.startswith(("postgres://", "postgresql://")):
+            _db = PostgresDatabase(url, settings.db_pool_min, settings.db_pool_max)
+        elif url.startswith("sqlite:///"):
+            _db = SqliteDatabase(url.removeprefix("sqlite:///"), settings.db_pool_max)
+        else:
+            raise ValueError(f"Unsupported DATABASE_URL: {url}")
+    return _db
+
+
+async def connect() -> Database:
+    """Open the pool and create missing tables. Called from the app lifespan."""
+    global _loop, _loop_thread
+    from app.services.schema import init_schema
+
+    db = get_db()
+    await db.connect()
+    await init_schema(db)
+    _loop = asyncio.get_running_loop()
+    _loop_thread = threading.get_ident()
+    logger.info("Database connected (%s)", db.dialect)
+    return db
+
+
+async def close() -> None:
+    global _db, _loop
+    if _db is not None:
+        await _db.close()
+    _db = None
+    _loop = None
+
+
+def run_sync(coro):
+    """Run a coroutine on the app's event loop from a worker thread.
+
+    Persistence handlers run in plain threads; the pool belongs to the
+    loop that opened it, so their queries have to be scheduled there.
+    """
+    if _loop is None:
+        coro.close()
+        raise RuntimeError("Database is not connected")
+    if _loop.is_running() and threading.get_ident() == _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync() called on the event loop thread")
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
@@ -0,0 +1,234 @@
+"""Food library index: per-user statistics for each canonical food label.
+
+One ``food_stats`` row per (user, canonical label) holds how many meals
+contained the food, when it was first and last seen, the health-score sum
+and count of those meals, how many of its items are liked, and a 30-slot
+array of per-day meal counts for the rolling 7- and 30-day figures.  The
+row is updated in the meal insert/delete transaction and on like toggles,
+so the food library and an item's page are index reads rather than scans
+of every meal.
+
+The day array is anchored at ``recent_day`` (slot 0) and slot ``i`` counts
+meals ``i`` days earlier, in the user's local days.  It is only shifted
+when a later day arrives; readers shift a copy to their own today.
+"""
+
+import json
+from datetime import date, datetime
+
+from app.services.db import Connection
+from app.utils.labels import canonical_label
+
+WINDOW = 30
+
+STAT_COLUMNS = [
+    "meals", "first_seen", "last_seen", "health_sum", "health_count",
+    "liked_count", "recent_day", "recent",
+]
+
+
+def meal_labels(labels: list[str]) -> set[str]:
+    """The canonical labels a meal's items are indexed under (each once per meal)."""
+    return {key for key in map(canonical_label, labels) if key}
+
+
+def _shift(recent: list[int], anchor: date | None, day: date) -> list[int]:
+    """``recent`` re-anchored from ``anchor`` to the later ``day``."""
+    if anchor is None or day <= anchor:
+        return recent
+    gap = (day - anchor).days
+    return ([0] * min(gap, WINDOW) + recent)[:WINDOW]
+
+
+async def _load(conn: Connection, user_id: str, label: str) -> dict | None:
+    lock = " FOR UPDATE" if conn.dialect == "postgres" else ""
+    row = await conn.fetchrow(
+        f"SELECT {', '.join(STAT_COLUMNS)} FROM food_stats WHERE user_id = $1 AND label = $2{lock}",
+        user_id, label,
+    )
+    if row is None:
+        return None
+    row = dict(row)
+    row["recent"] = json.loads(row["recent"])
+    return row
+
+
+async def _save(conn: Connection, user_id: str, label: str, stats: dict) -> None:
+    values = [stats[c] for c in STAT_COLUMNS]
+    values[STAT_COLUMNS.index("recent")] = json.dumps(stats["recent"])
+    updates = ", ".join(f"{c} = excluded.{c}" for c in STAT_COLUMNS)
+    placeholders = ", ".join(f"${i}" for i in range(3, len(STAT_COLUMNS) + 3))
+    await conn.execute(
+        f"INSERT INTO food_stats (user_id, label, {', '.join(STAT_COLUMNS)}) "
+        f"VALUES ($1, $2, {placeholders}) "
+        f"ON CONFLICT (user_id, label) DO UPDATE SET {updates}",
+        user_id, label, *values,
+    )
+
+
+async def add_meal(
+    conn: Connection, user_id: str, labels: set[str], logged_at: datetime, day: date,
+    health: float | None,
+) -> None:
+    """Count a meal for each of its labels. Call inside the insert's transaction."""
+    for label in sorted(labels):  # fixed order, so concurrent meals lock rows alike
+        stats = await _load(conn, user_id, label) or {
+            "meals": 0, "first_seen": logged_at, "last_seen": logged_at,
+            "health_sum": 0.0, "health_count": 0, "liked_count": 0,
+            "recent_day": day, "recent": [0] * WINDOW,
+        }
+        stats["meals"] += 1
+        stats["first_seen"] = min(stats["first_seen"], logged_at)
+        stats["last_seen"] = max(stats["last_seen"], logged_at)
+        if health is not None:
+            stats["health_sum"] += health
+            stats["health_count"] += 1
+        stats["recent"] = _shift(stats["recent"], stats["recent_day"], day)
+        stats["recent_day"] = max(stats["recent_day"], day)
+        slot = (stats["recent_day"] - day).days
+        if slot < WINDOW:
+            stats["recent"][slot] += 1
+        await _save(conn, user_id, label, stats)
+
+
+async def remove_meal(
+    conn: Connection, user_id: str, labels: set[str], logged_at: datetime, day: date | None,
+    health: float | None, liked: dict[str, int],
+) -> None:
+    """Take a deleted meal back out. Call after deleting the meal row, in its transaction.
+
+    ``liked`` counts the meal's liked items per label.  First/last seen
+    are re-read from ``food_items`` (one index probe) only when this meal
+    held one of them.
+    """
+    for label in sorted(labels):
+        stats = await _load(conn, user_id, label)
+        if stats is None:
+            continue
+        stats["meals"] -= 1
+        if stats["meals"] <= 0:
+            await conn.execute(
+                "DELETE FROM food_stats WHERE user_id = $1 AND label = $2", user_id, label
+            )
+            continue
+        if health is not None:
+            stats["health_sum"] -= health
+            stats["health_count"] -= 1
+        stats["liked_count"] -= liked.get(label, 0)
+        if day is not None:
+            slot = (stats["recent_day"] - day).days
+            if 0 <= slot < WINDOW:
+                stats["recent"][slot] = max(0, stats["recent"][slot] - 1)
+        if logged_at in (stats["first_seen"], stats["last_seen"]):
+            seen = await conn.fetchrow(
+                "SELECT min(created_at) AS first_seen, max(created_at) AS last_seen "
+                "FROM food_items WHERE user_id = $1 AND canonical_label = $2",
+                user_id, label,
+            )
+            stats["first_seen"], stats["last_seen"] = seen["first_seen"], seen["last_seen"]
+        await _save(conn, user_id, label, stats)
+
+
+async def add_liked(conn: Connection, user_id: str, label: str, delta: int) -> None:
+    """Adjust a label's liked count when one of its items is liked or unliked."""
+    await conn.execute(
+        "UPDATE food_stats SET liked_count = liked_count + $3 WHERE user_id = $1 AND label = $2",
+        user_id, label, delta,
+    )
+
+
+async def rebuild(conn: Connection, user_id: str | None = None) -> int:
+    """Recompute the index from meals and food_items. Returns the number of labels.
+
+    Also fills ``food_items.canonical_label`` for rows stored before it existed.
+    """
+    scope, args = ("WHERE user_id = $1", [user_id]) if user_id else ("", [])
+    missing = await conn.fetch(
+        f"SELECT id, label FROM food_items {scope or 'WHERE TRUE'} AND canonical_label IS NULL",
+        *args,
+    )
+    await conn.executemany(
+        "UPDATE food_items SET canonical_label = $2 WHERE id = $1",
+        [(row["id"], canonical_label(row["label"])) for row in missing],
+    )
+    await conn.execute(f"DELETE FROM food_stats {scope}", *args)
+
+    item_scope = "WHERE f.user_id = $1 AND" if user_id else "WHERE"
+    rows = await conn.fetch(
+        "SELECT DISTINCT f.user_id, f.canonical_label, f.meal_id, m.logged_at, m.local_day, m.health_score "
+        f"FROM food_items f JOIN meals m ON m.id = f.meal_id {item_scope} f.canonical_label <> '' "
+        "ORDER BY m.logged_at",
+        *args,
+    )
+    liked_rows = await conn.fetch(
+        f"SELECT user_id, canonical_label, count(*) AS n FROM food_items {scope or 'WHERE TRUE'} "
+        "AND liked GROUP BY user_id, canonical_label",
+        *args,
+    )
+    liked = {(r["user_id"], r["canonical_label"]): r["n"] for r in liked_rows}
+
+    index: dict[tuple[str, str], dict] = {}
+    for row in rows:
+        key = (row["user_id"], row["canonical_label"])
+        day = row["local_day"] or row["logged_at"].date()
+        stats = index.setdefault(key, {
+            "meals": 0, "first_seen": row["logged_at"], "last_seen": row["logged_at"],
+            "health_sum": 0.0, "health_count": 0, "liked_count": liked.get(key, 0),
+            "recent_day": day, "recent": [0] * WINDOW,
+        })
+        stats["meals"] += 1
+        stats["last_seen"] = row["logged_at"]
+        if row["health_score"] is not None:
+            stats["health_sum"] += row["health_score"]
+            stats["health_count"] += 1
+        stats["recent"] = _shift(stats["recent"], stats["recent_day"], day)
+        stats["recent_day"] = max(stats["recent_day"], day)
+        slot = (stats["recent_day"] - day).days
+        if slot < WINDOW:
+            stats["recent"][slot] += 1
+    for (uid, label), stats in index.items():
+        await _save(conn, uid, label, stats)
+    return len(index)
+
+
+# ── Reads ────────────────────────────────────────────────────────────
+
+
+def _view(row: dict, today: date) -> dict:
+    recent = _shift(json.loads(row["recent"]), row["recent_day"], today)
+    # A recent_day after today (a meal logged in a timezone further east)
+    # still counts in the window
+    ahead = max(0, (row["recent_day"] - today).days)
+    return {
+        "label": row["label"],
+        "meals": row["meals"],
+        "first_seen": row["first_seen"],
+        "last_seen": row["last_seen"],
+        "last_7_days": sum(recent[: 7 + ahead]),
+        "last_30_days": sum(recent[: WINDOW]),
+        "health_mean": round(row["health_sum"] / row["health_count"], 2) if row["health_count"] else None,
+        "liked": row["liked_count"] > 0,
+    }
+
+
+SORTS = {
+    "frequent": "meals DESC, label",
+    "recent": "last_seen DESC, label",
+}
+
+
+async def library(conn: Connection, user_id: str, today: date, sort: str = "frequent", limit: int = 50) -> list[dict]:
+    rows = await conn.fetch(
+        f"SELECT label, {', '.join(STAT_COLUMNS)} FROM food_stats WHERE user_id = $1 "
+        f"ORDER BY {SORTS[sort]} LIMIT $2",
+        user_id, limit,
+    )
+    return [_view(row, today) for row in rows]
+
+
+async def get_stats(conn: Connection, user_id: str, label: str, today: date) -> dict | None:
+    row = await conn.fetchrow(
+        f"SELECT label, {', '.join(STAT_COLUMNS)} FROM food_stats WHERE user_id = $1 AND label = $2",
+        user_id, canonical_label(label),
+    )
+    return _view(row, today) if row else None
@@ -1,27 +1,146 @@
+import copy
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from openai import OpenAI
 
 from app.config import settings
+from app.services import metrics
 from app.utils.image import image_bytes_to_data_uri
-from app.utils.parsing import parse_gpt_response
+from app.utils.parsing import JsonFieldScanner
+
+logger = logging.getLogger(__name__)
+
+
+def _score(description: str) -> dict:
+    return {"type": "number", "description": description}
+
+
+# The analysis fields (app.utils.parsing.ANALYSIS_FIELDS), typed, with the
+# items as an array instead of a bullet list to split.  Strict structured
+# output requires every property to be listed as required.  Fields are
+# generated in property order: the items come first so a streamed analysis
+# can start detection on them (AnalysisStream), then the description the
+# crop classifier needs.
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": [
+        "items", "description", "total_calories", "health_score", "rationale",
+        "macronutrients", "eat_frequency", "ideal_comparison", "mood_impact",
+        "satiety_score", "bloat_score", "tasty_score", "addiction_score", "summary",
+    ],
+    "properties": {
+        "items": {
+            "type": "array",
+            "description": "Distinct items on the plate, with estimated calories for each.",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["name", "calories"],
+                "properties": {
+                    "name": {"type": "string"},
+                    "calories": {"type": "integer"},
+                },
+            },
+        },
+        "description": {"type": "string", "description": "A short paragraph describing the food."},
+        "total_calories": {"type": "integer", "description": "Total calorie estimate."},
+        "health_score": _score("0 to 10."),
+        "rationale": {"type": "string", "description": "Why this health score was given."},
+        "macronutrients": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["protein_g", "fat_g", "carbs_g"],
+            "properties": {
+                "protein_g": {"type": "number"},
+                "fat_g": {"type": "number"},
+                "carbs_g": {"type": "number"},
+            },
+        },
+        "eat_frequency": {
+            "type": "string",
+            "enum": ["Can eat daily", "Occasional treat", "Avoid except rarely"],
+        },
+        "ideal_comparison": {
+            "type": "string",
+            "description": "How this compares to a typical healthy benchmark meal.",
+        },
+        "mood_impact": {
+            "type": "string",
+            "description": "Short-term effects on mood and energy (e.g. energy crash, satiety).",
+        },
+        "satiety_score": _score("0 to 10: how full this meal is likely to make the person feel."),
+        "bloat_score": _score("0 to 10: how much bloating this meal might cause."),
+        "tasty_score": _score("0 to 10: how tasty this meal is likely to be."),
+        "addiction_score": _score("0 to 10: how likely this meal is to trigger addictive eating patterns."),
+        "summary": {
+            "type": "string",
+            "description": "Total calorie estimate with final health score and brief closing note.",
+        },
+    },
+}
+
+FOOD_ANALYSIS_JSON_PROMPT = (
+    "You are GPT Bhojan, a food and nutrition assistant.\n\n"
+    "Analyze the food in this image and fill in every field of the food_analysis schema."
+)
+
+# "full": every field, prose as long as it needs.
+# "compact": scores, numbers and items with one-sentence text and no
+#   long-form prose, under settings.compact_analysis_max_tokens — for
+#   clients that only show scores and rings.
+ANALYSIS_DETAILS = ("full", "compact")
+# Left empty in compact analyses
+PROSE_FIELDS = ("rationale", "ideal_comparison", "mood_impact")
+
 
-FOOD_ANALYSIS_PROMPT = (
+def _compact_schema() -> dict:
+    schema = copy.deepcopy(ANALYSIS_SCHEMA)
+    for name in PROSE_FIELDS:
+        del schema["properties"][name]
+        schema["required"].remove(name)
+    schema["properties"]["description"]["description"] = "One short sentence naming the meal."
+    schema["properties"]["summary"]["description"] = "One short sentence."
+    schema["properties"]["items"]["items"]["properties"]["name"]["description"] = "Two or three words."
+    return schema
+
+
+COMPACT_ANALYSIS_SCHEMA = _compact_schema()
+
+COMPACT_ANALYSIS_PROMPT = (
     "You are GPT Bhojan, a food and nutrition assistant.\n\n"
-    "Please analyze the food in this image and return a structured analysis in this format:\n\n"
-    "1. **Description**: A short paragraph describing the food.\n"
-    "2. **Items**: A list of distinct items on the plate.\n"
-    "3. **Calories**: Estimate calories for each item and the total.\n"
-    "4. **Total Calories**: Tell me the total calorie estimate.\n"
-    "5. **Health Score**: Give a score from 0 to 10 (real number).\n"
-    "6. **Rationale**: Explain why this score was given.\n"
-    "7. **Macronutrient Estimate**: Rough protein (g), fat (g), carbs (g).\n"
-    "8. **Eat Frequency**: Label as one of ['Can eat daily', 'Occasional treat', 'Avoid except rarely'].\n"
-    "9. **Comparison to Ideal Meal**: Brief comment on how this compares to a typical healthy benchmark meal.\n"
-    "10. **Mood/Energy Impact**: What short-term effects might this food have (e.g., energy crash, satiety)?\n"
-    "11. **Satiety Score**: Score from 0 to 10 based on how full this meal is likely to make the person feel.\n"
-    "12. **Bloat Score**: Score from 0 to 10 based on how much bloating this meal might cause.\n"
-    "13. **Tasty Score**: Score from 0 to 10 based on how tasty this meal is likely to be.\n"
-    "14. **Addiction Score**: Score from 0 to 10 based on how likely this meal is to trigger addictive eating patterns.\n"
-    "15. **Summary**: Total calorie estimate with final health score and brief closing note."
+    "Analyze the food in this image and fill in every field of the food_analysis schema. "
+    "Be brief: numbers first, text fields one short sentence at most."
+)
+
+
+def _items_schema() -> dict:
+    items = copy.deepcopy(ANALYSIS_SCHEMA["properties"]["items"])
+    items["description"] = "Distinct items on the plate."
+    del items["items"]["properties"]["calories"]
+    items["items"]["required"] = ["name"]
+    return {
+        "type": "object",
+        "additionalProperties": False,
+        "required": ["items", "description"],
+        "properties": {
+            "items": items,
+            "description": {"type": "string", "description": "One short sentence naming the meal."},
+        },
+    }
+
+
+# Only what detection and crop classification need, for the short call
+# that runs alongside the full analysis (SplitAnalysis)
+ITEMS_SCHEMA = _items_schema()
+
+ITEMS_PROMPT = (
+    "You are GPT Bhojan, a food and nutrition assistant.\n\n"
+    "List the distinct food items in this image and name the meal in one short sentence."
 )
 
 _client: OpenAI | None = None
@@ -34,25 +153,309 @@ def _get_client() -> OpenAI:
     return _client
 
 
-def analyze_food_image(image_bytes: bytes) -> tuple[dict[str, str], str]:
+def _analysis_request(image_bytes: bytes, detail: str) -> dict:
+    """Chat-completion arguments for the plate analysis at ``detail``."""
+    if detail not in ANALYSIS_DETAILS:
+        raise ValueError(f"Unknown analysis detail: {detail}")
+    compact = detail == "compact"
+    data_uri = image_bytes_to_data_uri(image_bytes)
+    return {
+        "model": "gpt-4o",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": COMPACT_ANALYSIS_PROMPT if compact else FOOD_ANALYSIS_JSON_PROMPT},
+                    {"type": "image_url", "image_url": {"url": data_uri}},
+                ],
+            }
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "food_analysis",
+                "strict": True,
+                "schema": COMPACT_ANALYSIS_SCHEMA if compact else ANALYSIS_SCHEMA,
+            },
+        },
+        **({"max_tokens": settings.compact_analysis_max_tokens} if compact else {}),
+    }
+
+
+def _record_usage(metric: str, response_usage, usage: dict | None) -> None:
+    if response_usage is None:
+        return
+    metrics.incr(f"{metric}.output_tokens", response_usage.completion_tokens)
+    if usage is not None:
+        # Summed, so a retried call counts both attempts
+        usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + response_usage.prompt_tokens
+        usage["output_tokens"] = usage.get("output_tokens", 0) + response_usage.completion_tokens
+
+
+def _parse_analysis(raw_text: str) -> dict:
+    try:
+        data = json.loads(raw_text)
+    except ValueError as exc:
+        logger.warning("Unusable structured analysis (%s): %.200s", exc, raw_text)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _salvage(raw_text: str) -> dict:
+    """The top-level fields that completed before a reply was cut off."""
+    scanner = JsonFieldScanner()
+    try:
+        return dict(scanner.feed(raw_text))
+    except ValueError:
+        return {}
+
+
+def _truncated(metric: str, usage: dict | None) -> None:
+    """Count a reply that stopped at max_tokens, in metrics and ``usage``."""
+    metrics.incr(f"{metric}.truncated")
+    if usage is not None:
+        usage["truncated"] = 1
+
+
+def analyze_food_image(
+    image_bytes: bytes, detail: str = "full", usage: dict | None = None,
+) -> tuple[dict, str]:
+    """Plate analysis as the typed ``ANALYSIS_SCHEMA`` object, plus the raw JSON reply.
+
+    Uses structured output (strict), so the reply is parsed with
+    ``json.loads`` rather than matched against markdown; callers read the
+    items and numbers off it directly (``app.utils.parsing.item_names``,
+    ``structured_metrics``).  A refusal gives an empty object.  A compact
+    reply cut off at max_tokens is asked again once at full detail; a full
+    one keeps the fields that completed.  Either way ``usage["truncated"]``
+    is set.  ``detail`` is one of ANALYSIS_DETAILS; token counts go into
+    ``usage`` when given and into the metrics per detail.
+    """
+    request = _analysis_request(image_bytes, detail)
+    client = _get_client()
+
+    t0 = time.time()
+    response = client.chat.completions.create(**request)
+    metrics.observe(f"gpt.analysis.{detail}", time.time() - t0)
+    _record_usage(f"gpt.analysis.{detail}", response.usage, usage)
+
+    choice = response.choices[0]
+    raw_text = choice.message.content or ""
+    if choice.finish_reason != "length":
+        return _parse_analysis(raw_text), raw_text
+
+    _truncated(f"gpt.analysis.{detail}", usage)
+    if detail == "compact":
+        logger.warning("Compact analysis cut off at max_tokens; retrying at full detail")
+        return analyze_food_image(image_bytes, "full", usage)
+    data = _salvage(raw_text)
+    logger.warning("Analysis cut off at max_tokens; keeping %d completed fields", len(data))
+    return data, raw_text
+
+
+def list_food_items(image_bytes: bytes, usage: dict | None = None) -> dict:
+    """The plate's item names and a one-line description, as ``ITEMS_SCHEMA``.
+
+    A short call (output capped at ``settings.items_call_max_tokens``)
+    for detection to start on.  An unusable reply gives no items.
+    """
     client = _get_client()
     data_uri = image_bytes_to_data_uri(image_bytes)
 
+    t0 = time.time()
     response = client.chat.completions.create(
         model="gpt-4o",
         messages=[
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": FOOD_ANALYSIS_PROMPT},
+                    {"type": "text", "text": ITEMS_PROMPT},
                     {"type": "image_url", "image_url": {"url": data_uri}},
                 ],
             }
         ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "food_items", "strict": True, "schema": ITEMS_SCHEMA},
+        },
+        max_tokens=settings.items_call_max_tokens,
     )
-    raw_text = response.choices[0].message.content
-    parsed = parse_gpt_response(raw_text)
-    return parsed, raw_text
+    metrics.observe("gpt.items", time.time() - t0)
+    _record_usage("gpt.items", response.usage, usage)
+
+    choice = response.choices[0]
+    raw_text = choice.message.content or ""
+    try:
+        if choice.finish_reason == "length":
+            _truncated("gpt.items", usage)
+            data = _salvage(raw_text)
+        else:
+            data = json.loads(raw_text)
+        # A reply cut off after its items may not have reached the description
+        return {"items": list(data["items"]), "description": str(data.get("description", ""))}
+    except (ValueError, TypeError, KeyError) as exc:
+        logger.warning("Unusable items reply (%s): %.200s", exc, raw_text)
+        return {"items": [], "description": ""}
+
+
+# One thread per analysis in flight, so a stream never queues behind other
+# requests' streams while its request thread waits in field("items")
+_stream_executor = ThreadPoolExecutor(
+    max_workers=settings.analysis_concurrency, thread_name_prefix="analysis-stream"
+)
+# SplitAnalysis makes two calls per analysis in flight
+_split_executor = ThreadPoolExecutor(
+    max_workers=2 * settings.analysis_concurrency, thread_name_prefix="analysis-split"
+)
+
+
+class AnalysisStream:
+    """The plate analysis streamed, with each top-level field usable as it completes.
+
+    The request starts on a background thread as soon as the object is
+    created.  ``field("items")`` returns once the items array has streamed
+    (it is generated first, see ``ANALYSIS_SCHEMA``), so detection can run
+    while GPT writes the remaining fields; ``result()`` waits for the rest
+    and returns what ``analyze_food_image`` would have: a compact reply
+    cut off at max_tokens is followed by one full-detail call whose fields
+    fill in the rest, and a full one keeps the fields that completed.
+    """
+
+    def __init__(self, image_bytes: bytes, detail: str = "full"):
+        request = _analysis_request(image_bytes, detail)
+        self.detail = detail
+        self._image_bytes = image_bytes
+        self.usage: dict[str, int] = {}
+        self.elapsed_s: float | None = None
+        self._fields: dict[str, object] = {}
+        self._chunks: list[str] = []
+        self._error: Exception | None = None
+        self._finish_reason: str | None = None
+        self._done = False
+        self._cond = threading.Condition()
+        self._started = time.time()
+        _stream_executor.submit(self._run, request)
+
+    def _run(self, request: dict) -> None:
+        scanner: JsonFieldScanner | None = JsonFieldScanner()
+        try:
+            stream = _get_client().chat.completions.create(
+                **request, stream=True, stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                # The final chunk carries usage and no choices
+                _record_usage(f"gpt.analysis.{self.detail}", getattr(chunk, "usage", None), self.usage)
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    self._finish_reason = chunk.choices[0].finish_reason
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                text = chunk.choices[0].delta.content
+                self._chunks.append(text)
+                if scanner is None:
+                    continue
+                try:
+                    completed = scanner.feed(text)
+                except ValueError as exc:
+                    # Fields stop arriving early; result() still parses the whole reply
+                    logger.warning("Stopped reading streamed analysis fields: %s", exc)
+                    scanner, completed = None, []
+                if completed:
+                    with self._cond:
+                        for name, value in completed:
+                            if name == "items":
+                                metrics.observe(f"gpt.analysis.{self.detail}.items", time.time() - self._started)
+                            self._fields[name] = value
+                        self._cond.notify_all()
+            if self._finish_reason == "length":
+                _truncated(f"gpt.analysis.{self.detail}", self.usage)
+                if self.detail == "compact":
+                    logger.warning("Compact analysis cut off at max_tokens; retrying at full detail")
+                    data, _raw = analyze_food_image(self._image_bytes, "full", self.usage)
+                    with self._cond:
+                        for name, value in data.items():
+                            self._fields.setdefault(name, value)
+                        self._cond.notify_all()
+        except Exception as exc:
+            logger.error("Streamed analysis failed: %s", exc)
+            self._error = exc
+        finally:
+            self.elapsed_s = time.time() - self._started
+            metrics.observe(f"gpt.analysis.{self.detail}", self.elapsed_s)
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def field(self, name: str):
+        """The field's JSON value once it has streamed; None if the reply ended without it."""
+        with self._cond:
+            self._cond.wait_for(lambda: name in self._fields or self._done)
+            if name not in self._fields and self._error is not None:
+                raise self._error
+            return self._fields.get(name)
+
+    def result(self) -> tuple[dict, str]:
+        """Wait for the whole reply: the typed analysis and the raw JSON."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._done)
+        if self._error is not None:
+            raise self._error
+        raw_text = "".join(self._chunks)
+        if self._finish_reason == "length":
+            # The fields that streamed in full, plus any from the retry
+            return dict(self._fields), raw_text
+        return _parse_analysis(raw_text), raw_text
+
+
+class SplitAnalysis:
+    """The plate analysis as two concurrent calls, with AnalysisStream's interface.
+
+    ``list_food_items`` answers ``field("items")`` and
+    ``field("description")`` in a fraction of the full call's time, so
+    detection and segmentation run while ``analyze_food_image`` writes the
+    full analysis that ``result()`` returns.  Costs one extra short call.
+    If that call fails or lists no items, both fields come from the full
+    analysis instead.
+    """
+
+    def __init__(self, image_bytes: bytes, detail: str = "full"):
+        if detail not in ANALYSIS_DETAILS:
+            raise ValueError(f"Unknown analysis detail: {detail}")
+        self.detail = detail
+        self.elapsed_s: float | None = None
+        self._full_usage: dict[str, int] = {}
+        self._items_usage: dict[str, int] = {}
+        # The short call first: detection waits on it
+        self._items = _split_executor.submit(list_food_items, image_bytes, self._items_usage)
+        self._full = _split_executor.submit(self._run_full, image_bytes)
+
+    def _run_full(self, image_bytes: bytes) -> tuple[dict, str]:
+        t0 = time.time()
+        try:
+            return analyze_food_image(image_bytes, self.detail, self._full_usage)
+        finally:
+            self.elapsed_s = time.time() - t0
+
+    @property
+    def usage(self) -> dict[str, int]:
+        """Full-call token counts, and the items call's prefixed ``items_``."""
+        return {**self._full_usage, **{f"items_{k}": v for k, v in self._items_usage.items()}}
+
+    def field(self, name: str):
+        """Items and description from the items call; other fields from the full reply."""
+        if name in ITEMS_SCHEMA["properties"]:
+            try:
+                reply = self._items.result()
+            except Exception as exc:
+                logger.warning("Items call failed; using the full analysis: %s", exc)
+                reply = {}
+            if reply.get("items") and reply.get(name):
+                return reply[name]
+        data, _raw = self.result()
+        return data.get(name)
+
+    def result(self) -> tuple[dict, str]:
+        """Wait for the full analysis: the typed analysis and the raw JSON."""
+        return self._full.result()
 
 
 def check_api_key() -> bool:
@@ -100,3 +503,51 @@ def classify_food_crop(crop_bytes: bytes, description: str) -> str | None:
         return answer
     except Exception:
         return None
+
+
+def classify_segmented_crops(
+    crops: list[bytes], hints: list[str], description: str,
+) -> list[str | None] | None:
+    """Name and verify several masked crops in one GPT-4o call.
+
+    Each crop is a segmented item (food pixels on black) and ``hints`` are
+    the detector's labels for them.  Returns, per crop, the food name or
+    None when it is not clearly one of the described foods; returns None
+    altogether if the call or its reply failed.
+    """
+    try:
+        client = _get_client()
+        numbered = "; ".join(f"{i}: {hint}" for i, hint in enumerate(hints, 1))
+        content: list[dict] = [
+            {
+                "type": "text",
+                "text": (
+                    f"Given this description of the full plate: {description}. "
+                    f"The {len(crops)} images below are segmented crops from it, numbered "
+                    f"in order, with the detector's guesses ({numbered}). "
+                    "For each image, give the food name if it clearly shows one of the "
+                    "described food items, otherwise null. "
+                    'Reply as JSON: {"items": [name or null, ...]} with one entry per image.'
+                ),
+            }
+        ]
+        content += [
+            {"type": "image_url", "image_url": {"url": image_bytes_to_data_uri(crop)}}
+            for crop in crops
+        ]
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"},
+            max_tokens=30 * len(crops) + 20,
+        )
+        names = json.loads(response.choices[0].message.content)["items"]
+        if not isinstance(names, list) or len(names) != len(crops):
+            raise ValueError(f"expected {len(crops)} items, got {names!r}")
+        return [
+            name.strip() if isinstance(name, str) and name.strip().lower() not in ("", "none", "null") else None
+            for name in names
+        ]
+    except Exception as exc:
+        logger.warning("Fused crop classification failed: %s", exc)
+        return None
@@ -1,21 +1,236 @@
+"""Content-addressed media store.
+
+Every blob is named by the SHA-256 of its bytes and sharded two levels deep
+by digest prefix (``objects/ab/cd/abcd….jpg``), so identical bytes are
+stored once and no directory grows past a few thousand entries.  The bytes
+live in whichever backend ``app.services.storage`` is configured with.  A
+small SQLite index keeps a reference count per digest; ``release`` drops
+one reference and deletes the object when the last one goes.
+
+``save_visualization`` / ``save_crops`` only compute the URLs and hand the
+writes to the persistence stage; until they land, the bytes are served
+from ``pending_bytes`` so a client that follows a URL immediately still
+gets them.  Jobs that go to the spool take their bytes with them.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
 from pathlib import Path
-from uuid import uuid4
 
-MEDIA_DIR = Path(__file__).resolve().parent.parent.parent / "media"
+from app.services import persistence
+from app.services.storage import MEDIA_DIR, get_storage
+
+logger = logging.getLogger(__name__)
+
+OBJECTS_PREFIX = "objects"
+CONTENT_TYPES = {".jpg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+# Dot-prefixed so the /media router never serves it
+REFS_DB = MEDIA_DIR / ".refs.sqlite3"
+
+_index: sqlite3.Connection | None = None
+_index_lock = threading.Lock()
+
+# digest → (bytes, number of queued jobs carrying them)
+_pending: dict[str, tuple[bytes, int]] = {}
+_pending_lock = threading.Lock()
+
+
+def _get_index() -> sqlite3.Connection:
+    global _index
+    if _index is None:
+        MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(REFS_DB), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            " digest TEXT PRIMARY KEY,"
+            " refcount INTEGER NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        _index = conn
+    return _index
+
+
+def content_hash(image_bytes: bytes) -> str:
+    """SHA-256 hex digest used as the filename (and ETag) of stored media."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def object_key(digest: str, ext: str = ".jpg") -> str:
+    """Sharded storage key, e.g. ``objects/ab/cd/abcd….jpg``."""
+    return f"{OBJECTS_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def url_for(digest: str, ext: str = ".jpg") -> str:
+    return f"/media/{object_key(digest, ext)}"
+
+
+def key_for_url(url: str) -> str:
+    return url.removeprefix("/media/")
+
+
+def path_for_url(url: str) -> Path:
+    """Local filesystem path of a URL returned by ``save_*`` (local backend)."""
+    return MEDIA_DIR / key_for_url(url)
+
+
+def _take_ref(digest: str, size: int) -> int:
+    with _index_lock:
+        row = _get_index().execute(
+            "INSERT INTO refs (digest, refcount, size) VALUES (?, 1, ?) "
+            "ON CONFLICT(digest) DO UPDATE SET refcount = refcount + 1 "
+            "RETURNING refcount",
+            (digest, size),
+        ).fetchone()
+    return row[0]
+
+
+def put_many(blobs: list[bytes], ext: str = ".jpg") -> list[str]:
+    """Store each blob (once) and take a reference to it. Returns stable URLs.
+
+    Missing objects go up as one batch before any reference is taken, so a
+    retried call never counts a reference for bytes that were not stored.
+    """
+    storage = get_storage()
+    entries = [(content_hash(data), data) for data in blobs]
+
+    missing: dict[str, bytes] = {}
+    for digest, data in entries:
+        key = object_key(digest, ext)
+        if key not in missing and not storage.exists(key):
+            missing[key] = data
+    content_type = CONTENT_TYPES.get(ext, "application/octet-stream")
+    if missing:
+        storage.put_many(list(missing.items()), content_type)
+
+    for digest, data in entries:
+        key = object_key(digest, ext)
+        # A first reference to bytes we did not just upload may race with a
+        # release() that deleted them after our existence check.
+        if _take_ref(digest, len(data)) == 1 and key not in missing:
+            if not storage.exists(key):
+                storage.put(key, data, content_type)
+    return [url_for(digest, ext) for digest, _data in entries]
+
+
+def put(image_bytes: bytes, ext: str = ".jpg") -> str:
+    return put_many([image_bytes], ext)[0]
+
+
+def release(url: str) -> bool:
+    """Drop one reference to a stored URL. Returns True if the object was deleted.
+
+    With a shared backend other nodes may still hold references this index
+    cannot see, so the object is left for bucket lifecycle rules instead.
+    """
+    key = key_for_url(url)
+    digest = Path(key).stem
+    storage = get_storage()
+    with _index_lock:
+        index = _get_index()
+        row = index.execute(
+            "UPDATE refs SET refcount = refcount - 1 WHERE digest = ? RETURNING refcount",
+            (digest,),
+        ).fetchone()
+        if row is None or row[0] > 0:
+            return False
+        index.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+        if storage.shared:
+            return False
+        storage.delete(key)
+    logger.info("Released last reference to %s", digest)
+    return True
+
+
+def pending_bytes(digest: str) -> bytes | None:
+    """Bytes submitted for writing that have not reached the store yet."""
+    with _pending_lock:
+        entry = _pending.get(digest)
+    return entry[0] if entry is not None else None
+
+
+def _hold_pending(digests: list[str], blobs: list[bytes]) -> None:
+    with _pending_lock:
+        for digest, data in zip(digests, blobs):
+            _, count = _pending.get(digest, (data, 0))
+            _pending[digest] = (data, count + 1)
+
+
+def _drop_pending(payload: dict) -> None:
+    """Let go of a job's bytes: written, or carried off to the spool."""
+    with _pending_lock:
+        for digest in payload["digests"]:
+            entry = _pending.get(digest)
+            if entry is None:
+                continue
+            if entry[1] > 1:
+                _pending[digest] = (entry[0], entry[1] - 1)
+            else:
+                del _pending[digest]
+
+
+def _put_pending(payload: dict) -> None:
+    put_many(payload["data"], payload["ext"])
+    _drop_pending(payload)
+
+
+def _release_all(payload: dict) -> None:
+    for url in payload["urls"]:
+        release(url)
+
+
+persistence.register_handler("media.put", _put_pending, on_spool=_drop_pending)
+persistence.register_handler("media.release", _release_all)
+
+
+def _save_deferred(blobs: list[bytes], ext: str = ".jpg") -> list[str]:
+    digests = [content_hash(data) for data in blobs]
+    payload = {"digests": digests, "data": blobs, "ext": ext}
+    _hold_pending(digests, blobs)
+    try:
+        persistence.submit("media.put", payload)
+    except Exception:
+        # Ran inline and failed: nothing is queued to release the bytes
+        _drop_pending(payload)
+        raise
+    return [url_for(digest, ext) for digest in digests]
+
+
+def _image_ext(image_bytes: bytes) -> str:
+    if image_bytes.startswith(b"\x89PNG"):
+        return ".png"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return ".webp"
+    return ".jpg"
+
+
+def save_photo(image_bytes: bytes) -> str:
+    """Save the photo a meal was analyzed from, keeping its format."""
+    ext = _image_ext(image_bytes)
+    return _save_deferred([image_bytes], ext)[0]
 
 
 def save_visualization(image_bytes: bytes) -> str:
-    out_dir = MEDIA_DIR / "visualizations"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    filename = f"{uuid4()}.jpg"
-    (out_dir / filename).write_bytes(image_bytes)
-    return f"/media/visualizations/{filename}"
+    return _save_deferred([image_bytes])[0]
 
 
 def save_crop(image_bytes: bytes, label: str) -> str:
-    out_dir = MEDIA_DIR / "crops"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    safe_label = label.strip().replace(" ", "_").lower()
-    filename = f"{safe_label}_{uuid4()}.jpg"
-    (out_dir / filename).write_bytes(image_bytes)
-    return f"/media/crops/{filename}"
+    return save_crops([(image_bytes, label)])[0]
+
+
+def save_crops(crops: list[tuple[bytes, str]]) -> list[str]:
+    """Save all crops of one meal as a single batched write."""
+    # Labels are not part of the URL: identical crops share one object
+    # regardless of what they were called.
+    if not crops:
+        return []
+    return _save_deferred([crop_bytes for crop_bytes, _label in crops])
+
+
+def release_deferred(urls: list[str]) -> None:
+    """Drop references (e.g. of a deleted meal) after the response."""
+    urls = [url for url in urls if url and url.startswith(f"/media/{OBJECTS_PREFIX}/")]
+    if urls:
+        persistence.submit("media.release", {"urls": urls})
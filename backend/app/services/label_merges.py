@@ -0,0 +1,123 @@
+"""Label merges learned from segmentation, applied by the pipeline's label keys.
+
+The static tables in ``app.utils.labels`` cover common plurals and
+synonyms; the rest show up in the pipeline itself.  When lang-SAM returns
+nearly the same mask for two labels with different keys ("basmati rice"
+and "rice", "baby carrot" and "carrot") they name the same food.  Each
+such pair is counted, and once it has been seen ``LEARN_AFTER`` times the
+longer key is merged into the shorter one for every later image.
+
+Only pairs where one key's words contain the other's are counted, so
+"rice" and "dal" on a mixed plate can overlap heavily without ever being
+merged.
+
+State is a small JSON file (``settings.label_merges_path``, default
+``backend/label_merges.json``) written atomically on change and re-read
+when another process has changed it, so it works both in the API and in
+scripts such as ``batch_test.py`` that run without a database.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from app.config import settings
+from app.services import metrics
+from app.utils.labels import label_key, unique_labels
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent.parent / "label_merges.json"
+LEARN_AFTER = 3
+
+_lock = threading.Lock()
+_merges: dict[str, str] = {}
+_pairs: dict[str, int] = {}  # "a|b" (sorted keys) → times seen
+_mtime: float | None = None
+
+
+def _path() -> Path:
+    return Path(settings.label_merges_path) if settings.label_merges_path else DEFAULT_PATH
+
+
+def _refresh() -> None:
+    """Reload from disk if the file changed since it was last read. Holds ``_lock``."""
+    global _merges, _pairs, _mtime
+    try:
+        mtime = _path().stat().st_mtime
+    except FileNotFoundError:
+        return
+    if mtime == _mtime:
+        return
+    try:
+        state = json.loads(_path().read_text())
+    except (OSError, ValueError) as exc:
+        logger.warning("Could not read learned label merges: %s", exc)
+        return
+    _merges, _pairs, _mtime = state.get("merges", {}), state.get("pairs", {}), mtime
+
+
+def _write() -> None:
+    """Atomically save the current state. Holds ``_lock``."""
+    global _mtime
+    path = _path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"merges": _merges, "pairs": _pairs}, fh, indent=1, sort_keys=True)
+        os.replace(tmp_name, path)
+        _mtime = path.stat().st_mtime
+    except OSError as exc:
+        logger.warning("Could not save learned label merges: %s", exc)
+
+
+def merges() -> dict[str, str]:
+    with _lock:
+        _refresh()
+        return dict(_merges)
+
+
+def key(label: str) -> str:
+    """``label_key`` with the learned merges applied."""
+    return label_key(label, merges())
+
+
+def unique(labels: list[str]) -> list[str]:
+    """``unique_labels`` with the learned merges applied."""
+    return unique_labels(labels, merges())
+
+
+def related(a: str, b: str) -> bool:
+    """Whether two keys could name the same food: one's words contain the other's."""
+    words_a, words_b = set(a.split()), set(b.split())
+    if not words_a or not words_b:
+        return False
+    return words_a <= words_b or words_b <= words_a
+
+
+def observe(a: str, b: str) -> bool:
+    """Count one sighting of keys ``a`` and ``b`` on the same pixels.
+
+    Returns True when this sighting made them a learned merge.
+    """
+    if a == b or not related(a, b):
+        return False
+    shorter, longer = sorted((a, b), key=lambda k: (len(k.split()), len(k), k))
+    pair = f"{shorter}|{longer}"
+    with _lock:
+        _refresh()
+        if _merges.get(longer) == shorter:
+            return False
+        _pairs[pair] = _pairs.get(pair, 0) + 1
+        learned = _pairs[pair] >= LEARN_AFTER and longer not in _merges
+        if learned:
+            _merges[longer] = shorter
+            metrics.incr("labels.merges_learned")
+            logger.info("Learned label merge '%s' → '%s'", longer, shorter)
+        _write()
+    return learned
+
@@ -0,0 +1,225 @@
+"""Food library search: typo-tolerant matching and autocomplete over item labels.
+
+Labels from the crop classifier are noisy ("Carrot", "Carrots",
+"Olives.", "Crème brûlée."), so search runs on *terms*: each raw label
+folded (``app.utils.labels.fold``) plus its canonical label.  Every term is
+split into trigrams (pg_trgm style: each word padded with two spaces in
+front and one behind) and an inverted index maps each trigram to the
+terms containing it.
+
+A query is folded and trigrammed the same way; candidate terms are those
+sharing a trigram with it, scored by how many they share — half Jaccard
+similarity, half the fraction of the query's trigrams found — so "spinch"
+finds "spinach" and a short query still ranks longer labels containing it.
+Hits are grouped by canonical label and ranked by score plus a small
+popularity term, so a food eaten a hundred times beats a one-off
+misspelling of it that happens to sit closer to the query.
+
+Autocomplete walks a sorted list of every word-start suffix of every term
+("palak paneer" is listed under "palak paneer" and "paneer") with a
+binary search.
+
+One index per user, built from ``food_items`` on the first search and then
+kept current as meals are written or deleted (``add`` / ``remove``).
+Indexes live in this process, least recently used evicted first.
+"""
+
+import bisect
+import math
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+
+from app.services import db
+from app.utils.labels import canonical_label, fold
+
+MAX_USERS = 256
+MIN_SCORE = 0.3
+# Ranking bonus per tenfold more items
+POPULARITY = 0.1
+# Prefix scans stop after this many terms; the most eaten of those win
+MAX_PREFIX_SCAN = 500
+
+
+def trigrams(term: str) -> set[str]:
+    grams = set()
+    for word in term.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class _Term:
+    text: str
+    canonical: str
+    grams: int  # trigram count, for the similarity denominator
+    items: int = 0
+
+
+@dataclass
+class _Food:
+    """One canonical label: how many items it has and the raw labels seen."""
+
+    items: int = 0
+    variants: Counter = field(default_factory=Counter)
+
+
+class LabelIndex:
+    def __init__(self):
+        self.terms: list[_Term] = []
+        self.term_ids: dict[str, int] = {}
+        self.postings: dict[str, list[int]] = {}
+        self.prefixes: list[tuple[str, int]] = []  # (word-start suffix, term id), sorted
+        self.foods: dict[str, _Food] = {}
+
+    def _term(self, text: str, canonical: str) -> _Term:
+        term_id = self.term_ids.get(text)
+        if term_id is not None:
+            return self.terms[term_id]
+        term_id = len(self.terms)
+        grams = trigrams(text)
+        term = _Term(text, canonical, len(grams))
+        self.terms.append(term)
+        self.term_ids[text] = term_id
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(term_id)
+        words = text.split()
+        for i in range(len(words)):
+            bisect.insort(self.prefixes, (" ".join(words[i:]), term_id))
+        return term
+
+    def add(self, label: str, count: int = 1) -> None:
+        canonical = canonical_label(label)
+        if not canonical:
+            return
+        food = self.foods.setdefault(canonical, _Food())
+        food.items += count
+        food.variants[label] += count
+        for text in {fold(label), canonical}:
+            self._term(text, canonical).items += count
+
+    def remove(self, label: str, count: int = 1) -> None:
+        """Uncount items; terms stay indexed and drop out of results at zero."""
+        canonical = canonical_label(label)
+        food = self.foods.get(canonical)
+        if food is None:
+            return
+        food.items -= count
+        food.variants[label] -= count
+        if food.variants[label] <= 0:
+            del food.variants[label]
+        for text in {fold(label), canonical}:
+            term_id = self.term_ids.get(text)
+            if term_id is not None:
+                self.terms[term_id].items -= count
+
+    def _hit(self, canonical: str, score: float) -> dict:
+        food = self.foods[canonical]
+        return {
+            "label": canonical,
+            "variants": [label for label, _ in food.variants.most_common(3)],
+            "items": food.items,
+            "score": round(score, 3),
+        }
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        query_grams = trigrams(fold(query))
+        if not query_grams:
+            return []
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        best: dict[str, float] = {}
+        for term_id, common in shared.items():
+            term = self.terms[term_id]
+            if term.items <= 0:
+                continue
+            jaccard = common / (len(query_grams) + term.grams - common)
+            score = (jaccard + common / len(query_grams)) / 2
+            if score >= MIN_SCORE and score > best.get(term.canonical, 0):
+                best[term.canonical] = score
+        ranked = sorted(
+            best.items(),
+            key=lambda hit: -(hit[1] + POPULARITY * math.log10(self.foods[hit[0]].items + 1)),
+        )
+        return [self._hit(canonical, score) for canonical, score in ranked[:limit]]
+
+    def complete(self, prefix: str, limit: int = 10) -> list[dict]:
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        found: dict[str, int] = {}
+        start = bisect.bisect_left(self.prefixes, (prefix, -1))
+        for suffix, term_id in self.prefixes[start:start + MAX_PREFIX_SCAN]:
+            if not suffix.startswith(prefix):
+                break
+            term = self.terms[term_id]
+            if term.items > 0:
+                found[term.canonical] = self.foods[term.canonical].items
+        ranked = sorted(found, key=lambda canonical: (-found[canonical], canonical))
+        return [self._hit(canonical, 1.0) for canonical in ranked[:limit]]
+
+
+_indexes: OrderedDict[str, LabelIndex] = OrderedDict()
+# Bumped by every write, so an index built from rows read before a
+# concurrent write is rebuilt rather than published without it
+_versions: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+async def get_index(user_id: str) -> LabelIndex:
+    for _ in range(3):
+        with _lock:
+            index = _indexes.get(user_id)
+            if index is not None:
+                _indexes.move_to_end(user_id)
+                return index
+            version = _versions.get(user_id, 0)
+        async with db.get_db().acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT label, count(*) AS n FROM food_items WHERE user_id = $1 GROUP BY label",
+                user_id,
+            )
+        index = LabelIndex()
+        for row in rows:
+            index.add(row["label"], row["n"])
+        with _lock:
+            if _versions.get(user_id, 0) == version:
+                _indexes[user_id] = index
+                while len(_indexes) > MAX_USERS:
+                    _indexes.popitem(last=False)
+                return index
+    return index
+
+
+def _apply(user_id: str, labels: list[str], sign: int) -> None:
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        index = _indexes.get(user_id)
+        if index is None:
+            return  # built from the database on first use
+        for label in labels:
+            (index.add if sign > 0 else index.remove)(label)
+
+
+def add(user_id: str, labels: list[str]) -> None:
+    """Index a saved meal's item labels. Call after the insert commits."""
+    _apply(user_id, labels, 1)
+
+
+def remove(user_id: str, labels: list[str]) -> None:
+    """Unindex a deleted meal's item labels. Call after the delete commits."""
+    _apply(user_id, labels, -1)
+
+
+async def search(user_id: str, query: str, limit: int = 10) -> list[dict]:
+    index = await get_index(user_id)
+    with _lock:
+        return index.search(query, limit)
+
+
+async def complete(user_id: str, prefix: str, limit: int = 10) -> list[dict]:
+    index = await get_index(user_id)
+    with _lock:
+        return index.complete(prefix, limit)
@@ -0,0 +1,232 @@
+"""Local mask-quality scoring, so only doubtful masks get a GPT vision check.
+
+Each segmented item is scored from its mask, its crop and its detection:
+
+  area        mask pixels / detection-box area — a sliver, or a mask
+              that fills the whole box (lang-SAM returning the crop), is
+              suspect
+  compactness 4πA/P² of the mask — ragged, noisy masks score low
+  main_part   largest connected component / mask area — fragmented masks
+              score low
+  bright      non-black fraction of the food-on-black crop
+  confidence  YOLO-World's detection score
+
+The sub-scores are mapped to 0–1 and averaged with ``WEIGHTS``.  Once
+calibrated, items at or above the *high* threshold are kept and at or
+below the *low* one dropped without a GPT call; only the band between
+goes to GPT.  Until a calibration file exists every item goes to GPT, as
+before the gate, so nothing is dropped on uncalibrated weights.
+
+Every GPT verdict is appended to a JSONL log together with the features
+and the chance the item had of being checked: a small random sample of
+confident items is checked anyway so the log covers the whole score
+range.  ``calibrate_mask_quality.py`` reads the log, weighting each
+verdict by the inverse of that chance, and writes the thresholds back to
+the calibration file this module loads.
+"""
+
+import io
+import json
+import logging
+import math
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.services.segmentation import SegmentedItem
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CALIBRATION_PATH = BACKEND_DIR / "mask_quality_calibration.json"
+DEFAULT_VERDICT_LOG = BACKEND_DIR / "mask_quality_verdicts.jsonl"
+
+WEIGHTS = {"area": 1.0, "compactness": 1.0, "main_part": 1.0, "bright": 1.0, "confidence": 0.5}
+
+# Masks are scored on a grid at most this many pixels on a side
+GRID = 128
+BRIGHTNESS_THRESHOLD = 30
+# Masks covering more of their box than this are usually the box itself
+FULL_BOX = 0.97
+
+_lock = threading.Lock()
+_calibration: tuple[float, float] | None = None
+_calibration_mtime: float | None = None
+
+
+# ── Features ─────────────────────────────────────────────────────────
+
+
+def _largest_component(mask: np.ndarray) -> int:
+    """Size of the largest 4-connected component.
+
+    Union-find over horizontal runs: each row's runs are found with numpy
+    and joined to the overlapping runs of the row above, so the work grows
+    with the number of runs rather than with pixels times path length.
+    """
+    padded = np.pad(mask.astype(np.int8), ((0, 0), (1, 1)))
+    edges = np.diff(padded, axis=1)
+    rows_start, cols_start = np.nonzero(edges == 1)
+    _, cols_end = np.nonzero(edges == -1)
+    if not len(rows_start):
+        return 0
+    lengths = cols_end - cols_start
+    parent = list(range(len(rows_start)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Runs come out row by row, left to right
+    row_first = np.searchsorted(rows_start, np.arange(mask.shape[0] + 1))
+    for row in range(1, mask.shape[0]):
+        above = range(row_first[row - 1], row_first[row])
+        here = range(row_first[row], row_first[row + 1])
+        i, j = above.start, here.start
+        while i < above.stop and j < here.stop:
+            if cols_start[i] < cols_end[j] and cols_start[j] < cols_end[i]:
+                parent[find(i)] = find(j)
+            # Advance whichever run ends first
+            if cols_end[i] <= cols_end[j]:
+                i += 1
+            else:
+                j += 1
+
+    sizes: dict[int, int] = {}
+    for run, length in enumerate(lengths):
+        root = find(run)
+        sizes[root] = sizes.get(root, 0) + int(length)
+    return max(sizes.values())
+
+
+def _bright_fraction(crop_bytes: bytes, mask_pixels: int) -> float:
+    try:
+        gray = np.array(Image.open(io.BytesIO(crop_bytes)).convert("L"))
+    except Exception:
+        return 1.0  # unreadable crop: leave it to the other features
+    return min(1.0, int((gray > BRIGHTNESS_THRESHOLD).sum()) / max(mask_pixels, 1))
+
+
+def features(item: SegmentedItem) -> dict[str, float]:
+    # Crop-segmented masks lie inside their detection box; only scan that
+    mask = item.mask
+    if item.bbox is not None:
+        x1, y1, x2, y2 = item.bbox
+        mask = mask[y1:y2, x1:x2]
+    ys, xs = np.where(mask)
+    if len(xs) == 0:
+        return {"area": 0.0, "compactness": 0.0, "main_part": 0.0, "bright": 0.0,
+                "confidence": item.confidence}
+    if item.bbox is None:
+        x1, y1, x2, y2 = int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+    box_area = max(1, (x2 - x1) * (y2 - y1))
+    pixels = len(xs)
+
+    # Shape features on a downsampled copy of the mask's own bounding box
+    region = mask[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    step = max(1, math.ceil(max(region.shape) / GRID))
+    grid = np.pad(region[::step, ::step], 1)
+    area = int(grid.sum())
+    interior = grid[1:-1, 1:-1] & grid[:-2, 1:-1] & grid[2:, 1:-1] & grid[1:-1, :-2] & grid[1:-1, 2:]
+    perimeter = area - int(interior.sum())
+
+    return {
+        "area": min(1.0, pixels / box_area),
+        "compactness": min(1.0, 4 * math.pi * area / perimeter ** 2) if perimeter else 0.0,
+        "main_part": _largest_component(grid) / area if area else 0.0,
+        "bright": _bright_fraction(item.crop_bytes, pixels),
+        "confidence": item.confidence,
+    }
+
+
+def score(f: dict[str, float]) -> float:
+    """Features → 0–1 quality, higher is better."""
+    area = 0.0 if f["area"] > FULL_BOX else min(1.0, f["area"] / 0.35)
+    parts = {
+        "area": area,
+        "compactness": min(1.0, f["compactness"] / 0.3),
+        "main_part": f["main_part"],
+        "bright": min(1.0, f["bright"] / 0.8),
+        "confidence": min(1.0, 0.5 + f["confidence"]),
+    }
+    total = sum(WEIGHTS[k] * v for k, v in parts.items()) / sum(WEIGHTS.values())
+    return round(total, 4)
+
+
+# ── Thresholds ───────────────────────────────────────────────────────
+
+
+def calibration_path() -> Path:
+    return Path(settings.mask_quality_calibration_path or DEFAULT_CALIBRATION_PATH)
+
+
+def thresholds() -> tuple[float, float] | None:
+    """(low, high) from the calibration file; None until one is usable."""
+    global _calibration, _calibration_mtime
+    path = calibration_path()
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if mtime != _calibration_mtime:
+            try:
+                data = json.loads(path.read_text())
+                _calibration = (float(data["low"]), float(data["high"]))
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning("Ignoring mask-quality calibration %s: %s", path, exc)
+                _calibration = None
+            _calibration_mtime = mtime
+        return _calibration
+
+
+def gate(quality: float) -> str:
+    """What to do with an item of this quality: "keep", "drop" or "ask" GPT.
+
+    Always "ask" while uncalibrated.
+    """
+    calibrated = thresholds()
+    if calibrated is None:
+        return "ask"
+    low, high = calibrated
+    if quality >= high:
+        return "keep"
+    if quality <= low:
+        return "drop"
+    return "ask"
+
+
+# ── Verdict log ──────────────────────────────────────────────────────
+
+
+def log_path() -> Path:
+    return Path(settings.mask_quality_log_path or DEFAULT_VERDICT_LOG)
+
+
+def record_verdict(
+    item: SegmentedItem, f: dict[str, float], quality: float, verdict: bool, checked_rate: float = 1.0,
+) -> None:
+    """Append one GPT verdict and the features it was given, for calibration.
+
+    ``checked_rate`` is the chance the item had of being sent to GPT: 1 in
+    the uncertain band, the sample rate for confidently scored items.
+    """
+    line = json.dumps({
+        "at": round(time.time(), 3),
+        "label": item.label,
+        "features": {k: round(v, 4) for k, v in f.items()},
+        "score": quality,
+        "gpt_keep": verdict,
+        "checked_rate": checked_rate,
+    })
+    try:
+        with _lock, open(log_path(), "a") as fh:
+            fh.write(line + "\n")
+    except OSError as exc:
+        logger.warning("Could not record mask-quality verdict: %s", exc)
@@ -0,0 +1,118 @@
+"""Full-text search over stored meal analyses.
+
+The index covers the free-text analysis fields (``schema.SEARCH_FIELDS``):
+an FTS5 table on SQLite and a generated, GIN-indexed ``tsvector`` column on
+Postgres, both kept current by the database itself as meals are inserted
+and deleted.  Both stem English words, so "crashes" finds "energy crash".
+
+Results are ranked (BM25 on SQLite, ``ts_rank_cd`` on Postgres, with the
+description and items weighted highest), carry a highlighted snippet
+wrapped in ``<mark>`` tags, and can be narrowed by date range and health
+score.  Snippets are only built for the returned page.
+"""
+
+import json
+import re
+
+from app.services import db
+from app.services.schema import SEARCH_FIELDS
+
+MARK_START, MARK_END = "<mark>", "</mark>"
+SNIPPET_TOKENS = 16
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts5_query(text: str) -> str | None:
+    """User text → an FTS5 query: every word required, the last as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    taken literally.
+    """
+    words = _TOKEN.findall(text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _filters(args: list, since, until, min_score, max_score) -> str:
+    def arg(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    where = []
+    if since is not None:
+        where.append(f"m.logged_at >= {arg(since)}")
+    if until is not None:
+        where.append(f"m.logged_at < {arg(until)}")
+    if min_score is not None:
+        where.append(f"m.health_score >= {arg(min_score)}")
+    if max_score is not None:
+        where.append(f"m.health_score <= {arg(max_score)}")
+    return "".join(f" AND {clause}" for clause in where)
+
+
+async def search(
+    user_id: str,
+    query: str,
+    limit: int = 20,
+    since=None,
+    until=None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+) -> list[dict]:
+    """Best-matching meals first: id, timestamp, health score, description, snippet, rank."""
+    async with db.get_db().acquire() as conn:
+        if conn.dialect == "postgres":
+            args: list = [query, user_id]
+            filters = _filters(args, since, until, min_score, max_score)
+            args.append(limit)
+            document = " || ' ' || ".join(f"coalesce(analysis->>'{name}', '')" for name in SEARCH_FIELDS)
+            options = (
+                f"StartSel={MARK_START}, StopSel={MARK_END}, "
+                f"MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}, MaxFragments=2"
+            )
+            rows = await conn.fetch(
+                "WITH q AS (SELECT websearch_to_tsquery('english', $1) AS query), "
+                "hits AS ("
+                "  SELECT m.id, m.logged_at, m.health_score, m.analysis, "
+                "  ts_rank_cd(m.search, q.query) AS rank, q.query "
+                "  FROM meals m, q "
+                f"  WHERE m.search @@ q.query AND m.user_id = $2{filters} "
+                f"  ORDER BY rank DESC, m.logged_at DESC LIMIT ${len(args)}"
+                ") "
+                "SELECT id, logged_at, health_score, analysis->>'description' AS description, rank, "
+                f"ts_headline('english', {document}, query, '{options}') AS snippet "
+                "FROM hits ORDER BY rank DESC, logged_at DESC",
+                *args,
+            )
+            return [dict(row) for row in rows]
+
+        match = fts5_query(query)
+        if match is None:
+            return []
+        args = [match, user_id]
+        filters = _filters(args, since, until, min_score, max_score)
+        args.append(limit)
+        weights = ", ".join(str(w) for w in SEARCH_FIELDS.values())
+        rows = await conn.fetch(
+            "SELECT m.id, m.logged_at, m.health_score, m.analysis, "
+            f"-bm25(meals_fts, {weights}) AS rank, "
+            f"snippet(meals_fts, -1, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet "
+            "FROM meals_fts JOIN meals m ON m.rowid = meals_fts.rowid "
+            f"WHERE meals_fts MATCH $1 AND m.user_id = $2{filters} "
+            f"ORDER BY bm25(meals_fts, {weights}), m.logged_at DESC LIMIT ${len(args)}",
+            *args,
+        )
+    return [
+        {
+            "id": row["id"],
+            "logged_at": row["logged_at"],
+            "health_score": row["health_score"],
+            "description": json.loads(row["analysis"]).get("description", ""),
+            "rank": row["rank"],
+            "snippet": row["snippet"],
+        }
+        for row in rows
+    ]
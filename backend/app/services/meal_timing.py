@@ -0,0 +1,283 @@
+"""Meal-timing analytics: when a user eats, how regularly, and how late.
+
+A user's meals load once as two arrays — UTC epoch seconds and the UTC
+offset of the timezone each meal was logged in — and every statistic is
+a vectorized pass over them:
+
+- clusters: circular k-means on time of day (23:50 and 00:10 are 20
+  minutes apart, not 23 hours), with k from 1 to MAX_CLUSTERS chosen by
+  BIC, so a snack on a fifth of days still gets its own cluster instead
+  of being folded into dinner;
+- regularity: how tightly meals sit around their cluster centres (mean
+  resultant length, 1 = same minute every day);
+- gaps: between consecutive meals, and the overnight fast between the
+  last meal of one local day and the first of the next;
+- late night: share of meals and of recent days with a meal between
+  LATE_START and LATE_END local time.
+
+Results are cached per user until the next meal insert or delete for that
+user (``invalidate``), and recomputed at most once a day otherwise since
+"recent" moves with the calendar.  The cache is per process.
+"""
+
+import threading
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from app.services.db import Connection
+
+DAY = 86_400
+LATE_START = 22 * 60  # minutes after local midnight
+LATE_END = 4 * 60
+RECENT_DAYS = 28
+# Late-night eating is flagged when at least this share of recent days has a late meal
+LATE_DAYS_FLAG = 0.25
+MAX_CLUSTERS = 5
+KMEANS_ITERATIONS = 25
+# Floor on a cluster's spread in the BIC, so identical times stay finite
+MIN_SPREAD_MINUTES = 5
+# Offset sampling step; no zone changes its offset twice within two weeks
+OFFSET_GRID = 14 * DAY
+
+_cache: dict[str, tuple[date, dict]] = {}
+# Bumped on every invalidation, so a result computed from rows read before
+# a concurrent insert is not cached over it
+_versions: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def invalidate(user_id: str) -> None:
+    with _lock:
+        _cache.pop(user_id, None)
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+# ── Loading ──────────────────────────────────────────────────────────
+
+
+def utc_offsets(epoch: np.ndarray, tz: str) -> np.ndarray:
+    """UTC offset in seconds of ``tz`` at each instant.
+
+    The offset is sampled every OFFSET_GRID seconds across the history;
+    where two samples differ, the transition is bisected to the second.
+    Each meal then takes its offset from the sorted transitions, so years
+    of history cost a few hundred zone lookups rather than one per meal.
+    """
+    if not len(epoch):
+        return np.zeros(0, dtype=np.int64)
+    zone = ZoneInfo(tz)
+
+    def offset(seconds: int) -> int:
+        moment = datetime.fromtimestamp(int(seconds), timezone.utc).astimezone(zone)
+        return int(moment.utcoffset().total_seconds())
+
+    grid = np.arange(epoch.min(), epoch.max() + OFFSET_GRID, OFFSET_GRID)
+    values = [offset(t) for t in grid]
+    starts, offsets = [int(grid[0])], [values[0]]
+    for i in np.flatnonzero(np.diff(values)):
+        low, high = int(grid[i]), int(grid[i + 1])
+        while high - low > 1:
+            middle = (low + high) // 2
+            if offset(middle) == values[i]:
+                low = middle
+            else:
+                high = middle
+        starts.append(high)
+        offsets.append(values[i + 1])
+    return np.array(offsets, dtype=np.int64)[np.searchsorted(starts, epoch, side="right") - 1]
+
+
+async def load(conn: Connection, user_id: str) -> tuple[np.ndarray, np.ndarray]:
+    """(UTC epoch seconds, UTC offset seconds) of every meal, oldest first."""
+    rows = await conn.fetch(
+        "SELECT logged_at, tz FROM meals WHERE user_id = $1 ORDER BY logged_at", user_id
+    )
+    epoch = np.fromiter((row["logged_at"].timestamp() for row in rows), dtype=np.int64, count=len(rows))
+    zones = np.array([row["tz"] or "UTC" for row in rows], dtype=object)
+    offsets = np.zeros(len(rows), dtype=np.int64)
+    for tz in set(zones):
+        mask = zones == tz
+        offsets[mask] = utc_offsets(epoch[mask], tz)
+    return epoch, offsets
+
+
+# ── Analysis ─────────────────────────────────────────────────────────
+
+
+def _cluster_name(minute: float) -> str:
+    hour = minute / 60
+    if 4 <= hour < 11:
+        return "breakfast"
+    if 11 <= hour < 16:
+        return "lunch"
+    if 16 <= hour < 19:
+        return "snack"
+    if 19 <= hour < 22:
+        return "dinner"
+    return "late night"
+
+
+def _to_minute(angle: np.ndarray) -> np.ndarray:
+    return (angle % (2 * np.pi)) / (2 * np.pi) * 1440
+
+
+def circular_kmeans(
+    minutes: np.ndarray, k: int, init: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Cluster times of day on the circle. Returns (centre angles, labels).
+
+    Deterministic: centres start at ``init`` (angles) when given, else at
+    the circular quantiles of the data.
+    """
+    angles = minutes / 1440 * 2 * np.pi
+    points = np.column_stack([np.cos(angles), np.sin(angles)])
+    if init is None:
+        ordered = np.sort(angles)
+        centres = ordered[(np.arange(k) * len(ordered) + len(ordered) // 2) // k]
+    else:
+        centres = np.asarray(init, dtype=float)
+    labels = np.zeros(len(angles), dtype=np.int64)
+    for iteration in range(KMEANS_ITERATIONS):
+        # Nearest centre on the circle = largest cosine similarity
+        similarity = points @ np.vstack([np.cos(centres), np.sin(centres)])
+        new_labels = similarity.argmax(axis=1)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros((k, 2))
+        np.add.at(sums, labels, points)
+        empty = ~sums.any(axis=1)
+        centres = np.where(empty, centres, np.arctan2(sums[:, 1], sums[:, 0]))
+    return centres, labels
+
+
+def bic(minutes: np.ndarray, labels: np.ndarray, k: int) -> float:
+    """BIC of a clustering read as a mixture of wrapped normals (lower is better).
+
+    Each cluster is one component with its share of meals as the weight
+    and its circular standard deviation as the spread.
+    """
+    n = len(minutes)
+    angles = minutes / 1440 * 2 * np.pi
+    counts = np.bincount(labels, minlength=k)
+    resultant = np.hypot(
+        np.bincount(labels, np.cos(angles), minlength=k),
+        np.bincount(labels, np.sin(angles), minlength=k),
+    ) / np.maximum(counts, 1)
+    spread = np.sqrt(-2 * np.log(np.clip(resultant, 1e-12, 1))) / (2 * np.pi) * 1440
+    spread = np.maximum(spread, MIN_SPREAD_MINUTES)
+    used = counts > 0
+    c, sd = counts[used], spread[used]
+    log_likelihood = float((c * np.log(c / n) - c * np.log(sd * np.sqrt(2 * np.pi)) - c / 2).sum())
+    return -2 * log_likelihood + (3 * used.sum() - 1) * np.log(n)
+
+
+def choose_clusters(minutes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """The k-means clustering (centres, labels) with the lowest BIC.
+
+    Each k is fitted twice: from quantile starts, and from the best k-1
+    centres plus the meal farthest from all of them, which finds a small
+    cluster next to a large one that the quantile starts split past.
+    """
+    angles = minutes / 1440 * 2 * np.pi
+    best = circular_kmeans(minutes, 1)
+    best_bic = bic(minutes, best[1], 1)
+    previous = best[0]
+    distinct = len(np.unique(np.round(minutes)))
+    for k in range(2, min(MAX_CLUSTERS, distinct) + 1):
+        nearest = np.cos(angles[:, None] - previous[None, :]).max(axis=1)
+        seeded = np.append(previous, angles[nearest.argmin()])
+        fits = [circular_kmeans(minutes, k), circular_kmeans(minutes, k, init=seeded)]
+        scores = [bic(minutes, labels, k) for _, labels in fits]
+        fit = fits[int(np.argmin(scores))]
+        previous = fit[0]
+        if min(scores) < best_bic:
+            best, best_bic = fit, min(scores)
+    return best
+
+
+def analyze(epoch: np.ndarray, offsets: np.ndarray, today: date | None = None) -> dict:
+    """Every timing statistic for one user's meals (sorted by ``epoch``)."""
+    n = len(epoch)
+    if n == 0:
+        return {"meal_count": 0, "days": 0, "clusters": []}
+
+    local = epoch + offsets
+    local_days = local // DAY
+    minutes = (local % DAY) / 60
+    unique_days, day_index, per_day = np.unique(local_days, return_index=True, return_counts=True)
+
+    # Clusters
+    centres, labels = choose_clusters(minutes)
+    k = len(centres)
+    angles = minutes / 1440 * 2 * np.pi
+    cos_sum = np.bincount(labels, np.cos(angles), minlength=k)
+    sin_sum = np.bincount(labels, np.sin(angles), minlength=k)
+    counts = np.bincount(labels, minlength=k)
+    resultant = np.hypot(cos_sum, sin_sum) / np.maximum(counts, 1)
+    # Circular standard deviation, in minutes
+    spread = np.sqrt(-2 * np.log(np.clip(resultant, 1e-12, 1))) / (2 * np.pi) * 1440
+    centre_minutes = _to_minute(centres)
+    order = np.argsort(centre_minutes)
+    clusters = [
+        {
+            "label": _cluster_name(centre_minutes[i]),
+            "center": f"{int(centre_minutes[i]) // 60:02d}:{int(centre_minutes[i]) % 60:02d}",
+            "center_minute": int(centre_minutes[i]),
+            "meals": int(counts[i]),
+            "share": round(float(counts[i] / n), 3),
+            "spread_minutes": round(abs(float(spread[i])), 1),
+        }
+        for i in order
+        if counts[i]
+    ]
+    regularity = float((resultant * counts).sum() / n)
+
+    # Gaps
+    gaps = np.diff(epoch) / 3600
+    # First meal of each local day after the first, minus the previous meal
+    firsts = day_index[1:]
+    consecutive = np.diff(unique_days) == 1
+    overnight = (epoch[firsts] - epoch[firsts - 1])[consecutive] / 3600
+
+    # Late night (the window wraps midnight)
+    late = (minutes >= LATE_START) | (minutes < LATE_END)
+    # A 01:00 snack belongs to the evening before
+    late_days = np.unique(local_days[late] - (minutes[late] < LATE_END))
+    today = today or datetime.now(timezone.utc).date()
+    recent_from = (today - timedelta(days=RECENT_DAYS)).toordinal() - date(1970, 1, 1).toordinal()
+    recent_late = int((late_days >= recent_from).sum())
+    recent_logged = int((unique_days >= recent_from).sum())
+    late_days_share = recent_late / recent_logged if recent_logged else 0.0
+
+    return {
+        "meal_count": n,
+        "days": len(unique_days),
+        "meals_per_day": round(float(per_day.mean()), 2),
+        "clusters": clusters,
+        "regularity": round(regularity, 3),
+        "median_gap_hours": round(float(np.median(gaps)), 2) if n > 1 else None,
+        "longest_gap_hours": round(float(gaps.max()), 2) if n > 1 else None,
+        "overnight_fast_hours": round(float(overnight.mean()), 2) if overnight.size else None,
+        "late_night_share": round(float(late.mean()), 3),
+        "late_night_days_recent": recent_late,
+        "late_night_days_share": round(late_days_share, 3),
+        "late_night_flag": late_days_share >= LATE_DAYS_FLAG,
+    }
+
+
+async def get_meal_timing(conn: Connection, user_id: str, today: date) -> dict:
+    """Cached ``analyze`` for a user; ``today`` is their local date."""
+    with _lock:
+        cached = _cache.get(user_id)
+        version = _versions.get(user_id, 0)
+    if cached and cached[0] == today:
+        return cached[1]
+    epoch, offsets = await load(conn, user_id)
+    result = analyze(epoch, offsets, today)
+    with _lock:
+        if _versions.get(user_id, 0) == version:
+            _cache[user_id] = (today, result)
+    return result
@@ -0,0 +1,43 @@
+"""In-process counters, gauges and timings, exposed at ``/api/metrics``.
+
+Deliberately tiny: a dict per kind guarded by one lock.  Names are dotted
+(``persistence.failed``) so a scraper can group them by prefix.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_counters: dict[str, int] = {}
+_gauges: dict[str, float] = {}
+_timings: dict[str, dict[str, float]] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one duration sample (count / total / max)."""
+    with _lock:
+        stat = _timings.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        stat["count"] += 1
+        stat["total_s"] += seconds
+        stat["max_s"] = max(stat["max_s"], seconds)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {
+                name: {k: round(v, 4) for k, v in stat.items()}
+                for name, stat in _timings.items()
+            },
+        }
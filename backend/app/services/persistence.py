@@ -0,0 +1,271 @@
+"""Post-response persistence stage.
+
+Media URLs are content hashes, so the pipeline can put them in the response
+before anything is written.  The writes themselves (and, later, database
+inserts) are submitted here as jobs and run after the response has gone out:
+
+  submit() → bounded in-process queue → worker threads → handler
+                    │ full / shutdown           │ exception
+                    ▼                           ▼
+              spool directory  ◄──────  retry with backoff, then spool
+
+Spooled jobs are pickled to disk and picked up again whenever the queue
+drains, so a full queue or a crash loses nothing.  Jobs that exhaust their
+retries are parked as ``*.failed`` and only retried on the next start.
+Everything is counted under ``persistence.*`` in ``app.services.metrics``.
+
+When the stage has not been started (scripts such as ``batch_test.py`` call
+``run_pipeline`` without the FastAPI lifespan) jobs run inline.
+"""
+
+import logging
+import os
+import pickle
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = Path(__file__).resolve().parent.parent.parent / "spool" / "persistence"
+RETRY_BASE_S = 0.5
+RETRY_MAX_S = 30.0
+
+_handlers: dict[str, Callable[[dict], None]] = {}
+_spool_hooks: dict[str, Callable[[dict], None]] = {}
+
+
+@dataclass
+class Job:
+    kind: str
+    payload: dict
+    attempts: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+def register_handler(
+    kind: str,
+    handler: Callable[[dict], None],
+    on_spool: Callable[[dict], None] | None = None,
+) -> None:
+    """``on_spool`` is called with the payload whenever a job of this kind
+    leaves memory for the spool directory (full queue, shutdown, or parked
+    after failing), so in-memory state kept for it can be let go."""
+    _handlers[kind] = handler
+    if on_spool is not None:
+        _spool_hooks[kind] = on_spool
+
+
+def _run_job(job: Job) -> None:
+    handler = _handlers.get(job.kind)
+    if handler is None:
+        raise LookupError(f"No persistence handler registered for '{job.kind}'")
+    t0 = time.time()
+    handler(job.payload)
+    metrics.observe(f"persistence.{job.kind}", time.time() - t0)
+
+
+class PersistenceStage:
+    def __init__(
+        self,
+        maxsize: int = 256,
+        workers: int = 2,
+        max_attempts: int = 5,
+        spool_dir: Path = DEFAULT_SPOOL_DIR,
+    ):
+        self._queue: queue.Queue[Job | None] = queue.Queue(maxsize=maxsize)
+        self._workers = workers
+        self._max_attempts = max_attempts
+        self._spool_dir = spool_dir
+        self._threads: list[threading.Thread] = []
+        self._spool_lock = threading.Lock()
+        self._stopping = threading.Event()
+        # Set whenever a job is spooled; replays stop listing the directory
+        # once it has been found empty.  Both happen under _spool_lock, so a
+        # job spooled during a replay is never left behind.
+        self._spool_dirty = True
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stopping.is_set()
+
+    # ── Lifecycle ────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        self._spool_dir.mkdir(parents=True, exist_ok=True)
+        for path in self._spool_dir.glob("*.failed"):
+            path.rename(path.with_suffix(".job"))
+        self._stopping.clear()
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"persistence-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Persistence stage started (%d workers)", self._workers)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Drain what we can within ``timeout``, spool the rest."""
+        if not self._threads:
+            return
+        self._stopping.set()
+        deadline = time.time() + timeout
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=max(0.0, deadline - time.time()))
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.time()))
+        self._threads = []
+
+        leftover = 0
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self._spool(job)
+                leftover += 1
+        if leftover:
+            logger.warning("Spooled %d unfinished persistence jobs at shutdown", leftover)
+
+    # ── Submission ───────────────────────────────────────────────────
+
+    def submit(self, job: Job) -> None:
+        metrics.incr("persistence.submitted")
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._spool(job)
+        metrics.set_gauge("persistence.queue_depth", self._queue.qsize())
+
+    # ── Worker ───────────────────────────────────────────────────────
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                job = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                if self._spool_dirty:
+                    self._replay_spool()
+                continue
+            if job is None:
+                return
+            self._process(job)
+            if self._spool_dirty and self._queue.empty():
+                self._replay_spool()
+            metrics.set_gauge("persistence.queue_depth", self._queue.qsize())
+
+    def _process(self, job: Job) -> None:
+        while True:
+            try:
+                _run_job(job)
+                metrics.incr("persistence.completed")
+                return
+            except Exception as exc:
+                job.attempts += 1
+                if job.attempts >= self._max_attempts or self._stopping.is_set():
+                    logger.error(
+                        "Persistence job %s (%s) failed after %d attempts: %s — parking",
+                        job.id, job.kind, job.attempts, exc,
+                    )
+                    metrics.incr("persistence.failed")
+                    self._spool(job, suffix=".failed")
+                    return
+                delay = min(RETRY_MAX_S, RETRY_BASE_S * 2 ** (job.attempts - 1))
+                logger.warning(
+                    "Persistence job %s (%s) failed: %s — retry %d in %.1fs",
+                    job.id, job.kind, exc, job.attempts, delay,
+                )
+                metrics.incr("persistence.retried")
+                time.sleep(delay)
+
+    # ── Durable fallback ─────────────────────────────────────────────
+
+    def _spool(self, job: Job, suffix: str = ".job") -> None:
+        """Atomically write the job to the spool directory."""
+        self._spool_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self._spool_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(job, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        with self._spool_lock:
+            os.replace(tmp_name, self._spool_dir / f"{time.time_ns()}-{job.id}{suffix}")
+            if suffix == ".job":
+                self._spool_dirty = True
+        metrics.incr("persistence.spilled")
+        hook = _spool_hooks.get(job.kind)
+        if hook is not None:
+            try:
+                hook(job.payload)
+            except Exception as exc:
+                logger.error("Spool hook for %s failed: %s", job.kind, exc)
+
+    def _replay_spool(self, limit: int = 64) -> None:
+        """Move spooled jobs back into the queue while it has room."""
+        with self._spool_lock:
+            paths = sorted(self._spool_dir.glob("*.job"))[:limit]
+            if not paths:
+                self._spool_dirty = False
+                return
+            for path in paths:
+                try:
+                    job = pickle.loads(path.read_bytes())
+                except Exception as exc:
+                    logger.error("Unreadable spool file %s: %s", path.name, exc)
+                    path.rename(path.with_suffix(".bad"))
+                    continue
+                # Fresh retry budget for jobs that already failed once
+                job.attempts = 0
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    return
+                path.unlink(missing_ok=True)
+                metrics.incr("persistence.replayed")
+
+
+_stage: PersistenceStage | None = None
+
+
+def start() -> None:
+    global _stage
+    if _stage is None:
+        _stage = PersistenceStage(
+            maxsize=settings.persistence_queue_size,
+            workers=settings.persistence_workers,
+            max_attempts=settings.persistence_max_attempts,
+            spool_dir=(
+                Path(settings.persistence_spool_dir)
+                if settings.persistence_spool_dir
+                else DEFAULT_SPOOL_DIR
+            ),
+        )
+    _stage.start()
+
+
+def stop() -> None:
+    if _stage is not None:
+        _stage.stop()
+
+
+def submit(kind: str, payload: dict) -> None:
+    """Queue a job for after the response; runs inline if the stage is not running."""
+    job = Job(kind=kind, payload=payload)
+    if _stage is not None and _stage.running:
+        _stage.submit(job)
+        return
+    _run_job(job)
@@ -2,28 +2,57 @@ import logging
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from app.config import settings
 from app.models.schemas import (
     AnalyzeResponse,
     DetectionResult,
     FoodAnalysis,
+    MealMetrics,
     SegmentationResult,
     SegmentedFoodItem,
 )
-from app.services.detection import detect_with_yolo_world
-from app.services.gpt_service import analyze_food_image, classify_food_crop
-from app.services.image_store import save_crop, save_visualization
+from app.services.detection import YoloBox, detect_with_yolo_world
+from app.services import label_merges
+from app.services.gpt_service import (
+    AnalysisStream,
+    SplitAnalysis,
+    analyze_food_image,
+    classify_food_crop,
+)
+from app.services.image_store import save_crops, save_visualization
 from app.services.nms import cross_class_nms
 from app.services.post_processing import run_post_processing
+from app.services.pruning import run_pruning
 from app.services.segmentation import build_visualization, segment_all_crops
 from app.utils.image import (
     bytes_to_numpy_rgb,
     numpy_rgb_to_jpeg_bytes,
     resize_if_needed,
 )
-from app.utils.parsing import extract_item_names
+from app.utils.labels import generic_keys
+from app.utils.parsing import display_fields, item_names, structured_metrics
 
 logger = logging.getLogger(__name__)
 
+# "two_call": GPT classifies each box crop before segmentation and checks
+#   each masked crop after it.
+# "fused": every box is segmented under its YOLO label and one batched GPT
+#   call per few masked crops both names and verifies them.
+PIPELINE_MODES = ("two_call", "fused")
+
+# How detection waits on the plate analysis:
+# "wait": for the whole reply.
+# "stream": the reply is streamed and detection starts once its items
+#   list is complete.
+# "split": a short items-only call runs alongside the full analysis;
+#   detection starts on it and the full analysis joins at the response.
+ANALYSIS_HANDOFFS = ("wait", "stream", "split")
+
+# Timings of work that overlaps the critical path, left out of total_s: a
+# streamed or split analysis runs alongside detection, and a progressive
+# session's preview stages ran while the original was uploading
+CONCURRENT_TIMINGS = ("gpt_analysis_s", "preview_gpt_vision_s", "preview_yolo_detection_s")
+
 
 def _crop_box(img_arr, bbox: list[float]) -> tuple[bytes, tuple[int, int, int, int]]:
     """Crop a bounding box region from the image array, return JPEG bytes and int bbox."""
@@ -36,41 +65,158 @@ def _crop_box(img_arr, bbox: list[float]) -> tuple[bytes, tuple[int, int, int, i
     return numpy_rgb_to_jpeg_bytes(crop_arr), (x1, y1, x2, y2)
 
 
-def run_pipeline(image_bytes: bytes) -> AnalyzeResponse:
-    timing: dict[str, float | str] = {}
+def detection_classes(names: list[str], timing: dict[str, float | str]) -> list[str]:
+    """GPT's item names as YOLO class names, one per label key.
+
+    "Carrot" / "Carrots" and "Vegetables" next to its parts would each
+    become boxes to classify, segment and quality-check; they are
+    collapsed here, before any of those calls.
+    """
+    classes = label_merges.unique(names)
+    timing["labels_collapsed"] = len(names) - len(classes)
+    return classes or ["food"]
+
+
+def _total_s(timing: dict[str, float | str]) -> float:
+    """Sum of the stage timings (``*_s``) that are on the critical path."""
+    return round(
+        sum(v for k, v in timing.items() if k.endswith("_s") and k not in CONCURRENT_TIMINGS), 2
+    )
+
+
+def _drop_generic(confirmed_items: list[dict]) -> list[dict]:
+    """Drop crops GPT confirmed only as a generic label ("vegetables") when
+    a specific one it covers ("carrot") was also confirmed."""
+    keys = [label_merges.key(item["label"]) for item in confirmed_items]
+    generic = generic_keys(keys)
+    return [item for item, key in zip(confirmed_items, keys) if key not in generic]
+
+
+def run_analysis(
+    image_bytes: bytes, detail: str | None, timing: dict[str, float | str],
+) -> dict:
+    """Step 1, with its latency, detail level and token counts recorded in ``timing``."""
+    detail = detail or settings.analysis_detail
+    usage: dict[str, int] = {}
+    t0 = time.time()
+    parsed, _raw = analyze_food_image(image_bytes, detail, usage)
+    timing["gpt_vision_s"] = round(time.time() - t0, 2)
+    timing["analysis_detail"] = detail
+    for k, v in usage.items():
+        timing[f"gpt_{k}"] = v
+    return parsed
+
+
+def start_analysis(
+    image_bytes: bytes, detail: str | None, handoff: str, timing: dict[str, float | str],
+) -> tuple[AnalysisStream | SplitAnalysis, list[str]]:
+    """Step 1 with an early hand-off: returns once GPT has listed the items, with their names.
+
+    ``gpt_vision_s`` is the time to the items list — the part detection
+    waits on; the rest of the analysis is waited for in ``finish_pipeline``.
+    """
+    detail = detail or settings.analysis_detail
+    t0 = time.time()
+    pending: AnalysisStream | SplitAnalysis
+    if handoff == "stream":
+        pending = AnalysisStream(image_bytes, detail)
+    else:
+        pending = SplitAnalysis(image_bytes, detail)
+    names = item_names({"items": pending.field("items")})
+    timing["gpt_vision_s"] = round(time.time() - t0, 2)
+    timing["analysis_detail"] = detail
+    return pending, names
+
+
+def run_pipeline(
+    image_bytes: bytes,
+    mode: str | None = None,
+    detail: str | None = None,
+    handoff: str | None = None,
+) -> AnalyzeResponse:
+    """The whole pipeline on one image.  ``handoff`` is one of
+    ANALYSIS_HANDOFFS and defaults to ``settings.analysis_handoff``."""
+    handoff = handoff or settings.analysis_handoff
+    if handoff not in ANALYSIS_HANDOFFS:
+        raise ValueError(f"Unknown analysis hand-off: {handoff}")
+    timing: dict[str, float | str] = {"analysis_handoff": handoff}
 
     # Resize large images to keep latency down
     image_bytes = resize_if_needed(image_bytes, max_dim=2048)
-    img_arr = bytes_to_numpy_rgb(image_bytes)
-    img_h, img_w = img_arr.shape[:2]
 
     # ── Step 1: GPT-4o Vision Analysis ──────────────────────────
-    t0 = time.time()
-    parsed, _raw = analyze_food_image(image_bytes)
-    timing["gpt_vision_s"] = round(time.time() - t0, 2)
+    # Unless waited for, detection starts on the items list while GPT
+    # writes the other fields
+    parsed: dict | AnalysisStream | SplitAnalysis
+    if handoff != "wait":
+        parsed, names = start_analysis(image_bytes, detail, handoff, timing)
+    else:
+        parsed = run_analysis(image_bytes, detail, timing)
+        names = item_names(parsed)
 
-    analysis = FoodAnalysis(**parsed)
-    item_names = extract_item_names(parsed.get("items", ""))
-    if not item_names:
-        item_names = ["food"]
+    classes = detection_classes(names, timing)
 
     # ── Step 2: YOLO-World-XL Detection ─────────────────────────
     t1 = time.time()
-    yolo_boxes = detect_with_yolo_world(image_bytes, class_names=item_names)
+    yolo_boxes = detect_with_yolo_world(image_bytes, class_names=classes)
     timing["yolo_detection_s"] = round(time.time() - t1, 2)
 
-    if not yolo_boxes:
-        # No detections — return GPT-only result
-        timing["total_s"] = round(
-            sum(v for v in timing.values() if isinstance(v, float)), 2
-        )
+    return finish_pipeline(image_bytes, parsed, yolo_boxes, timing, mode)
+
+
+def finish_pipeline(
+    image_bytes: bytes,
+    parsed: dict | AnalysisStream | SplitAnalysis,
+    yolo_boxes: list[YoloBox],
+    timing: dict[str, float | str],
+    mode: str | None = None,
+) -> AnalyzeResponse:
+    """Steps 3–6 on the full-resolution image, given GPT analysis and boxes.
+
+    Progressive sessions run steps 1–2 earlier on a preview and join here
+    once the original arrives.  ``parsed`` is the typed analysis
+    (``analyze_food_image``); the display strings are built from it only
+    for the response.  It may also be a still-running AnalysisStream or
+    SplitAnalysis, waited for only when the response is built.  ``mode`` is
+    one of PIPELINE_MODES and defaults to ``settings.pipeline_mode``.
+    """
+    mode = mode or settings.pipeline_mode
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode}")
+    timing["pipeline_mode"] = mode
+    pending = None if isinstance(parsed, dict) else parsed
+
+    def _analysis() -> dict:
+        if pending is None:
+            return parsed
+        t_wait = time.time()
+        data, _raw = pending.result()
+        # Only the wait is on the critical path; the full analysis ran
+        # alongside detection, so total_s leaves it out (CONCURRENT_TIMINGS)
+        timing["gpt_tail_wait_s"] = round(time.time() - t_wait, 2)
+        timing["gpt_analysis_s"] = round(pending.elapsed_s, 2)
+        for k, v in pending.usage.items():
+            timing[f"gpt_{k}"] = v
+        return data
+
+    def _respond(segmentation: SegmentationResult) -> AnalyzeResponse:
+        data = _analysis()
+        timing["total_s"] = _total_s(timing)
         return AnalyzeResponse(
-            analysis=analysis,
+            analysis=FoodAnalysis(**display_fields(data)),
+            metrics=MealMetrics(**structured_metrics(data)),
             detections=DetectionResult(detections=[]),
-            segmentation=SegmentationResult(),
+            segmentation=segmentation,
             timing=timing,
         )
 
+    img_arr = bytes_to_numpy_rgb(image_bytes)
+    img_h, img_w = img_arr.shape[:2]
+
+    if not yolo_boxes:
+        # No detections — return GPT-only result
+        return _respond(SegmentationResult())
+
     # ── Step 3: Cross-class IoU NMS ─────────────────────────────
     t2 = time.time()
     box_dicts = [
@@ -86,7 +232,10 @@ def run_pipeline(image_bytes: bytes) -> AnalyzeResponse:
 
     # ── Step 4: GPT per-box classification (parallel) ───────────
     t3 = time.time()
-    description = parsed.get("description", "")
+    if pending is None:
+        description = parsed.get("description", "")
+    else:
+        description = pending.field("description") or ""
     confirmed_items: list[dict] = []
 
     def _classify_one(box_dict: dict) -> dict | None:
@@ -101,30 +250,47 @@ def run_pipeline(image_bytes: bytes) -> AnalyzeResponse:
             "confidence": box_dict["confidence"],
         }
 
-    with ThreadPoolExecutor(max_workers=6) as pool:
-        futures = {
-            pool.submit(_classify_one, box): box["label"]
-            for box in filtered_boxes
-        }
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                if result is not None:
-                    confirmed_items.append(result)
-            except Exception:
-                pass
+    if mode == "fused":
+        # Named and verified after segmentation instead
+        for box in filtered_boxes:
+            crop_bytes, int_bbox = _crop_box(img_arr, box["bbox"])
+            confirmed_items.append({
+                "crop_bytes": crop_bytes,
+                "label": box["label"],
+                "bbox": int_bbox,
+                "confidence": box["confidence"],
+            })
+    else:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            futures = {
+                pool.submit(_classify_one, box): box["label"]
+                for box in filtered_boxes
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                    if result is not None:
+                        confirmed_items.append(result)
+                except Exception:
+                    pass
+        timing["gpt_classification_calls"] = len(filtered_boxes)
     timing["gpt_classification_s"] = round(time.time() - t3, 2)
 
+    n_confirmed = len(confirmed_items)
+    confirmed_items = _drop_generic(confirmed_items)
+    timing["generic_dropped"] = n_confirmed - len(confirmed_items)
+
     if not confirmed_items:
-        timing["total_s"] = round(
-            sum(v for v in timing.values() if isinstance(v, float)), 2
-        )
-        return AnalyzeResponse(
-            analysis=analysis,
-            detections=DetectionResult(detections=[]),
-            segmentation=SegmentationResult(),
-            timing=timing,
-        )
+        return _respond(SegmentationResult())
+
+    # ── Step 4.5: Pre-segmentation pruning ─────────────────
+    # Same-label, near-identical and contained boxes would each cost a
+    # lang-SAM call only for post-processing to drop the mask
+    t_pr = time.time()
+    confirmed_items, prune_stats = run_pruning(confirmed_items)
+    timing["pruning_s"] = round(time.time() - t_pr, 2)
+    for k, v in prune_stats.items():
+        timing[f"prune_{k}"] = v
 
     # ── Step 5: Crop → lang-SAM segmentation (parallel) ────────
     t4 = time.time()
@@ -142,25 +308,31 @@ def run_pipeline(image_bytes: bytes) -> AnalyzeResponse:
     # ── Step 5.5: Post-processing filters ────────────────────
     if seg_items_data:
         t_pp = time.time()
-        seg_items_data, pp_stats = run_post_processing(seg_items_data)
+        seg_items_data, pp_stats = run_post_processing(
+            seg_items_data,
+            fused_description=description if mode == "fused" else None,
+        )
         timing["post_processing_s"] = round(time.time() - t_pp, 2)
         for k, v in pp_stats.items():
             timing[f"pp_{k}"] = v
 
+    # URLs are content hashes, so they are known now; the writes themselves
+    # are queued on the persistence stage and finish after the response.
     try:
         if seg_items_data:
             vis_bytes = build_visualization(image_bytes, seg_items_data)
             vis_url = save_visualization(vis_bytes)
-            seg_items = []
-            for item in seg_items_data:
-                crop_url = save_crop(item.crop_bytes, item.label)
-                seg_items.append(
-                    SegmentedFoodItem(
-                        label=item.label,
-                        crop_url=crop_url,
-                        confidence=item.confidence,
-                    )
+            crop_urls = save_crops(
+                [(item.crop_bytes, item.label) for item in seg_items_data]
+            )
+            seg_items = [
+                SegmentedFoodItem(
+                    label=item.label,
+                    crop_url=crop_url,
+                    confidence=item.confidence,
                 )
+                for item, crop_url in zip(seg_items_data, crop_urls)
+            ]
             seg_result = SegmentationResult(
                 segmented_items=seg_items,
                 visualization_url=vis_url,
@@ -169,13 +341,4 @@ def run_pipeline(image_bytes: bytes) -> AnalyzeResponse:
     except Exception as exc:
         logger.error("Visualization/save failed: %s", exc)
 
-    timing["total_s"] = round(
-        sum(v for v in timing.values() if isinstance(v, float)), 2
-    )
-
-    return AnalyzeResponse(
-        analysis=analysis,
-        detections=DetectionResult(detections=[]),
-        segmentation=seg_result,
-        timing=timing,
-    )
+    return _respond(seg_result)
@@ -2,20 +2,32 @@
 
 Runs AFTER segmentation, BEFORE visualization. Ordered cheapest-first:
   1. Brightness filter  — reject mostly-black crops  (local, <10ms)
-  2. Duplicate merge     — keep largest mask per label (local, <1ms)
+  2. Duplicate merge     — keep largest of touching same-key masks (local, <1ms)
   3. Containment resolve — GPT picks inner vs outer   (GPT text, ~0.5s/pair)
+                           generic vs specific ("vegetables" around
+                           "carrot") is decided locally, no GPT call
   4. GPT quality check   — verify crop matches label  (GPT vision, parallel)
+                           only for masks the local scorer is unsure of
+                           (app/services/mask_quality.py)
+
+In the fused pipeline mode boxes reach segmentation unclassified, so a
+batched GPT call names and verifies the masked crops right after the
+brightness filter (1b) and replaces the quality check.
 """
 
 import io
 import logging
+import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
 from PIL import Image
 
+from app.config import settings
+from app.services import label_merges, mask_quality
 from app.services.segmentation import SegmentedItem
 from app.utils.image import image_bytes_to_data_uri
+from app.utils.labels import is_hypernym
 
 logger = logging.getLogger(__name__)
 
@@ -49,28 +61,129 @@ def filter_brightness(items: list[SegmentedItem]) -> tuple[list[SegmentedItem],
     return kept, removed
 
 
-# ── Filter 2: Duplicate Label Merge ─────────────────────────────────
+# ── Filter 1b: Fused Classify + Verify ──────────────────────────────
 
+# Masked crops per GPT call
+FUSED_BATCH = 6
 
-def filter_duplicates(items: list[SegmentedItem]) -> tuple[list[SegmentedItem], int]:
-    """Keep only the largest mask per normalized label."""
-    groups: dict[str, list[SegmentedItem]] = {}
-    for item in items:
-        key = item.label.strip().lower()
-        groups.setdefault(key, []).append(item)
 
+def filter_fused_classify(
+    items: list[SegmentedItem], description: str, stats: dict[str, int] | None = None,
+) -> tuple[list[SegmentedItem], int]:
+    """Name each masked crop with GPT and drop those that are not a described food.
+
+    Items arrive labelled with the detector's class.  Batches whose call
+    fails keep those labels (fail-open, like the quality check).
+    """
+    from app.services.gpt_service import classify_segmented_crops
+
+    batches = [items[i:i + FUSED_BATCH] for i in range(0, len(items), FUSED_BATCH)]
     kept: list[SegmentedItem] = []
-    for group in groups.values():
-        if len(group) == 1:
-            kept.append(group[0])
-        else:
-            best = max(group, key=lambda it: it.mask.sum())
-            kept.append(best)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futures = {
+            pool.submit(
+                classify_segmented_crops,
+                [item.crop_bytes for item in batch],
+                [item.label for item in batch],
+                description,
+            ): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            names = future.result()
+            if names is None:
+                kept.extend(batch)
+                continue
+            for item, name in zip(batch, names):
+                if name is None:
+                    logger.info("Fused check rejected '%s'", item.label)
+                    continue
+                item.label = name
+                kept.append(item)
 
+    if stats is not None:
+        stats["fused_gpt_calls"] = len(batches)
     removed = len(items) - len(kept)
+    return kept, removed
+
+
+# ── Filter 2: Duplicate Label Merge ─────────────────────────────────
+
+# Masks this close are the same pixels, whatever the two labels say
+SAME_MASK_IOU = 0.85
+
+
+def _mask_iou(a: SegmentedItem, b: SegmentedItem, box_a, box_b) -> float:
+    """IoU of two masks, computed over their bounding boxes' union only."""
+    if _intersection_area(box_a, box_b) == 0 or a.mask.shape != b.mask.shape:
+        return 0.0
+    x1, y1 = min(box_a[0], box_b[0]), min(box_a[1], box_b[1])
+    x2, y2 = max(box_a[2], box_b[2]), max(box_a[3], box_b[3])
+    mask_a, mask_b = a.mask[y1:y2, x1:x2], b.mask[y1:y2, x1:x2]
+    union = int(np.logical_or(mask_a, mask_b).sum())
+    return int(np.logical_and(mask_a, mask_b).sum()) / union if union else 0.0
+
+
+def touching_groups(keys: list[str], boxes: list[tuple[int, int, int, int]]) -> list[list[int]]:
+    """Indices grouped by label key and by boxes that overlap or touch.
+
+    Same-key boxes connected through a chain of overlaps are one group;
+    same-key boxes apart from each other (two wings on the plate) are not.
+    """
+    parent = list(range(len(keys)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(keys)):
+        ax1, ay1, ax2, ay2 = boxes[i]
+        for j in range(i + 1, len(keys)):
+            bx1, by1, bx2, by2 = boxes[j]
+            if keys[i] == keys[j] and ax1 <= bx2 and bx1 <= ax2 and ay1 <= by2 and by1 <= ay2:
+                parent[find(i)] = find(j)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(keys)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def filter_duplicates(items: list[SegmentedItem]) -> tuple[list[SegmentedItem], int]:
+    """Keep only the largest mask of each same-key group (``touching_groups``).
+
+    Survivors with related keys ("basmati rice", "rice") whose masks are
+    near-identical are merged as well, and the pair is reported to
+    ``label_merges`` so that repeat sightings become a learned merge.
+    """
+    keys = [label_merges.key(item.label) for item in items]
+    item_boxes = [_bbox_from_mask(item.mask) for item in items]
+
+    kept: list[tuple[str, SegmentedItem]] = []
+    boxes: list[tuple[int, int, int, int]] = []
+    for group in touching_groups(keys, item_boxes):
+        best = max(group, key=lambda idx: items[idx].mask.sum())
+        kept.append((keys[best], items[best]))
+        boxes.append(item_boxes[best])
+
+    merged: set[int] = set()
+    for i in range(len(kept)):
+        for j in range(i + 1, len(kept)):
+            if i in merged or j in merged or not label_merges.related(kept[i][0], kept[j][0]):
+                continue
+            if _mask_iou(kept[i][1], kept[j][1], boxes[i], boxes[j]) >= SAME_MASK_IOU:
+                label_merges.observe(kept[i][0], kept[j][0])
+                smaller = i if _box_area(boxes[i]) < _box_area(boxes[j]) else j
+                merged.add(smaller)
+    kept_items = [item for idx, (_, item) in enumerate(kept) if idx not in merged]
+
+    removed = len(items) - len(kept_items)
     if removed:
         logger.info("Duplicate merge removed %d items", removed)
-    return kept, removed
+    return kept_items, removed
 
 
 # ── Filter 3: Containment Resolution ────────────────────────────────
@@ -133,22 +246,26 @@ def _ask_gpt_containment(inner_label: str, outer_label: str) -> str | None:
         return None
 
 
-def filter_containment(items: list[SegmentedItem]) -> tuple[list[SegmentedItem], int]:
-    """Remove items where one bounding box is 80%+ inside another."""
-    if len(items) < 2:
-        return items, 0
+def resolve_containment(
+    labels: list[str], bboxes: list[tuple[int, int, int, int]],
+) -> set[int]:
+    """Indices to drop where one bounding box is 80%+ inside another.
 
-    bboxes = [_bbox_from_mask(item.mask) for item in items]
+    A generic label containing a specific one ("vegetables" around
+    "carrot") loses without asking GPT; other pairs go to GPT.  Shared by
+    this filter (mask boxes) and pre-segmentation pruning (detection boxes).
+    """
+    keys = [label_merges.key(label) for label in labels]
     to_remove: set[int] = set()
 
-    for i in range(len(items)):
+    for i in range(len(labels)):
         if i in to_remove:
             continue
-        for j in range(i + 1, len(items)):
+        for j in range(i + 1, len(labels)):
             if j in to_remove:
                 continue
             # Skip same-label pairs (already handled by duplicate merge)
-            if items[i].label.strip().lower() == items[j].label.strip().lower():
+            if keys[i] == keys[j]:
                 continue
 
             inter = _intersection_area(bboxes[i], bboxes[j])
@@ -164,16 +281,32 @@ def filter_containment(items: list[SegmentedItem]) -> tuple[list[SegmentedItem],
                 else:
                     inner_idx, outer_idx = j, i
 
-                keep_label = _ask_gpt_containment(
-                    items[inner_idx].label, items[outer_idx].label
-                )
+                if is_hypernym(keys[outer_idx], keys[inner_idx]):
+                    to_remove.add(outer_idx)
+                    continue
+                if is_hypernym(keys[inner_idx], keys[outer_idx]):
+                    to_remove.add(inner_idx)
+                    continue
+
+                keep_label = _ask_gpt_containment(labels[inner_idx], labels[outer_idx])
                 if keep_label is not None:
                     # Remove the one GPT says to drop
-                    if keep_label.strip().lower() == items[inner_idx].label.strip().lower():
+                    if keep_label.strip().lower() == labels[inner_idx].strip().lower():
                         to_remove.add(outer_idx)
                     else:
                         to_remove.add(inner_idx)
 
+    return to_remove
+
+
+def filter_containment(items: list[SegmentedItem]) -> tuple[list[SegmentedItem], int]:
+    """Remove items whose mask's bounding box is 80%+ inside another's."""
+    if len(items) < 2:
+        return items, 0
+
+    bboxes = [_bbox_from_mask(item.mask) for item in items]
+    to_remove = resolve_containment([item.label for item in items], bboxes)
+
     kept = [item for idx, item in enumerate(items) if idx not in to_remove]
     removed = len(to_remove)
     if removed:
@@ -184,8 +317,11 @@ def filter_containment(items: list[SegmentedItem]) -> tuple[list[SegmentedItem],
 # ── Filter 4: GPT Mask Quality Check ────────────────────────────────
 
 
-def _check_crop_quality(item: SegmentedItem) -> bool:
-    """Ask GPT-4o if the crop clearly shows the labeled food. Returns True to keep."""
+def _check_crop_quality(item: SegmentedItem) -> bool | None:
+    """Ask GPT-4o if the crop clearly shows the labeled food.
+
+    Returns True to keep, False to drop, None when GPT could not be asked.
+    """
     try:
         from app.services.gpt_service import _get_client
 
@@ -215,25 +351,61 @@ def _check_crop_quality(item: SegmentedItem) -> bool:
         return "yes" in answer
     except Exception as exc:
         logger.warning("GPT quality check failed for '%s': %s — keeping item", item.label, exc)
-        return True  # fail-open
+        return None  # fail-open
 
 
-def filter_gpt_quality(items: list[SegmentedItem]) -> tuple[list[SegmentedItem], int]:
-    """Parallel GPT vision check — remove items that don't match their label."""
+def filter_gpt_quality(
+    items: list[SegmentedItem], stats: dict[str, int] | None = None,
+) -> tuple[list[SegmentedItem], int]:
+    """Remove items that don't match their label.
+
+    The local mask-quality score keeps or drops confident items outright;
+    the uncertain band (every item, until calibrated) plus a small
+    calibration sample gets a parallel GPT vision check, whose verdicts are
+    logged for calibration.  Counts of each route go into ``stats`` when
+    given.
+    """
     kept: list[SegmentedItem] = []
+    ask: list[tuple[SegmentedItem, dict[str, float], float, float]] = []
+    dropped = 0
+    sample_rate = settings.mask_quality_sample_rate
+    for item in items:
+        f = mask_quality.features(item)
+        quality = mask_quality.score(f)
+        decision = mask_quality.gate(quality)
+        if decision == "ask":
+            ask.append((item, f, quality, 1.0))
+        elif random.random() < sample_rate:
+            ask.append((item, f, quality, sample_rate))
+        elif decision == "keep":
+            kept.append(item)
+        else:
+            dropped += 1
+            logger.info("Mask quality %.2f rejected '%s'", quality, item.label)
+
     with ThreadPoolExecutor(max_workers=6) as pool:
-        futures = {pool.submit(_check_crop_quality, item): item for item in items}
+        futures = {pool.submit(_check_crop_quality, entry[0]): entry for entry in ask}
         for future in as_completed(futures):
-            item = futures[future]
+            item, f, quality, checked_rate = futures[future]
             try:
-                if future.result():
-                    kept.append(item)
-                else:
-                    logger.info("GPT quality check rejected '%s'", item.label)
+                verdict = future.result()
             except Exception as exc:
                 logger.warning("GPT quality future error for '%s': %s — keeping", item.label, exc)
                 kept.append(item)
+                continue
+            if verdict is None:
+                kept.append(item)
+                continue
+            mask_quality.record_verdict(item, f, quality, verdict, checked_rate)
+            if verdict:
+                kept.append(item)
+            else:
+                logger.info("GPT quality check rejected '%s'", item.label)
 
+    if stats is not None:
+        stats["quality_gpt_checked"] = len(ask)
+        stats["quality_local_kept"] = len(items) - len(ask) - dropped
+        stats["quality_local_dropped"] = dropped
     removed = len(items) - len(kept)
     return kept, removed
 
@@ -244,14 +416,23 @@ def filter_gpt_quality(items: list[SegmentedItem]) -> tuple[list[SegmentedItem],
 def run_post_processing(
     items: list[SegmentedItem],
     enable_gpt_quality_check: bool = True,
+    fused_description: str | None = None,
 ) -> tuple[list[SegmentedItem], dict[str, int]]:
-    """Run all post-processing filters in order. Returns (filtered_items, stats)."""
+    """Run all post-processing filters in order. Returns (filtered_items, stats).
+
+    ``fused_description`` (the plate description) selects the fused mode:
+    crops are classified by GPT after filter 1 and the quality check is
+    skipped.
+    """
     stats: dict[str, int] = {
         "input_count": len(items),
         "brightness_removed": 0,
         "duplicates_removed": 0,
         "containment_removed": 0,
         "gpt_quality_removed": 0,
+        "quality_gpt_checked": 0,
+        "quality_local_kept": 0,
+        "quality_local_dropped": 0,
     }
 
     if not items:
@@ -266,6 +447,16 @@ def run_post_processing(
         stats["output_count"] = 0
         return items, stats
 
+    # Filter 1b: Fused classify + verify (fused mode only)
+    if fused_description is not None:
+        items, n = filter_fused_classify(items, fused_description, stats)
+        stats["fused_removed"] = n
+        enable_gpt_quality_check = False
+
+        if not items:
+            stats["output_count"] = 0
+            return items, stats
+
     # Filter 2: Duplicate label merge
     items, n = filter_duplicates(items)
     stats["duplicates_removed"] = n
@@ -284,7 +475,7 @@ def run_post_processing(
 
     # Filter 4: GPT quality check (optional)
     if enable_gpt_quality_check:
-        items, n = filter_gpt_quality(items)
+        items, n = filter_gpt_quality(items, stats)
         stats["gpt_quality_removed"] = n
 
     stats["output_count"] = len(items)
@@ -0,0 +1,134 @@
+"""Progressive analysis: start on a small preview, finish on the original.
+
+GPT-4o analysis does not need 2048px, and it is the slowest call in the
+pipeline, while uploading the original is the slowest network leg.  A
+client therefore sends a ~768px preview first, which immediately starts
+``analyze_food_image`` and a speculative YOLO-World pass, and uploads the
+full-resolution original in parallel.  When the original arrives the
+session joins the two: preview boxes are scaled up to original
+coordinates and ``finish_pipeline`` crops and segments at full resolution.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from app.config import settings
+from app.models.schemas import AnalyzeResponse
+from app.services.detection import YoloBox, detect_with_yolo_world
+from app.services.pipeline import detection_classes, finish_pipeline, run_analysis
+from app.utils.image import bytes_to_numpy_rgb, resize_if_needed
+from app.utils.parsing import item_names
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_MAX_DIM = 768
+# Preview and original must describe the same framing for boxes to carry over
+ASPECT_TOLERANCE = 0.02
+
+# Preview stages, reported under preview_* by complete_session; of the
+# preview only preview_wait_s is on the critical path
+PREVIEW_STAGES = ("gpt_vision_s", "yolo_detection_s")
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="preview")
+_sessions: dict[str, "Session"] = {}
+_sessions_lock = threading.Lock()
+
+
+@dataclass
+class PreviewResult:
+    parsed: dict  # the typed analysis (analyze_food_image)
+    item_names: list[str]
+    yolo_boxes: list[YoloBox]
+    size: tuple[int, int]  # (height, width)
+    timing: dict[str, float | str]
+
+
+@dataclass
+class Session:
+    id: str
+    future: "Future[PreviewResult]"
+    created_at: float = field(default_factory=time.time)
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+def _run_preview(preview_bytes: bytes, detail: str | None) -> PreviewResult:
+    timing: dict[str, float | str] = {}
+    h, w = bytes_to_numpy_rgb(preview_bytes).shape[:2]
+
+    parsed = run_analysis(preview_bytes, detail, timing)
+
+    classes = detection_classes(item_names(parsed), timing)
+
+    t1 = time.time()
+    yolo_boxes = detect_with_yolo_world(preview_bytes, class_names=classes)
+    timing["yolo_detection_s"] = round(time.time() - t1, 2)
+
+    return PreviewResult(parsed, classes, yolo_boxes, (h, w), timing)
+
+
+def _sweep_expired() -> None:
+    cutoff = time.time() - settings.progressive_session_ttl_s
+    with _sessions_lock:
+        for session_id in [s.id for s in _sessions.values() if s.created_at < cutoff]:
+            _sessions.pop(session_id).future.cancel()
+
+
+def start_session(preview_bytes: bytes, detail: str | None = None) -> str:
+    """Kick off GPT analysis + speculative detection on a preview."""
+    _sweep_expired()
+    preview_bytes = resize_if_needed(preview_bytes, max_dim=PREVIEW_MAX_DIM)
+    session = Session(
+        id=uuid.uuid4().hex, future=_executor.submit(_run_preview, preview_bytes, detail)
+    )
+    with _sessions_lock:
+        _sessions[session.id] = session
+    return session.id
+
+
+def _scale_boxes(boxes: list[YoloBox], sx: float, sy: float) -> list[YoloBox]:
+    return [
+        YoloBox(
+            bbox=[b.bbox[0] * sx, b.bbox[1] * sy, b.bbox[2] * sx, b.bbox[3] * sy],
+            label=b.label,
+            confidence=b.confidence,
+        )
+        for b in boxes
+    ]
+
+
+def complete_session(session_id: str, original_bytes: bytes) -> AnalyzeResponse:
+    """Join the preview results with the original and run steps 3–6."""
+    with _sessions_lock:
+        session = _sessions.pop(session_id, None)
+    if session is None:
+        raise SessionNotFound(session_id)
+
+    original_bytes = resize_if_needed(original_bytes, max_dim=2048)
+    orig_h, orig_w = bytes_to_numpy_rgb(original_bytes).shape[:2]
+
+    t0 = time.time()
+    preview = session.future.result()
+    timing = {
+        f"preview_{k}" if k in PREVIEW_STAGES else k: v for k, v in preview.timing.items()
+    }
+    timing["preview_wait_s"] = round(time.time() - t0, 2)
+
+    prev_h, prev_w = preview.size
+    if abs(orig_w / orig_h - prev_w / prev_h) > ASPECT_TOLERANCE * (prev_w / prev_h):
+        # Different framing (client cropped?) — the speculative boxes don't
+        # apply, so detect again on the original.
+        logger.warning("Preview/original aspect mismatch in session %s; re-detecting", session_id)
+        t1 = time.time()
+        yolo_boxes = detect_with_yolo_world(original_bytes, class_names=preview.item_names)
+        timing["yolo_detection_s"] = round(time.time() - t1, 2)
+    else:
+        yolo_boxes = _scale_boxes(preview.yolo_boxes, orig_w / prev_w, orig_h / prev_h)
+
+    return finish_pipeline(original_bytes, preview.parsed, yolo_boxes, timing)
@@ -0,0 +1,110 @@
+"""Pre-segmentation pruning of classified boxes.
+
+Runs AFTER per-box GPT classification, BEFORE segmentation.  Every box
+that survives costs a lang-SAM prediction (and later a quality-check GPT
+call), yet most of what post-processing removes was already redundant at
+box level.  Ordered cheapest-first:
+  1. Same-label merge   — keep the largest of each group of
+                          overlapping or touching boxes with
+                          one label key                         (local, <1ms)
+  2. Near-identical     — drop the less confident of two boxes
+                          covering the same region              (local, <1ms)
+  3. Containment resolve — generic vs specific locally, else
+                          GPT picks inner vs outer              (GPT text, ~0.5s/pair)
+
+Items are the pipeline's confirmed-box dicts (``label``, ``bbox``,
+``confidence``, ``crop_bytes``).  Post-processing still runs on the masks
+afterwards and catches what boxes cannot show.
+"""
+
+import logging
+
+from app.services import label_merges
+from app.services.nms import compute_iou
+from app.services.post_processing import resolve_containment, touching_groups
+
+logger = logging.getLogger(__name__)
+
+# Cross-label boxes this close are the same region.  NMS suppresses above
+# 0.5 on YOLO's boxes, so this mostly catches boxes kept when NMS failed.
+NEAR_IDENTICAL_IOU = 0.7
+
+
+def _area(item: dict) -> int:
+    x1, y1, x2, y2 = item["bbox"]
+    return max(0, x2 - x1) * max(0, y2 - y1)
+
+
+# ── Step 1: Same-Label Merge ─────────────────────────────────────────
+
+
+def merge_same_label(items: list[dict]) -> tuple[list[dict], int]:
+    """Keep the largest box of each group of same-key boxes that overlap or touch.
+
+    Same-label boxes apart from each other are separate servings (two
+    wings on the plate) and are all kept.
+    """
+    groups = touching_groups(
+        [label_merges.key(item["label"]) for item in items],
+        [tuple(item["bbox"]) for item in items],
+    )
+    kept = [max((items[idx] for idx in group), key=_area) for group in groups]
+    removed = len(items) - len(kept)
+    if removed:
+        logger.info("Pruning merged %d same-label boxes", removed)
+    return kept, removed
+
+
+# ── Step 2: Near-Identical Boxes ─────────────────────────────────────
+
+
+def drop_near_identical(items: list[dict]) -> tuple[list[dict], int]:
+    """Drop the less confident of any two boxes with IoU above NEAR_IDENTICAL_IOU."""
+    ranked = sorted(items, key=lambda it: it["confidence"], reverse=True)
+    kept: list[dict] = []
+    for item in ranked:
+        if all(compute_iou(item["bbox"], k["bbox"]) <= NEAR_IDENTICAL_IOU for k in kept):
+            kept.append(item)
+    removed = len(items) - len(kept)
+    if removed:
+        logger.info("Pruning dropped %d near-identical boxes", removed)
+    return kept, removed
+
+
+# ── Step 3: Containment Resolution ───────────────────────────────────
+
+
+def resolve_box_containment(items: list[dict]) -> tuple[list[dict], int]:
+    """Containment resolution on detection boxes (see ``resolve_containment``)."""
+    if len(items) < 2:
+        return items, 0
+    to_remove = resolve_containment(
+        [item["label"] for item in items], [tuple(item["bbox"]) for item in items]
+    )
+    kept = [item for idx, item in enumerate(items) if idx not in to_remove]
+    if to_remove:
+        logger.info("Pruning resolved %d contained boxes", len(to_remove))
+    return kept, len(to_remove)
+
+
+# ── Orchestrator ─────────────────────────────────────────────────────
+
+
+def run_pruning(items: list[dict]) -> tuple[list[dict], dict[str, int]]:
+    """Run all pruning steps in order. Returns (kept_items, stats)."""
+    stats: dict[str, int] = {
+        "input_count": len(items),
+        "same_label_removed": 0,
+        "near_identical_removed": 0,
+        "containment_removed": 0,
+    }
+
+    if len(items) > 1:
+        items, stats["same_label_removed"] = merge_same_label(items)
+    if len(items) > 1:
+        items, stats["near_identical_removed"] = drop_near_identical(items)
+    if len(items) > 1:
+        items, stats["containment_removed"] = resolve_box_containment(items)
+
+    stats["output_count"] = len(items)
+    return items, stats
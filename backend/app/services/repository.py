@@ -0,0 +1,410 @@
+"""Meal log repository: meals and their segmented food items.
+
+Reads are plain async queries on the pooled connection from
+``app.services.db``.  Writes coming out of the analyze pipeline go through
+the persistence stage instead (``record_meal``), so logging a meal never
+delays the analysis response and survives a restart via the spool.  The
+meal id is generated up front and returned to the client straight away.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from app.models.schemas import (
+    AnalyzeResponse,
+    FoodAnalysis,
+    FoodItemRecord,
+    MealMetrics,
+    MealRecord,
+    SegmentationResult,
+    SegmentedFoodItem,
+)
+from app.services import (
+    badges,
+    db,
+    food_stats,
+    image_store,
+    label_search,
+    meal_timing,
+    persistence,
+    rollups,
+    streaks,
+)
+from app.utils.labels import canonical_label
+from app.utils.parsing import parse_metrics
+
+logger = logging.getLogger(__name__)
+
+METRIC_COLUMNS = list(MealMetrics.model_fields)
+MEAL_COLUMNS = (
+    "id, user_id, logged_at, image_url, visualization_url, analysis, "
+    + ", ".join(METRIC_COLUMNS)
+)
+ITEM_COLUMNS = "id, meal_id, label, crop_url, confidence, liked, created_at"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(logged_at: datetime, meal_id: str) -> str:
+    """Opaque feed position: the (logged_at, id) of the last meal on a page."""
+    raw = json.dumps([logged_at.isoformat(), meal_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        logged_at, meal_id = json.loads(raw)
+        return datetime.fromisoformat(logged_at), str(meal_id)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def _item_record(row: dict) -> FoodItemRecord:
+    return FoodItemRecord(
+        id=row["id"],
+        meal_id=row["meal_id"],
+        label=row["label"],
+        crop_url=row["crop_url"],
+        confidence=row["confidence"],
+        liked=row["liked"],
+        created_at=row["created_at"],
+    )
+
+
+def _meal_record(row: dict, items: list[FoodItemRecord]) -> MealRecord:
+    return MealRecord(
+        id=row["id"],
+        timestamp=row["logged_at"],
+        image_url=row["image_url"],
+        health_score=row["health_score"],
+        metrics=MealMetrics(**{name: row[name] for name in METRIC_COLUMNS}),
+        analysis=FoodAnalysis(**json.loads(row["analysis"])),
+        segmentation=SegmentationResult(
+            segmented_items=[
+                SegmentedFoodItem(label=i.label, crop_url=i.crop_url or "", confidence=i.confidence)
+                for i in items
+            ],
+            visualization_url=row["visualization_url"],
+            item_count=len(items),
+        ),
+        items=items,
+    )
+
+
+def _placeholders(start: int, count: int) -> str:
+    return ", ".join(f"${i}" for i in range(start, start + count))
+
+
+async def _items_by_meal(conn: db.Connection, meal_ids: list[str]) -> dict[str, list[FoodItemRecord]]:
+    """Items for a page of meals in one query rather than one per meal."""
+    by_meal: dict[str, list[FoodItemRecord]] = {meal_id: [] for meal_id in meal_ids}
+    if not meal_ids:
+        return by_meal
+    rows = await conn.fetch(
+        f"SELECT {ITEM_COLUMNS} FROM food_items "
+        f"WHERE meal_id IN ({_placeholders(1, len(meal_ids))}) ORDER BY meal_id, id",
+        *meal_ids,
+    )
+    for row in rows:
+        by_meal[row["meal_id"]].append(_item_record(row))
+    return by_meal
+
+
+# ── Writes ───────────────────────────────────────────────────────────
+
+
+async def insert_meal(meal: dict) -> None:
+    """Insert a meal, its items, and its rollup, streak, badge and food-stat updates atomically.
+
+    Idempotent on ``meal["id"]``: a retried job finds the row and changes
+    nothing, so rollups are never counted twice.
+    """
+    logged_at = datetime.fromisoformat(meal["logged_at"])
+    tz = meal.get("tz") or "UTC"
+    day = rollups.local_day(logged_at, tz)
+    # Typed at analysis time; parsed from the text only for jobs queued without them
+    metrics = meal.get("metrics") or parse_metrics(meal["analysis"])
+    async with db.get_db().transaction() as conn:
+        inserted = await conn.fetchrow(
+            f"INSERT INTO meals (id, user_id, logged_at, tz, local_day, image_url, "
+            f"visualization_url, analysis, {', '.join(METRIC_COLUMNS)}) "
+            f"VALUES ({_placeholders(1, 8 + len(METRIC_COLUMNS))}) "
+            "ON CONFLICT (id) DO NOTHING RETURNING id",
+            meal["id"],
+            meal["user_id"],
+            logged_at,
+            tz,
+            day,
+            meal["image_url"],
+            meal["visualization_url"],
+            json.dumps(meal["analysis"]),
+            *(metrics[name] for name in METRIC_COLUMNS),
+        )
+        if inserted is None:
+            return
+        await rollups.add_meal(conn, meal["user_id"], day, metrics)
+        await conn.executemany(
+            "INSERT INTO food_items (id, meal_id, user_id, label, canonical_label, crop_url, "
+            "confidence, created_at) VALUES ($1, $2, $3, $4, $5, $6, $7, $8) "
+            "ON CONFLICT (id) DO NOTHING",
+            [
+                (
+                    item["id"],
+                    meal["id"],
+                    meal["user_id"],
+                    item["label"],
+                    canonical_label(item["label"]),
+                    item["crop_url"],
+                    item["confidence"],
+                    logged_at,
+                )
+                for item in meal["items"]
+            ],
+        )
+        await food_stats.add_meal(
+            conn,
+            meal["user_id"],
+            food_stats.meal_labels([item["label"] for item in meal["items"]]),
+            logged_at,
+            day,
+            metrics["health_score"],
+        )
+        facts = streaks.meal_facts(
+            meal["id"],
+            logged_at,
+            meal["analysis"],
+            [item["label"] for item in meal["items"]],
+            metrics["health_score"],
+        )
+        await streaks.on_meal_added(conn, meal["user_id"], day, facts)
+        earned = await badges.on_meal_added(conn, meal["user_id"], badges.meal_event(facts, day, metrics))
+    meal_timing.invalidate(meal["user_id"])
+    label_search.add(meal["user_id"], [item["label"] for item in meal["items"]])
+    if earned:
+        logger.info("User %s earned %s", meal["user_id"], ", ".join(earned))
+
+
+def _insert_pending(payload: dict) -> None:
+    db.run_sync(insert_meal(payload))
+
+
+persistence.register_handler("meal.insert", _insert_pending)
+
+
+def record_meal(
+    result: AnalyzeResponse,
+    user_id: str,
+    tz: str = "UTC",
+    image_bytes: bytes | None = None,
+    image_url: str | None = None,
+) -> str:
+    """Queue an analyze result for the meal log and return the new meal id.
+
+    ``tz`` is the user's IANA timezone, which decides the local day the
+    meal counts towards.  ``image_bytes`` is stored content-addressed like
+    the crops; pass ``image_url`` instead when the photo already lives in
+    storage.
+    """
+    if image_bytes is not None:
+        image_url = image_store.save_photo(image_bytes)
+    meal_id = uuid.uuid4().hex
+    persistence.submit(
+        "meal.insert",
+        {
+            "id": meal_id,
+            "user_id": user_id,
+            "logged_at": datetime.now(timezone.utc).isoformat(),
+            "tz": tz,
+            "image_url": image_url,
+            "visualization_url": result.segmentation.visualization_url,
+            "analysis": result.analysis.model_dump(),
+            "metrics": result.metrics.model_dump(mode="json"),
+            "items": [
+                {
+                    "id": uuid.uuid4().hex,
+                    "label": item.label,
+                    "crop_url": item.crop_url,
+                    "confidence": item.confidence,
+                }
+                for item in result.segmentation.segmented_items
+            ],
+        },
+    )
+    return meal_id
+
+
+async def delete_meal(user_id: str, meal_id: str) -> bool:
+    """Delete a meal (items cascade), update the derived tables, release media afterwards."""
+    async with db.get_db().transaction() as conn:
+        row = await conn.fetchrow(
+            "SELECT image_url, visualization_url, logged_at, local_day, analysis, "
+            f"{', '.join(METRIC_COLUMNS)} "
+            "FROM meals WHERE id = $1 AND user_id = $2",
+            meal_id, user_id,
+        )
+        if row is None:
+            return False
+        crop_rows = await conn.fetch(
+            "SELECT label, crop_url, liked FROM food_items WHERE meal_id = $1", meal_id
+        )
+        await conn.execute("DELETE FROM meals WHERE id = $1", meal_id)
+        if row["local_day"] is not None:
+            await rollups.remove_meal(conn, user_id, row["local_day"], row)
+        facts = streaks.meal_facts(
+            meal_id,
+            row["logged_at"],
+            json.loads(row["analysis"]),
+            [r["label"] for r in crop_rows],
+            row["health_score"],
+        )
+        await streaks.on_meal_removed(conn, user_id, row["local_day"], facts)
+        await badges.on_meal_removed(conn, user_id)
+        liked: dict[str, int] = {}
+        for r in crop_rows:
+            if r["liked"]:
+                key = canonical_label(r["label"])
+                liked[key] = liked.get(key, 0) + 1
+        await food_stats.remove_meal(
+            conn,
+            user_id,
+            food_stats.meal_labels([r["label"] for r in crop_rows]),
+            row["logged_at"],
+            row["local_day"],
+            row["health_score"],
+            liked,
+        )
+    meal_timing.invalidate(user_id)
+    label_search.remove(user_id, [r["label"] for r in crop_rows])
+    image_store.release_deferred(
+        [row["image_url"], row["visualization_url"]] + [r["crop_url"] for r in crop_rows]
+    )
+    return True
+
+
+async def set_liked(user_id: str, item_id: str, liked: bool | None) -> FoodItemRecord | None:
+    """Set ``liked``, or flip it when ``liked`` is None."""
+    async with db.get_db().transaction() as conn:
+        current = await conn.fetchrow(
+            "SELECT liked, label FROM food_items WHERE id = $1 AND user_id = $2",
+            item_id, user_id,
+        )
+        if current is None:
+            return None
+        value = not current["liked"] if liked is None else liked
+        row = await conn.fetchrow(
+            f"UPDATE food_items SET liked = $2 WHERE id = $1 RETURNING {ITEM_COLUMNS}",
+            item_id, value,
+        )
+        if value != current["liked"]:
+            await food_stats.add_liked(
+                conn, user_id, canonical_label(current["label"]), 1 if value else -1
+            )
+    return _item_record(row)
+
+
+# ── Reads ────────────────────────────────────────────────────────────
+
+
+async def get_meal(user_id: str, meal_id: str) -> MealRecord | None:
+    async with db.get_db().acquire() as conn:
+        row = await conn.fetchrow(
+            f"SELECT {MEAL_COLUMNS} FROM meals WHERE id = $1 AND user_id = $2",
+            meal_id, user_id,
+        )
+        if row is None:
+            return None
+        items = await _items_by_meal(conn, [meal_id])
+    return _meal_record(row, items[meal_id])
+
+
+async def list_meals(
+    user_id: str,
+    limit: int = 20,
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    label: str | None = None,
+) -> tuple[list[MealRecord], str | None]:
+    """One page of the feed, most recent first, plus the cursor of the next.
+
+    Pages are keyset-paginated on (logged_at, id): each page seeks into
+    ``meals_user_feed`` just past the previous page's last row instead of
+    skipping an OFFSET, so page 1000 costs the same as page 1.  Filters
+    keep the walk on that index, so a page costs about ``limit`` divided
+    by the filter's selectivity, whatever the history size: the date range
+    bounds the seek, ``health_score`` is stored in the index entries, and
+    the label check is one ``food_items_meal_label`` probe per candidate.
+    """
+    args: list = [user_id]
+
+    def arg(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    where = ["user_id = $1"]
+    if cursor:
+        after_logged_at, after_id = decode_cursor(cursor)
+        where.append(f"(logged_at, id) < ({arg(after_logged_at)}, {arg(after_id)})")
+    if since is not None:
+        where.append(f"logged_at >= {arg(since)}")
+    if until is not None:
+        where.append(f"logged_at < {arg(until)}")
+    if min_score is not None:
+        where.append(f"health_score >= {arg(min_score)}")
+    if max_score is not None:
+        where.append(f"health_score <= {arg(max_score)}")
+    if label:
+        where.append(
+            "EXISTS (SELECT 1 FROM food_items f WHERE f.meal_id = meals.id "
+            f"AND lower(f.label) = lower({arg(label)}))"
+        )
+
+    # One extra row tells us whether there is a next page
+    async with db.get_db().acquire() as conn:
+        rows = await conn.fetch(
+            f"SELECT {MEAL_COLUMNS} FROM meals WHERE {' AND '.join(where)} "
+            f"ORDER BY logged_at DESC, id DESC LIMIT {arg(limit + 1)}",
+            *args,
+        )
+        rows, more = rows[:limit], len(rows) > limit
+        items = await _items_by_meal(conn, [r["id"] for r in rows])
+
+    next_cursor = encode_cursor(rows[-1]["logged_at"], rows[-1]["id"]) if more else None
+    return [_meal_record(row, items[row["id"]]) for row in rows], next_cursor
+
+
+async def get_food_item(user_id: str, item_id: str) -> FoodItemRecord | None:
+    async with db.get_db().acquire() as conn:
+        row = await conn.fetchrow(
+            f"SELECT {ITEM_COLUMNS} FROM food_items WHERE id = $1 AND user_id = $2",
+            item_id, user_id,
+        )
+    return _item_record(row) if row else None
+
+
+async def list_food_items(
+    user_id: str, liked: bool | None = None, limit: int = 50
+) -> list[FoodItemRecord]:
+    async with db.get_db().acquire() as conn:
+        if liked is None:
+            rows = await conn.fetch(
+                f"SELECT {ITEM_COLUMNS} FROM food_items WHERE user_id = $1 "
+                "ORDER BY created_at DESC, id DESC LIMIT $2",
+                user_id, limit,
+            )
+        else:
+            rows = await conn.fetch(
+                f"SELECT {ITEM_COLUMNS} FROM food_items WHERE user_id = $1 AND liked = $2 "
+                "ORDER BY created_at DESC, id DESC LIMIT $3",
+                user_id, liked, limit,
+            )
+    return [_item_record(row) for row in rows]
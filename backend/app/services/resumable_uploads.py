@@ -0,0 +1,210 @@
+"""Resumable chunked uploads for flaky mobile connections.
+
+A tus-style protocol on top of a spool directory:
+
+  POST  /api/uploads              create, declare total size → id
+  PATCH /api/uploads/{id}         append bytes at ``Upload-Offset``
+  HEAD  /api/uploads/{id}         current offset (after a dropped connection)
+  POST  /api/uploads/{id}/finalize  normalize and analyze
+
+Each upload is ``<id>.part`` (the bytes received so far) plus ``<id>.json``
+(declared size, type, expiry).  The offset is simply the size of the part
+file, so whatever arrived before a connection dropped is kept and a retry
+only sends the missing tail.  Uploads idle past ``upload_expiry_s`` are
+swept.
+
+Finalizing does not consume the upload: the part file stays until the
+analysis has been recorded, and the recorded result (``<id>.done``)
+replaces it until expiry.  A finalize retried after a dropped connection
+or a failed analysis therefore never needs the bytes sent again, and
+one that already succeeded gets the same result back instead of a
+second meal.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.config import settings
+from app.utils.image import normalize_image
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = Path(__file__).resolve().parent.parent.parent / "spool" / "uploads"
+
+_locks: dict[str, asyncio.Lock] = {}
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadIncomplete(Exception):
+    pass
+
+
+@dataclass
+class UploadState:
+    id: str
+    size: int
+    content_type: str
+    expires_at: float
+    offset: int = 0
+
+
+def _part_path(upload_id: str) -> Path:
+    return SPOOL_DIR / f"{upload_id}.part"
+
+
+def _meta_path(upload_id: str) -> Path:
+    return SPOOL_DIR / f"{upload_id}.json"
+
+
+def _done_path(upload_id: str) -> Path:
+    return SPOOL_DIR / f"{upload_id}.done"
+
+
+def _write_meta(state: UploadState) -> None:
+    meta = asdict(state)
+    meta.pop("offset")
+    tmp = _meta_path(state.id).with_suffix(".tmp")
+    tmp.write_text(json.dumps(meta))
+    tmp.replace(_meta_path(state.id))
+
+
+def _discard(upload_id: str) -> None:
+    _part_path(upload_id).unlink(missing_ok=True)
+    _meta_path(upload_id).unlink(missing_ok=True)
+    _done_path(upload_id).unlink(missing_ok=True)
+    _locks.pop(upload_id, None)
+
+
+def get_upload(upload_id: str) -> UploadState:
+    try:
+        uuid.UUID(hex=upload_id)
+        meta = json.loads(_meta_path(upload_id).read_text())
+    except (ValueError, OSError):
+        raise UploadNotFound(upload_id)
+    state = UploadState(**meta)
+    if state.expires_at < time.time():
+        _discard(upload_id)
+        raise UploadNotFound(upload_id)
+    part = _part_path(upload_id)
+    if part.exists():
+        state.offset = part.stat().st_size
+    else:
+        state.offset = state.size if _done_path(upload_id).exists() else 0
+    return state
+
+
+def upload_lock(upload_id: str) -> asyncio.Lock:
+    """Serializes appends and finalizes of one upload."""
+    return _locks.setdefault(upload_id, asyncio.Lock())
+
+
+def sweep_expired() -> int:
+    """Delete uploads whose expiry has passed. Returns how many went."""
+    if not SPOOL_DIR.is_dir():
+        return 0
+    now = time.time()
+    removed = 0
+    for meta_path in SPOOL_DIR.glob("*.json"):
+        try:
+            expires_at = json.loads(meta_path.read_text())["expires_at"]
+        except (OSError, ValueError, KeyError):
+            expires_at = 0
+        if expires_at < now:
+            _discard(meta_path.stem)
+            removed += 1
+    if removed:
+        logger.info("Swept %d expired uploads", removed)
+    return removed
+
+
+def create_upload(size: int, content_type: str) -> UploadState:
+    if size > settings.max_upload_mb * 1024 * 1024:
+        raise UploadTooLarge()
+    sweep_expired()
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    state = UploadState(
+        id=uuid.uuid4().hex,
+        size=size,
+        content_type=content_type,
+        expires_at=time.time() + settings.upload_expiry_s,
+    )
+    _part_path(state.id).touch()
+    _write_meta(state)
+    return state
+
+
+async def append_chunk(
+    upload_id: str, offset: int, chunks: AsyncIterator[bytes]
+) -> UploadState:
+    """Append a request body at ``offset``.
+
+    Bytes are written as they arrive, so a connection that drops halfway
+    through a PATCH still advances the offset by whatever was received.
+    """
+    async with upload_lock(upload_id):
+        state = get_upload(upload_id)
+        if offset != state.offset:
+            raise OffsetMismatch(state.offset)
+
+        with _part_path(upload_id).open("ab") as fh:
+            try:
+                async for chunk in chunks:
+                    if state.offset + len(chunk) > state.size:
+                        raise UploadTooLarge()
+                    await asyncio.to_thread(fh.write, chunk)
+                    state.offset += len(chunk)
+            finally:
+                fh.flush()
+
+        # Sliding expiry: an upload that is still making progress stays alive
+        state.expires_at = time.time() + settings.upload_expiry_s
+        _write_meta(state)
+        return state
+
+
+def read_upload(upload_id: str, max_dim: int = 2048) -> bytes:
+    """Normalize a completed upload to JPEG, keeping its spool files."""
+    state = get_upload(upload_id)
+    if state.offset != state.size:
+        raise UploadIncomplete()
+    with _part_path(upload_id).open("rb") as fh:
+        return normalize_image(fh, max_dim=max_dim)
+
+
+def finished_result(upload_id: str) -> str | None:
+    """The recorded analysis (JSON) of an upload finalized before, if any."""
+    get_upload(upload_id)
+    try:
+        return _done_path(upload_id).read_text()
+    except FileNotFoundError:
+        return None
+
+
+def complete_upload(upload_id: str, result_json: str) -> None:
+    """Record a finalized upload's analysis and drop its bytes.
+
+    The result is kept until the upload expires, for retried finalizes.
+    """
+    tmp = _done_path(upload_id).with_suffix(".tmp")
+    tmp.write_text(result_json)
+    tmp.replace(_done_path(upload_id))
+    _part_path(upload_id).unlink(missing_ok=True)
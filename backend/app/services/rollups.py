@@ -0,0 +1,203 @@
+"""Per-user daily and ISO-week rollups of the meal log.
+
+Dashboard trends read these instead of scanning meals, so a year of weekly
+points is 52 rows however many meals it covers.  Every meal insert and
+delete updates its day and week bucket in the same transaction as the
+meal row itself, so the rollups never disagree with the log.  ``rebuild``
+recomputes them from scratch; ``rebuild_rollups.py`` runs it as a repair
+command.
+
+Buckets are calendar days in the user's timezone at the time the meal was
+logged (``meals.local_day``), not UTC days, so a late dinner counts
+towards the evening it was eaten.
+"""
+
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from app.services.db import Connection
+
+# table → bucket column
+BUCKETS = {"daily_rollups": "day", "weekly_rollups": "week_start"}
+BUCKET_DAYS = {"daily_rollups": 1, "weekly_rollups": 7}
+
+# Rollup sum/count pairs and the meals column each one aggregates
+AGGREGATES = {
+    "health": "health_score",
+    "calories": "total_calories",
+    "satiety": "satiety_score",
+    "bloat": "bloat_score",
+}
+SUM_COLUMNS = [f"{name}_{part}" for name in AGGREGATES for part in ("sum", "count")]
+
+
+def local_day(logged_at: datetime, tz: str) -> date:
+    return logged_at.astimezone(ZoneInfo(tz)).date()
+
+
+def week_start(day: date) -> date:
+    """Monday of the ISO week containing ``day``."""
+    return day - timedelta(days=day.weekday())
+
+
+def _bucket(table: str, day: date) -> date:
+    return week_start(day) if table == "weekly_rollups" else day
+
+
+def _contribution(meal: dict) -> list[float | int]:
+    """The sum/count values one meal adds to a bucket, in SUM_COLUMNS order."""
+    values = []
+    for column in AGGREGATES.values():
+        value = meal.get(column)
+        values += [value or 0, 0 if value is None else 1]
+    return values
+
+
+def _placeholders(count: int) -> str:
+    return ", ".join(f"${i}" for i in range(1, count + 1))
+
+
+def _least(conn: Connection, a: str, b: str) -> str:
+    # Postgres least() skips NULLs; SQLite's two-argument min() does not
+    if conn.dialect == "postgres":
+        return f"least({a}, {b})"
+    return f"coalesce(min({a}, {b}), {a}, {b})"
+
+
+def _greatest(conn: Connection, a: str, b: str) -> str:
+    if conn.dialect == "postgres":
+        return f"greatest({a}, {b})"
+    return f"coalesce(max({a}, {b}), {a}, {b})"
+
+
+async def add_meal(conn: Connection, user_id: str, day: date, meal: dict) -> None:
+    """Fold one meal into its day and week. Call inside the insert's transaction."""
+    health = meal.get("health_score")
+    for table, bucket in BUCKETS.items():
+        columns = ["user_id", bucket, "meal_count", *SUM_COLUMNS, "health_min", "health_max"]
+        values = [user_id, _bucket(table, day), 1, *_contribution(meal), health, health]
+        updates = [f"meal_count = {table}.meal_count + 1"]
+        updates += [f"{c} = {table}.{c} + excluded.{c}" for c in SUM_COLUMNS]
+        updates.append(f"health_min = {_least(conn, f'{table}.health_min', 'excluded.health_min')}")
+        updates.append(f"health_max = {_greatest(conn, f'{table}.health_max', 'excluded.health_max')}")
+        await conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({_placeholders(len(columns))}) "
+            f"ON CONFLICT (user_id, {bucket}) DO UPDATE SET {', '.join(updates)}",
+            *values,
+        )
+
+
+async def remove_meal(conn: Connection, user_id: str, day: date, meal: dict) -> None:
+    """Take a deleted meal back out. Call after deleting the meal row, in its transaction.
+
+    Sums and counts are simply decremented.  Min and max cannot be undone
+    that way, so when the meal held the bucket's extreme they are
+    recomputed from the bucket's remaining meals (an indexed range read of
+    one day or week).
+    """
+    health = meal.get("health_score")
+    contribution = _contribution(meal)
+    for table, bucket in BUCKETS.items():
+        start = _bucket(table, day)
+        sets = ["meal_count = meal_count - 1"]
+        sets += [f"{c} = {c} - ${i}" for i, c in enumerate(SUM_COLUMNS, start=3)]
+        row = await conn.fetchrow(
+            f"UPDATE {table} SET {', '.join(sets)} WHERE user_id = $1 AND {bucket} = $2 "
+            "RETURNING meal_count, health_min, health_max",
+            user_id, start, *contribution,
+        )
+        if row is None:
+            continue
+        if row["meal_count"] <= 0:
+            await conn.execute(
+                f"DELETE FROM {table} WHERE user_id = $1 AND {bucket} = $2", user_id, start
+            )
+        elif health is not None and health in (row["health_min"], row["health_max"]):
+            extremes = await conn.fetchrow(
+                "SELECT min(health_score) AS lo, max(health_score) AS hi FROM meals "
+                "WHERE user_id = $1 AND local_day >= $2 AND local_day < $3",
+                user_id, start, start + timedelta(days=BUCKET_DAYS[table]),
+            )
+            await conn.execute(
+                f"UPDATE {table} SET health_min = $3, health_max = $4 "
+                f"WHERE user_id = $1 AND {bucket} = $2",
+                user_id, start, extremes["lo"], extremes["hi"],
+            )
+
+
+async def rebuild(conn: Connection, user_id: str | None = None) -> int:
+    """Recompute rollups from the meals table. Returns the number of day buckets.
+
+    Weeks are built from the rebuilt days (sums add, min of mins, max of
+    maxes), so meals are scanned once.
+    """
+    scope, args = ("WHERE user_id = $1", [user_id]) if user_id else ("", [])
+
+    # Meals stored before local_day existed count on their UTC day
+    missing = await conn.fetch(
+        f"SELECT id, logged_at, tz FROM meals {scope or 'WHERE TRUE'} AND local_day IS NULL",
+        *args,
+    )
+    await conn.executemany(
+        "UPDATE meals SET local_day = $2 WHERE id = $1",
+        [(m["id"], local_day(m["logged_at"], m["tz"] or "UTC")) for m in missing],
+    )
+
+    for table in BUCKETS:
+        await conn.execute(f"DELETE FROM {table} {scope}", *args)
+
+    sums = ", ".join(
+        f"coalesce(sum({column}), 0) AS {name}_sum, count({column}) AS {name}_count"
+        for name, column in AGGREGATES.items()
+    )
+    days = await conn.fetch(
+        f"SELECT user_id, local_day, count(*) AS meal_count, {sums}, "
+        "min(health_score) AS health_min, max(health_score) AS health_max "
+        f"FROM meals {scope} GROUP BY user_id, local_day",
+        *args,
+    )
+
+    weeks: dict[tuple[str, date], dict] = {}
+    for row in days:
+        key = (row["user_id"], week_start(row["local_day"]))
+        week = weeks.get(key)
+        if week is None:
+            weeks[key] = dict(row)
+            continue
+        week["meal_count"] += row["meal_count"]
+        for c in SUM_COLUMNS:
+            week[c] += row[c]
+        if row["health_min"] is not None:
+            if week["health_min"] is None:
+                week["health_min"], week["health_max"] = row["health_min"], row["health_max"]
+            else:
+                week["health_min"] = min(week["health_min"], row["health_min"])
+                week["health_max"] = max(week["health_max"], row["health_max"])
+
+    columns = ["meal_count", *SUM_COLUMNS, "health_min", "health_max"]
+    for table, bucket in BUCKETS.items():
+        buckets = days if table == "daily_rollups" else [
+            {**week, "local_day": start} for (_uid, start), week in weeks.items()
+        ]
+        await conn.executemany(
+            f"INSERT INTO {table} (user_id, {bucket}, {', '.join(columns)}) "
+            f"VALUES ({_placeholders(len(columns) + 2)})",
+            [(b["user_id"], b["local_day"], *(b[c] for c in columns)) for b in buckets],
+        )
+    return len(days)
+
+
+async def trends(
+    conn: Connection, user_id: str, period: str, since: date, until: date
+) -> list[dict]:
+    """Rollup rows for ``period`` ("day" or "week") between two local dates."""
+    table = "weekly_rollups" if period == "week" else "daily_rollups"
+    bucket = BUCKETS[table]
+    if period == "week":
+        since = week_start(since)
+    return await conn.fetch(
+        f"SELECT {bucket} AS start, meal_count, {', '.join(SUM_COLUMNS)}, health_min, health_max "
+        f"FROM {table} WHERE user_id = $1 AND {bucket} >= $2 AND {bucket} <= $3 "
+        f"ORDER BY {bucket}",
+        user_id, since, until,
+    )
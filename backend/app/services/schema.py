@@ -0,0 +1,274 @@
+"""Table definitions for the meal log, per dialect.
+
+``init_schema`` runs at startup and only creates what is missing.  The
+Postgres statements mirror ``supabase_schema.sql``; keep the two in step.
+"""
+
+from app.services.db import Connection, Database
+
+
+def _rollup_table(name: str, bucket: str) -> str:
+    """Per-user aggregate of the meals in one bucket (a local day or ISO week).
+
+    Sums and counts rather than means, so a meal can be added or removed
+    without reading the bucket's other meals.
+    """
+    return f"""
+    create table if not exists {name} (
+      user_id text not null,
+      {bucket} date not null,
+      meal_count integer not null default 0,
+      health_sum real not null default 0,
+      health_count integer not null default 0,
+      health_min real,
+      health_max real,
+      calories_sum integer not null default 0,
+      calories_count integer not null default 0,
+      satiety_sum real not null default 0,
+      satiety_count integer not null default 0,
+      bloat_sum real not null default 0,
+      bloat_count integer not null default 0,
+      primary key (user_id, {bucket})
+    )
+    """
+
+
+ROLLUP_TABLES = [
+    _rollup_table("daily_rollups", "day"),
+    # week_start is the Monday of the ISO week
+    _rollup_table("weekly_rollups", "week_start"),
+]
+
+# One row per user and streak rule (app/services/streaks.py).  last_day is
+# the latest qualifying local day of a day rule; last_meal_* is the latest
+# meal a meal rule has seen.
+STREAKS_TABLE = """
+    create table if not exists streaks (
+      user_id text not null,
+      rule text not null,
+      current_run integer not null default 0,
+      best_run integer not null default 0,
+      last_day date,
+      last_meal_at timestamptz,
+      last_meal_id text,
+      primary key (user_id, rule)
+    )
+    """
+
+# Food library index (app/services/food_stats.py).  recent is a JSON array
+# of per-day meal counts, slot 0 = recent_day.
+FOOD_STATS_TABLE = """
+    create table if not exists food_stats (
+      user_id text not null,
+      label text not null,
+      meals integer not null default 0,
+      first_seen timestamptz,
+      last_seen timestamptz,
+      health_sum real not null default 0,
+      health_count integer not null default 0,
+      liked_count integer not null default 0,
+      recent_day date,
+      recent text not null default '[]',
+      primary key (user_id, label)
+    )
+    """
+
+POSTGRES_SCHEMA = [
+    """
+    create table if not exists meals (
+      id text primary key,
+      user_id text not null,
+      logged_at timestamptz not null default now(),
+      image_url text,
+      visualization_url text,
+      health_score real,
+      analysis jsonb not null default '{}'::jsonb
+    )
+    """,
+    # Feed order is (logged_at, id) descending; keyset pages seek into this.
+    # health_score rides along so the score band is checked in the index.
+    "drop index if exists meals_user_logged_at",
+    "create index if not exists meals_user_feed on meals (user_id, logged_at desc, id desc, health_score)",
+    """
+    create table if not exists food_items (
+      id text primary key,
+      meal_id text not null references meals (id) on delete cascade,
+      user_id text not null,
+      label text not null default '',
+      crop_url text,
+      confidence real not null default 1.0,
+      liked boolean not null default false,
+      created_at timestamptz not null default now()
+    )
+    """,
+    "create index if not exists food_items_meal on food_items (meal_id)",
+    "create index if not exists food_items_user_created_at on food_items (user_id, created_at desc)",
+    "create index if not exists food_items_meal_label on food_items (meal_id, lower(label))",
+    # Badge progress and earned badges, one JSON document per user
+    # (app/services/badges.py)
+    """
+    create table if not exists badge_state (
+      user_id text primary key,
+      state jsonb not null default '{}'::jsonb
+    )
+    """,
+]
+
+# Same tables for SQLite.  The declared types TIMESTAMPTZ / BOOLEAN are
+# what ``app.services.db`` keys its converters on.
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS meals (
+      id TEXT PRIMARY KEY,
+      user_id TEXT NOT NULL,
+      logged_at TIMESTAMPTZ NOT NULL,
+      image_url TEXT,
+      visualization_url TEXT,
+      health_score REAL,
+      analysis TEXT NOT NULL DEFAULT '{}'
+    )
+    """,
+    "DROP INDEX IF EXISTS meals_user_logged_at",
+    "CREATE INDEX IF NOT EXISTS meals_user_feed ON meals (user_id, logged_at DESC, id DESC, health_score)",
+    """
+    CREATE TABLE IF NOT EXISTS food_items (
+      id TEXT PRIMARY KEY,
+      meal_id TEXT NOT NULL REFERENCES meals (id) ON DELETE CASCADE,
+      user_id TEXT NOT NULL,
+      label TEXT NOT NULL DEFAULT '',
+      crop_url TEXT,
+      confidence REAL NOT NULL DEFAULT 1.0,
+      liked BOOLEAN NOT NULL DEFAULT 0,
+      created_at TIMESTAMPTZ NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS food_items_meal ON food_items (meal_id)",
+    "CREATE INDEX IF NOT EXISTS food_items_user_created_at ON food_items (user_id, created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS food_items_meal_label ON food_items (meal_id, lower(label))",
+    """
+    CREATE TABLE IF NOT EXISTS badge_state (
+      user_id TEXT PRIMARY KEY,
+      state TEXT NOT NULL DEFAULT '{}'
+    )
+    """,
+]
+
+
+# Columns added after a table first shipped.  ``init_schema`` adds whichever
+# a database is missing, so old and new databases end up the same shape.
+ADDED_COLUMNS = {
+    "meals": [
+        # Typed metrics, stored once at ingest (app.models.schemas.MealMetrics)
+        ("total_calories", "integer"),
+        ("satiety_score", "real"),
+        ("bloat_score", "real"),
+        ("tasty_score", "real"),
+        ("addiction_score", "real"),
+        ("protein_g", "real"),
+        ("fat_g", "real"),
+        ("carbs_g", "real"),
+        ("eat_frequency", "text check (eat_frequency in ('daily', 'occasional', 'rare'))"),
+        # The user's IANA timezone when the meal was logged, and the calendar
+        # day it fell on there — what rollups and streaks bucket by
+        ("tz", "text"),
+        ("local_day", "date"),
+    ],
+    "food_items": [
+        # app.utils.labels.canonical_label(label), the food_stats key
+        ("canonical_label", "text"),
+    ],
+}
+
+# Indexes on added columns, created once the columns exist
+ADDED_INDEXES = [
+    "create index if not exists meals_user_local_day on meals (user_id, local_day)",
+    "create index if not exists food_items_user_canonical on food_items (user_id, canonical_label, created_at)",
+    "create index if not exists food_stats_user_meals on food_stats (user_id, meals desc, label)",
+    "create index if not exists food_stats_user_last_seen on food_stats (user_id, last_seen desc, label)",
+]
+
+
+async def _add_missing_columns(conn: Connection, dialect: str) -> None:
+    for table, columns in ADDED_COLUMNS.items():
+        if dialect == "postgres":
+            for name, ddl in columns:
+                await conn.execute(f"alter table {table} add column if not exists {name} {ddl}")
+            continue
+        # SQLite has no ADD COLUMN IF NOT EXISTS
+        existing = {row["name"] for row in await conn.fetch(f"PRAGMA table_info({table})")}
+        for name, ddl in columns:
+            if name not in existing:
+                await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+# Analysis fields covered by meal search (app/services/meal_search.py), in
+# FTS5 column order, with their weight: what the meal is counts most
+SEARCH_FIELDS = {
+    "description": 3.0,
+    "items": 3.0,
+    "summary": 2.0,
+    "calories": 1.0,
+    "rationale": 1.0,
+    "ideal_comparison": 1.0,
+    "mood_impact": 1.0,
+}
+
+
+def _postgres_search_vector() -> str:
+    """tsvector over SEARCH_FIELDS, weighted A (3) / B (2) / C (1)."""
+    letters = {3.0: "A", 2.0: "B", 1.0: "C"}
+    parts = []
+    for weight, letter in letters.items():
+        text = " || ' ' || ".join(
+            f"coalesce(analysis->>'{name}', '')" for name, w in SEARCH_FIELDS.items() if w == weight
+        )
+        parts.append(f"setweight(to_tsvector('english', {text}), '{letter}')")
+    return " || ".join(parts)
+
+
+async def _init_search(conn: Connection, dialect: str) -> None:
+    """Full-text index over the analysis: a generated tsvector column with a
+    GIN index on Postgres, an FTS5 table kept in step by triggers on SQLite
+    (rowid-linked to meals, so deletes are a point lookup)."""
+    if dialect == "postgres":
+        await conn.execute(
+            "alter table meals add column if not exists search tsvector "
+            f"generated always as ({_postgres_search_vector()}) stored"
+        )
+        await conn.execute("create index if not exists meals_search on meals using gin (search)")
+        return
+
+    exists = await conn.fetchval(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'meals_fts'"
+    )
+    columns = ", ".join(SEARCH_FIELDS)
+    values = ", ".join(f"json_extract(new.analysis, '$.{name}')" for name in SEARCH_FIELDS)
+    await conn.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS meals_fts USING fts5({columns}, "
+        "tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    await conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS meals_fts_insert AFTER INSERT ON meals BEGIN "
+        f"INSERT INTO meals_fts (rowid, {columns}) VALUES (new.rowid, {values}); END"
+    )
+    await conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS meals_fts_delete AFTER DELETE ON meals BEGIN "
+        "DELETE FROM meals_fts WHERE rowid = old.rowid; END"
+    )
+    if not exists:
+        # First start with search: index the meals already stored
+        await conn.execute(
+            f"INSERT INTO meals_fts (rowid, {columns}) "
+            f"SELECT rowid, {values.replace('new.', '')} FROM meals"
+        )
+
+
+async def init_schema(db: Database) -> None:
+    statements = POSTGRES_SCHEMA if db.dialect == "postgres" else SQLITE_SCHEMA
+    async with db.transaction() as conn:
+        for sql in statements + ROLLUP_TABLES + [STREAKS_TABLE, FOOD_STATS_TABLE]:
+            await conn.execute(sql)
+        await _add_missing_columns(conn, db.dialect)
+        for sql in ADDED_INDEXES:
+            await conn.execute(sql)
+        await _init_search(conn, db.dialect)
@@ -36,6 +36,7 @@ class SegmentedItem:
     mask: np.ndarray = field(default_factory=lambda: np.zeros((1, 1), dtype=bool), repr=False)
     crop_bytes: bytes = field(default=b"", repr=False)
     confidence: float = 1.0
+    bbox: tuple[int, int, int, int] | None = None  # detection box (x1, y1, x2, y2), full-image pixels
 
 
 def segment_single_item(image_bytes: bytes, item_name: str) -> SegmentedItem | None:
@@ -173,6 +174,7 @@ def segment_crop(
     item_name: str,
     bbox: tuple[int, int, int, int],  # (x1, y1, x2, y2)
     full_image_shape: tuple[int, int],  # (height, width)
+    confidence: float = 1.0,
 ) -> SegmentedItem | None:
     """Segment a cropped food item via lang-SAM, then map mask back to full image coordinates."""
     try:
@@ -216,7 +218,8 @@ def segment_crop(
             label=item_name,
             mask=full_mask,
             crop_bytes=food_crop,
-            confidence=1.0,
+            confidence=confidence,
+            bbox=(x1, y1, x2, y2),
         )
     except Exception:
         return None
@@ -238,6 +241,7 @@ def segment_all_crops(
                 crop["label"],
                 crop["bbox"],
                 full_image_shape,
+                crop.get("confidence", 1.0),
             ): crop["label"]
             for crop in crops
         }
@@ -1,14 +1,306 @@
-"""Supabase Storage stub.
+"""Object storage backends for media and original photos.
 
-Actual implementation will be added in Phase 1 when Supabase
-credentials are configured. For now these functions are no-ops
-that return empty/default values.
+``get_storage()`` returns the backend selected by ``STORAGE_BACKEND``:
+
+- ``local`` (default) — files under ``backend/media/``, served by the
+  ``/media`` router.
+- ``s3`` — any S3-compatible service (AWS S3, MinIO, Supabase Storage's S3
+  endpoint, or ``local_s3.py`` for development).  Several API nodes can
+  share it without a shared disk.
+
+Keys are slash-separated relative paths such as ``objects/ab/cd/<sha>.jpg``.
 """
 
+import io
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = Path(__file__).resolve().parent.parent.parent / "media"
+
+ORIGINALS_PREFIX = "originals"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StorageBackend(ABC):
+    """Interface shared by all backends."""
+
+    # True when every API node sees the same objects (e.g. a bucket), so
+    # one node's reference counts do not tell the whole story.
+    shared = False
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str = "image/jpeg") -> None:
+        ...
+
+    def put_many(
+        self, objects: list[tuple[str, bytes]], content_type: str = "image/jpeg"
+    ) -> None:
+        for key, data in objects:
+            self.put(key, data, content_type)
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def download_to(self, key: str, fileobj: BinaryIO) -> None:
+        """Stream an object into a writable file object."""
+
+    def presign_put(self, key: str, content_type: str, expires_in: int) -> str | None:
+        """URL a client can PUT the object to directly, if supported."""
+        return None
+
+    def local_path(self, key: str) -> Path | None:
+        """Filesystem path for backends that have one, else None."""
+        return None
+
+    def public_url(self, key: str) -> str | None:
+        """URL a client can fetch the object from directly, if any."""
+        return None
+
+
+# ── Local filesystem ─────────────────────────────────────────────────
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path = MEDIA_DIR):
+        self.root = root
+        # Dot-prefixed so the /media router never serves it
+        self.tmp_dir = root / ".tmp"
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Storage key escapes root: {key}")
+        return path
+
+    def put(self, key: str, data: bytes, content_type: str = "image/jpeg") -> None:
+        """Write via temp file + rename so readers never see a partial file."""
+        path = self._path(key)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def download_to(self, key: str, fileobj: BinaryIO) -> None:
+        with self._path(key).open("rb") as fh:
+            shutil.copyfileobj(fh, fileobj)
+
+    def local_path(self, key: str) -> Path | None:
+        return self._path(key)
+
+
+# ── S3-compatible ────────────────────────────────────────────────────
+
+
+class S3Storage(StorageBackend):
+    """S3 backend on one pooled boto3 client.
+
+    boto3 clients are thread-safe, so the client (and its connection pool of
+    ``max_pool_connections``) is shared by every request thread and by
+    ``put_many``'s upload workers.  Objects at or above
+    ``multipart_threshold`` go up as a multipart upload with
+    ``max_concurrency`` parts in flight.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str = "",
+        region: str = "us-east-1",
+        access_key: str = "",
+        secret_key: str = "",
+        public_base_url: str = "",
+        max_pool_connections: int = 32,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_chunksize: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.public_base_url = public_base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.multipart_threshold = multipart_threshold
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={"max_attempts": 3, "mode": "standard"},
+                # Path-style keeps MinIO and local stand-ins working
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            use_threads=True,
+        )
+
+    def _extra_args(self, key: str, content_type: str) -> dict:
+        extra = {"ContentType": content_type}
+        if not key.startswith(ORIGINALS_PREFIX + "/"):
+            # Everything outside originals/ is content-addressed
+            extra["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+        return extra
+
+    def put(self, key: str, data: bytes, content_type: str = "image/jpeg") -> None:
+        extra = self._extra_args(key, content_type)
+        if len(data) >= self.multipart_threshold:
+            self.client.upload_fileobj(
+                io.BytesIO(data), self.bucket, key,
+                ExtraArgs=extra, Config=self.transfer_config,
+            )
+        else:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **extra)
+
+    def put_many(
+        self, objects: list[tuple[str, bytes]], content_type: str = "image/jpeg"
+    ) -> None:
+        """Upload a batch (e.g. all crops of one meal) concurrently."""
+        if len(objects) <= 1:
+            return super().put_many(objects, content_type)
+        workers = min(self.max_concurrency, len(objects))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self.put, key, data, content_type) for key, data in objects
+            ]
+            for future in futures:
+                future.result()
+
+    def get(self, key: str) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=key)
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+
+    def download_to(self, key: str, fileobj: BinaryIO) -> None:
+        # Large objects come down as parallel ranged GETs
+        self.client.download_fileobj(
+            self.bucket, key, fileobj, Config=self.transfer_config
+        )
+
+    def presign_put(self, key: str, content_type: str, expires_in: int) -> str | None:
+        return self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires_in,
+        )
+
+    def public_url(self, key: str) -> str | None:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.s3_presign_expiry_s,
+        )
+
+
+_storage: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        if settings.storage_backend == "s3":
+            _storage = S3Storage(
+                bucket=settings.s3_bucket,
+                endpoint_url=settings.s3_endpoint_url,
+                region=settings.s3_region,
+                access_key=settings.s3_access_key,
+                secret_key=settings.s3_secret_key,
+                public_base_url=settings.s3_public_base_url,
+                max_pool_connections=settings.s3_max_pool_connections,
+                multipart_threshold=settings.s3_multipart_threshold_mb * 1024 * 1024,
+                multipart_chunksize=settings.s3_multipart_threshold_mb * 1024 * 1024,
+                max_concurrency=settings.s3_max_concurrency,
+            )
+        else:
+            _storage = LocalStorage()
+        logger.info("Storage backend: %s", type(_storage).__name__)
+    return _storage
+
 
 def upload_image(image_bytes: bytes, filename: str) -> str:
-    return ""
+    """Store an original photo under ``originals/`` and return its key."""
+    key = f"{ORIGINALS_PREFIX}/{filename}"
+    get_storage().put(key, image_bytes, content_type=_guess_content_type(filename))
+    return key
 
 
 def get_image_url(filename: str) -> str:
-    return ""
+    storage = get_storage()
+    key = f"{ORIGINALS_PREFIX}/{filename}"
+    return storage.public_url(key) or f"/media/{key}"
+
+
+def _guess_content_type(filename: str) -> str:
+    ext = Path(filename).suffix.lower()
+    return {".png": "image/png", ".webp": "image/webp"}.get(ext, "image/jpeg")
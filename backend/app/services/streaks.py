@@ -0,0 +1,324 @@
+"""Streaks: per-user, per-rule runs kept up to date in constant time.
+
+Each rule keeps one row in ``streaks``: the current run, the best run and
+where the current run ends.  Logging or deleting a meal looks at that row
+plus one daily-rollup row and moves the run forward, resets it or shrinks
+it, so reading a streak is a single lookup and updating one never scans
+history.
+
+Two kinds of rule:
+
+- ``day`` rules judge a whole local day from its ``daily_rollups`` row
+  (e.g. "mean health score ≥ 7").  Days are the user's local calendar
+  days (``meals.local_day``), so midnight is the user's midnight, and a
+  run stays current until a full local day passes without qualifying.
+- ``meal`` rules judge meals one after another in logging order (e.g.
+  "Healthy Legend": spinach five meals in a row); a non-qualifying meal
+  resets the run.
+
+The rare updates that cannot be done locally — a meal logged out of
+order, a delete in the middle of a run, or a delete that may lower the
+best run — fall back to ``recompute`` for that user and rule.  ``verify``
+runs the same recompute for every rule and reports any drift.
+"""
+
+import json
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from app.services.db import Connection
+from app.utils.parsing import extract_item_names
+
+HEALTHY_SCORE = 7.0
+
+
+@dataclass(frozen=True)
+class MealFacts:
+    """What meal rules look at."""
+
+    id: str
+    logged_at: datetime
+    labels: frozenset[str]
+    health_score: float | None
+
+
+@dataclass(frozen=True)
+class StreakRule:
+    key: str
+    name: str
+    unit: str  # "day" or "meal"
+    # A run this long earns the streak
+    target: int
+    # day rules get the day's daily_rollups row (or None); meal rules get MealFacts
+    qualifies: Callable[..., bool]
+
+
+def _logged(day: dict | None) -> bool:
+    return day is not None and day["meal_count"] > 0
+
+
+def _healthy(day: dict | None) -> bool:
+    return (
+        day is not None
+        and day["health_count"] > 0
+        and day["health_sum"] / day["health_count"] >= HEALTHY_SCORE
+    )
+
+
+def _has(food: str) -> Callable[[MealFacts], bool]:
+    return lambda meal: any(food in label for label in meal.labels)
+
+
+RULES = [
+    StreakRule("logging", "Daily logger", "day", 7, _logged),
+    StreakRule("healthy_days", "Healthy days", "day", 5, _healthy),
+    StreakRule("healthy_legend", "Healthy Legend", "meal", 5, _has("spinach")),
+]
+RULES_BY_KEY = {rule.key: rule for rule in RULES}
+
+STATE_COLUMNS = ["current_run", "best_run", "last_day", "last_meal_at", "last_meal_id"]
+
+
+def meal_facts(meal_id: str, logged_at: datetime, analysis: dict, labels: list[str], health_score: float | None) -> MealFacts:
+    """Labels from both the segmented items and GPT's item list, lower-cased."""
+    names = list(labels) + extract_item_names(analysis.get("items", ""))
+    return MealFacts(
+        id=meal_id,
+        logged_at=logged_at,
+        labels=frozenset(name.strip().lower() for name in names if name.strip()),
+        health_score=health_score,
+    )
+
+
+# ── State rows ───────────────────────────────────────────────────────
+
+
+def _empty_state() -> dict:
+    return {"current_run": 0, "best_run": 0, "last_day": None, "last_meal_at": None, "last_meal_id": None}
+
+
+async def _load(conn: Connection, user_id: str, rule: StreakRule) -> dict:
+    # Concurrent meals of one user serialize on the streak row (SQLite
+    # already serializes writers)
+    lock = " FOR UPDATE" if conn.dialect == "postgres" else ""
+    row = await conn.fetchrow(
+        f"SELECT {', '.join(STATE_COLUMNS)} FROM streaks WHERE user_id = $1 AND rule = $2{lock}",
+        user_id, rule.key,
+    )
+    return dict(row) if row else _empty_state()
+
+
+async def _save(conn: Connection, user_id: str, rule: StreakRule, state: dict) -> None:
+    state["best_run"] = max(state["best_run"], state["current_run"])
+    updates = ", ".join(f"{c} = excluded.{c}" for c in STATE_COLUMNS)
+    await conn.execute(
+        f"INSERT INTO streaks (user_id, rule, {', '.join(STATE_COLUMNS)}) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7) "
+        f"ON CONFLICT (user_id, rule) DO UPDATE SET {updates}",
+        user_id, rule.key, *(state[c] for c in STATE_COLUMNS),
+    )
+
+
+async def _day_row(conn: Connection, user_id: str, day: date) -> dict | None:
+    return await conn.fetchrow(
+        "SELECT meal_count, health_sum, health_count FROM daily_rollups "
+        "WHERE user_id = $1 AND day = $2",
+        user_id, day,
+    )
+
+
+# ── Full recompute (fallback and verification) ──────────────────────
+
+
+async def _compute_day_rule(conn: Connection, user_id: str, rule: StreakRule) -> dict:
+    state = _empty_state()
+    rows = await conn.fetch(
+        "SELECT day, meal_count, health_sum, health_count FROM daily_rollups "
+        "WHERE user_id = $1 ORDER BY day",
+        user_id,
+    )
+    for row in rows:
+        if not rule.qualifies(row):
+            continue
+        if state["last_day"] is not None and row["day"] == state["last_day"] + timedelta(days=1):
+            state["current_run"] += 1
+        else:
+            state["current_run"] = 1
+        state["last_day"] = row["day"]
+        state["best_run"] = max(state["best_run"], state["current_run"])
+    return state
+
+
+async def all_meal_facts(conn: Connection, user_id: str) -> list[MealFacts]:
+    """Every meal of a user, in logging order."""
+    meals = await conn.fetch(
+        "SELECT id, logged_at, analysis, health_score FROM meals WHERE user_id = $1 "
+        "ORDER BY logged_at, id",
+        user_id,
+    )
+    labels: dict[str, list[str]] = {}
+    for row in await conn.fetch("SELECT meal_id, label FROM food_items WHERE user_id = $1", user_id):
+        labels.setdefault(row["meal_id"], []).append(row["label"])
+    return [
+        meal_facts(m["id"], m["logged_at"], json.loads(m["analysis"]), labels.get(m["id"], []), m["health_score"])
+        for m in meals
+    ]
+
+
+def _compute_meal_rule(facts: list[MealFacts], rule: StreakRule) -> dict:
+    state = _empty_state()
+    for meal in facts:
+        state["current_run"] = state["current_run"] + 1 if rule.qualifies(meal) else 0
+        state["best_run"] = max(state["best_run"], state["current_run"])
+        state["last_meal_at"], state["last_meal_id"] = meal.logged_at, meal.id
+    return state
+
+
+async def compute(conn: Connection, user_id: str, rules: list[StreakRule] = RULES) -> dict[str, dict]:
+    """Streak state for ``rules`` derived from scratch."""
+    states = {}
+    facts = None
+    for rule in rules:
+        if rule.unit == "day":
+            states[rule.key] = await _compute_day_rule(conn, user_id, rule)
+        else:
+            if facts is None:
+                facts = await all_meal_facts(conn, user_id)
+            states[rule.key] = _compute_meal_rule(facts, rule)
+    return states
+
+
+async def recompute(conn: Connection, user_id: str, rules: list[StreakRule] = RULES) -> None:
+    for key, state in (await compute(conn, user_id, rules)).items():
+        await _save(conn, user_id, RULES_BY_KEY[key], state)
+
+
+async def verify(conn: Connection, user_id: str) -> list[str]:
+    """Rules whose stored state disagrees with a full recompute."""
+    stored = {
+        row["rule"]: row
+        for row in await conn.fetch(
+            f"SELECT rule, {', '.join(STATE_COLUMNS)} FROM streaks WHERE user_id = $1", user_id
+        )
+    }
+    mismatched = []
+    for key, expected in (await compute(conn, user_id)).items():
+        actual = stored.get(key) or _empty_state()
+        if any(actual[c] != expected[c] for c in STATE_COLUMNS):
+            mismatched.append(key)
+    return mismatched
+
+
+# ── Incremental updates ──────────────────────────────────────────────
+
+
+async def _shrink_head(conn: Connection, user_id: str, rule: StreakRule, state: dict, day: date) -> None:
+    """The run's last day stopped qualifying.
+
+    ``last_day`` is always the latest qualifying day, so once the run
+    empties (or was the best) the previous one has to be found in history.
+    """
+    if state["current_run"] <= 1 or state["best_run"] == state["current_run"]:
+        await recompute(conn, user_id, [rule])
+        return
+    state["current_run"] -= 1
+    state["last_day"] = day - timedelta(days=1)
+    await _save(conn, user_id, rule, state)
+
+
+async def on_meal_added(conn: Connection, user_id: str, day: date, meal: MealFacts) -> None:
+    """Call in the insert transaction, after the daily rollup is updated."""
+    day_row = await _day_row(conn, user_id, day)
+    for rule in RULES:
+        state = await _load(conn, user_id, rule)
+
+        if rule.unit == "meal":
+            if state["last_meal_at"] is not None and (meal.logged_at, meal.id) < (state["last_meal_at"], state["last_meal_id"]):
+                await recompute(conn, user_id, [rule])  # logged out of order
+                continue
+            state["current_run"] = state["current_run"] + 1 if rule.qualifies(meal) else 0
+            state["last_meal_at"], state["last_meal_id"] = meal.logged_at, meal.id
+            await _save(conn, user_id, rule, state)
+            continue
+
+        qualifies = rule.qualifies(day_row)
+        last_day = state["last_day"]
+        if last_day is not None and day < last_day:
+            await recompute(conn, user_id, [rule])  # may bridge or split an older run
+        elif day == last_day:
+            if not qualifies:  # this meal pulled the day below the bar
+                await _shrink_head(conn, user_id, rule, state, day)
+        elif qualifies:
+            contiguous = last_day is not None and day == last_day + timedelta(days=1)
+            state["current_run"] = state["current_run"] + 1 if contiguous else 1
+            state["last_day"] = day
+            await _save(conn, user_id, rule, state)
+
+
+async def on_meal_removed(conn: Connection, user_id: str, day: date | None, meal: MealFacts) -> None:
+    """Call in the delete transaction, after the meal row and rollups are updated."""
+    day_row = await _day_row(conn, user_id, day) if day is not None else None
+    for rule in RULES:
+        state = await _load(conn, user_id, rule)
+
+        if rule.unit == "meal":
+            at_head = state["last_meal_id"] == meal.id
+            if at_head and rule.qualifies(meal) and state["best_run"] > state["current_run"]:
+                state["current_run"] -= 1
+                previous = await conn.fetchrow(
+                    "SELECT id, logged_at FROM meals WHERE user_id = $1 "
+                    "ORDER BY logged_at DESC, id DESC LIMIT 1",
+                    user_id,
+                )
+                state["last_meal_id"] = previous["id"] if previous else None
+                state["last_meal_at"] = previous["logged_at"] if previous else None
+                await _save(conn, user_id, rule, state)
+            else:
+                await recompute(conn, user_id, [rule])
+            continue
+
+        last_day = state["last_day"]
+        if day is None or last_day is None or day > last_day:
+            continue  # the meal's day is not part of any counted run
+        if rule.qualifies(day_row):
+            continue
+        if day == last_day:
+            await _shrink_head(conn, user_id, rule, state, day)
+        else:
+            await recompute(conn, user_id, [rule])  # a day inside the history dropped out
+
+
+# ── Reads ────────────────────────────────────────────────────────────
+
+
+async def get_streaks(conn: Connection, user_id: str, today: date) -> list[dict]:
+    """Every rule's streak for a user, in one query.
+
+    A day run whose last day is before yesterday (in the user's timezone)
+    has lapsed, so its current length reads as 0; a run that ended
+    yesterday is still alive until today's midnight.
+    """
+    rows = {
+        row["rule"]: row
+        for row in await conn.fetch(
+            f"SELECT rule, {', '.join(STATE_COLUMNS)} FROM streaks WHERE user_id = $1", user_id
+        )
+    }
+    result = []
+    for rule in RULES:
+        state = rows.get(rule.key) or _empty_state()
+        current = state["current_run"]
+        if rule.unit == "day" and (state["last_day"] is None or state["last_day"] < today - timedelta(days=1)):
+            current = 0
+        result.append({
+            "rule": rule.key,
+            "name": rule.name,
+            "unit": rule.unit,
+            "target": rule.target,
+            "current": current,
+            "best": state["best_run"],
+            "last_day": state["last_day"],
+            "achieved": state["best_run"] >= rule.target,
+        })
+    return result
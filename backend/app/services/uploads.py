@@ -0,0 +1,58 @@
+"""Original photos uploaded straight to object storage.
+
+The client asks for a presigned PUT URL, sends the photo to the storage
+backend itself, then calls ``/api/analyze/object`` with the key.  The API
+worker only ever pulls a size-checked, downscaled JPEG back out, so the
+multi-megabyte original never passes through the API tier on the way in.
+"""
+
+import re
+import tempfile
+import uuid
+
+from app.config import settings
+from app.services.storage import ORIGINALS_PREFIX, get_storage
+from app.utils.image import normalize_image
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+_ORIGINAL_KEY_RE = re.compile(
+    rf"^{ORIGINALS_PREFIX}/[0-9a-f]{{32}}\.(jpg|png|webp)$"
+)
+
+# Originals are buffered in memory up to this size, then on disk
+SPOOL_MAX_BYTES = 4 * 1024 * 1024
+
+
+def new_original_key(content_type: str) -> str:
+    return f"{ORIGINALS_PREFIX}/{uuid.uuid4().hex}{CONTENT_TYPE_EXTENSIONS[content_type]}"
+
+
+def is_original_key(key: str) -> bool:
+    """Only keys minted by ``new_original_key`` may be analyzed."""
+    return bool(_ORIGINAL_KEY_RE.match(key))
+
+
+def presign_original_upload(content_type: str) -> tuple[str, str] | None:
+    """Return (key, url) for a direct upload, or None if the backend can't."""
+    key = new_original_key(content_type)
+    url = get_storage().presign_put(key, content_type, settings.upload_presign_expiry_s)
+    if url is None:
+        return None
+    return key, url
+
+
+def max_upload_bytes() -> int:
+    return settings.max_upload_mb * 1024 * 1024
+
+
+def fetch_normalized(key: str, max_dim: int = 2048) -> bytes:
+    """Download an original and return it decoded at ≤ max_dim as JPEG."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buf:
+        get_storage().download_to(key, buf)
+        buf.seek(0)
+        return normalize_image(buf, max_dim=max_dim)
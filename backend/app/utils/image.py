@@ -1,9 +1,10 @@
 import base64
 import io
+from typing import BinaryIO
 
 import httpx
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 
 
 def image_bytes_to_base64(image_bytes: bytes) -> str:
@@ -21,6 +22,22 @@ def resize_if_needed(image_bytes: bytes, max_dim: int = 2048) -> bytes:
     return buf.getvalue()
 
 
+def normalize_image(fp: BinaryIO, max_dim: int = 2048, quality: int = 90) -> bytes:
+    """Decode an uploaded photo at reduced size and re-encode it as JPEG.
+
+    ``draft`` lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding,
+    so a 12-megapixel original never has to be held at full resolution.
+    EXIF orientation is applied so phone photos come out upright.
+    """
+    img = Image.open(fp)
+    img.draft("RGB", (max_dim, max_dim))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
 def image_bytes_to_data_uri(image_bytes: bytes, mime: str = "image/jpeg") -> str:
     b64 = image_bytes_to_base64(image_bytes)
     return f"data:{mime};base64,{b64}"
@@ -0,0 +1,152 @@
+import re
+import unicodedata
+
+# Portions and preparation notes GPT and YOLO append to a food name
+_PARENTHETICAL = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_QUANTITY = re.compile(r"^\s*(?:\d+(?:\.\d+)?|a|an|one|two|three|half)\s+(?:(?:cups?|bowls?|pieces?|slices?|plates?|tbsp|tsp|g|grams?)\s+(?:of\s+)?)?", re.I)
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+# Plurals that the suffix rules below would get wrong
+_IRREGULAR = {"leaves": "leaf", "potatoes": "potato", "tomatoes": "tomato", "mangoes": "mango"}
+_UNCHANGED = {"molasses", "chaas"}
+
+
+def _singular(word: str) -> str:
+    if word in _IRREGULAR:
+        return _IRREGULAR[word]
+    if word in _UNCHANGED or len(word) <= 3 or word.endswith(("ss", "us")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def fold(text: str) -> str:
+    """Lower-case, strip accents and punctuation, collapse whitespace: "Crème brûlée." → "creme brulee"."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def canonical_label(label: str) -> str:
+    """The key a food is indexed under: "Tomatoes (2 slices)" → "tomato".
+
+    Portions and parentheticals dropped, then folded (``fold``), and each
+    word made singular.
+    """
+    text = _PARENTHETICAL.sub(" ", label.lower())
+    text = _QUANTITY.sub("", text)
+    return " ".join(_singular(word) for word in fold(text).split())
+
+
+# ── Pipeline label keys ──────────────────────────────────────────────
+#
+# ``canonical_label`` is the stored key (food_items, food_stats) and stays
+# purely lexical.  The pipeline groups more aggressively, before it pays
+# for segmentation and GPT filters: presentation words and trailing
+# portion nouns dropped, synonyms mapped, and merges learned at runtime
+# (``app.services.label_merges``) applied last.
+
+# Words that describe how a food is served, not what it is
+_PRESENTATION = {
+    "fresh", "sliced", "chopped", "diced", "shredded", "grated", "cubed", "halved",
+    "minced", "whole", "small", "large", "mixed", "assorted", "some", "cut",
+}
+# Trailing nouns naming a portion of the food before them ("spinach leaf")
+_PORTION_NOUNS = {
+    "leaf", "slice", "piece", "chunk", "wedge", "cube", "stick", "strip",
+    "floret", "segment", "sprig", "bit",
+}
+# Compounds where the trailing noun is the food itself
+_COMPOUNDS = {"bay leaf", "curry leaf", "fish stick", "mozzarella stick", "cheese stick", "bread stick"}
+
+SYNONYMS = {
+    "garbanzo": "chickpea", "garbanzo bean": "chickpea", "chana": "chickpea", "chole": "chickpea",
+    "curd": "yogurt", "dahi": "yogurt", "yoghurt": "yogurt",
+    "aubergine": "eggplant", "brinjal": "eggplant", "baingan": "eggplant",
+    "courgette": "zucchini", "capsicum": "bell pepper",
+    "coriander": "cilantro", "dhaniya": "cilantro",
+    "scallion": "green onion", "spring onion": "green onion",
+    "prawn": "shrimp", "rocket": "arugula",
+    "fry": "french fry", "chip": "french fry",
+    "palak": "spinach", "aloo": "potato", "gobi": "cauliflower", "bhindi": "okra", "lady finger": "okra",
+    "chapati": "roti", "chapatti": "roti", "phulka": "roti",
+    "mung bean sprout": "bean sprout", "sprout": "bean sprout",
+    "white rice": "rice", "steamed rice": "rice", "basmati rice": "rice", "plain rice": "rice",
+}
+
+# Generic labels and the specific foods they cover: "vegetables" next to
+# "carrot" and "cucumber" is the same pixels counted twice
+HYPERNYMS = {
+    "vegetable": {
+        "carrot", "cucumber", "bean sprout", "spinach", "broccoli", "cauliflower", "cabbage",
+        "lettuce", "tomato", "onion", "green onion", "bell pepper", "zucchini", "eggplant",
+        "okra", "pea", "green bean", "corn", "mushroom", "radish", "beetroot", "potato",
+        "kale", "arugula", "celery", "asparagus", "pumpkin",
+    },
+    "fruit": {
+        "apple", "banana", "orange", "grape", "mango", "pineapple", "strawberry", "blueberry",
+        "raspberry", "kiwi", "papaya", "watermelon", "melon", "pear", "peach", "pomegranate",
+        "cherry", "lemon", "lime", "avocado",
+    },
+    "meat": {"chicken", "beef", "pork", "lamb", "mutton", "bacon", "sausage", "ham", "turkey"},
+    "seafood": {"fish", "shrimp", "salmon", "tuna", "crab", "squid", "mussel", "clam", "oyster"},
+    "nut": {"almond", "cashew", "walnut", "peanut", "pistachio", "hazelnut"},
+    "bread": {"roti", "naan", "paratha", "toast", "bun", "baguette", "pita", "tortilla"},
+    "green": {"spinach", "lettuce", "kale", "arugula", "cilantro"},
+}
+HYPERNYMS["leafy green"] = HYPERNYMS["green"]
+HYPERNYMS["veggie"] = HYPERNYMS["vegetable"]
+# Longest merge chain followed, so a cycle in learned merges cannot loop
+_MAX_HOPS = 4
+
+
+def label_key(label: str, merges: dict[str, str] | None = None) -> str:
+    """The key the pipeline groups labels under: "Fresh spinach leaves" → "spinach".
+
+    ``canonical_label`` minus presentation words and a trailing portion
+    noun, then mapped through ``SYNONYMS`` and the learned ``merges``.
+    """
+    words = [w for w in canonical_label(label).split() if w not in _PRESENTATION]
+    key = " ".join(words)
+    if len(words) > 1 and words[-1] in _PORTION_NOUNS and key not in _COMPOUNDS:
+        key = " ".join(words[:-1])
+    key = SYNONYMS.get(key, key)
+    for _ in range(_MAX_HOPS):
+        if not merges or key not in merges:
+            break
+        key = merges[key]
+    return key
+
+
+def _head(key: str) -> str:
+    return key.rsplit(" ", 1)[-1]
+
+
+def is_hypernym(general: str, specific: str) -> bool:
+    """Whether key ``general`` covers key ``specific`` ("vegetable" ⊇ "baby carrot")."""
+    members = HYPERNYMS.get(general)
+    if not members or general == specific:
+        return False
+    return specific in members or _head(specific) in members
+
+
+def generic_keys(keys: list[str]) -> set[str]:
+    """The keys in ``keys`` that are hypernyms of another key in it."""
+    present = set(keys)
+    return {g for g in present if g in HYPERNYMS and any(is_hypernym(g, k) for k in present)}
+
+
+def unique_labels(labels: list[str], merges: dict[str, str] | None = None) -> list[str]:
+    """One label per key, first spelling kept, generic labels dropped when their parts are present."""
+    first: dict[str, str] = {}
+    for label in labels:
+        key = label_key(label, merges)
+        if key:
+            first.setdefault(key, label)
+    generic = generic_keys(list(first))
+    return [label for key, label in first.items() if key not in generic]
@@ -1,3 +1,4 @@
+import json
 import re
 
 
@@ -20,23 +21,230 @@ ANALYSIS_FIELDS = [
 ]
 
 
-def parse_gpt_response(text: str) -> dict[str, str]:
-    matches = re.findall(
-        r"\d+\.\s\*\*.*?\*\*:\s*(.*?)(?=\n\d+\.|\Z)", text, re.DOTALL
-    )
+def _fmt(value: float | int | None) -> str:
+    if value is None:
+        return ""
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def display_fields(data: dict) -> dict[str, str]:
+    """A structured analysis (``gpt_service.ANALYSIS_SCHEMA``) as the
+    ``FoodAnalysis`` display strings, formatted the way the markdown answers
+    were.  Only for the response; the pipeline reads ``item_names`` and
+    ``structured_metrics`` off the typed fields instead."""
+    items = data.get("items") or []
+    macros = data.get("macronutrients") or {}
+    total = data.get("total_calories")
+    calories = [f"- {item['name']}: {_fmt(item.get('calories'))} kcal" for item in items]
+    if total is not None:
+        calories.append(f"Total: {_fmt(total)} kcal")
     return {
-        field: matches[i].strip() if i < len(matches) else ""
-        for i, field in enumerate(ANALYSIS_FIELDS)
+        "description": data.get("description", ""),
+        "items": "\n".join(f"- {item['name']}" for item in items),
+        "calories": "\n".join(calories),
+        "total_calories": f"{_fmt(total)} kcal" if total is not None else "",
+        "health_score": _fmt(data.get("health_score")),
+        "rationale": data.get("rationale", ""),
+        "macronutrient_estimate": (
+            f"Protein: {_fmt(macros.get('protein_g'))}g, "
+            f"Fat: {_fmt(macros.get('fat_g'))}g, "
+            f"Carbs: {_fmt(macros.get('carbs_g'))}g"
+        ) if macros else "",
+        "eat_frequency": data.get("eat_frequency", ""),
+        "ideal_comparison": data.get("ideal_comparison", ""),
+        "mood_impact": data.get("mood_impact", ""),
+        "satiety_score": _fmt(data.get("satiety_score")),
+        "bloat_score": _fmt(data.get("bloat_score")),
+        "tasty_score": _fmt(data.get("tasty_score")),
+        "addiction_score": _fmt(data.get("addiction_score")),
+        "summary": data.get("summary", ""),
     }
 
 
+class JsonFieldScanner:
+    """Incremental reader of a streamed JSON object's top-level fields.
+
+    ``feed`` takes the next chunk of text and returns the (key, value)
+    pairs whose values completed in it, so a field can be used while the
+    rest of the object is still being generated.  Each character is
+    scanned once; only finished values are handed to ``json.loads``.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start = 0
+        self._key: str | None = None
+        self._value_start: int | None = None
+
+    def _finish(self, end: int) -> tuple[str, object]:
+        value = json.loads(self._buf[self._value_start:end])
+        pair = (self._key, value)
+        self._key, self._value_start = None, None
+        return pair
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self._buf += chunk
+        done: list[tuple[str, object]] = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = i
+            elif c == ":" and self._depth == 1 and self._value_start is None:
+                self._value_start = i + 1
+            elif c in "[{":
+                self._depth += 1
+            elif c in "]}":
+                self._depth -= 1
+                if self._depth == 0 and self._value_start is not None:
+                    done.append(self._finish(i))
+            elif c == "," and self._depth == 1 and self._value_start is not None:
+                done.append(self._finish(i))
+        self._pos = len(buf)
+        return done
+
+
+def item_names(data: dict) -> list[str]:
+    """Item names from a structured analysis's items array."""
+    return [
+        item["name"].strip() for item in data.get("items") or []
+        if isinstance(item, dict) and isinstance(item.get("name"), str) and item["name"].strip()
+    ]
+
+
+# A bullet or list number, not a quantity: "- 7-layer dip" keeps its 7
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+
 def extract_item_names(items_text: str) -> list[str]:
+    """Item names from a stored ``FoodAnalysis.items`` bullet list."""
     lines = items_text.strip().splitlines()
     names = []
     for line in lines:
-        cleaned = re.sub(r"^[-*\d.)\s]+", "", line).strip()
+        cleaned = _LIST_MARKER_RE.sub("", line).strip()
         if cleaned:
             names.append(cleaned)
     if not names and items_text.strip():
         names = [s.strip() for s in items_text.split(",") if s.strip()]
     return names
+
+
+_NUMBER = r"\d[\d,]*(?:\.\d+)?"
+_RANGE = rf"{_NUMBER}(?:\s*(?:-|–|to)\s*{_NUMBER})?"
+_RANGE_RE = re.compile(rf"({_NUMBER})(?:\s*(?:-|–|to)\s*({_NUMBER}))?")
+
+EAT_FREQUENCY_VALUES = {
+    "daily": ("daily",),
+    "occasional": ("occasional", "treat"),
+    "rare": ("avoid", "rarely"),
+}
+
+
+def parse_number(text: str) -> float | None:
+    """First number in free text; a range such as "600-700" gives its midpoint."""
+    match = _RANGE_RE.search(text or "")
+    if not match:
+        return None
+    low = float(match.group(1).replace(",", ""))
+    if match.group(2) is None:
+        return low
+    return (low + float(match.group(2).replace(",", ""))) / 2
+
+
+def parse_score(text: str) -> float | None:
+    """A 0–10 score field (e.g. "7.5/10 — mostly veg"), clamped."""
+    value = parse_number(text)
+    if value is None:
+        return None
+    return min(10.0, max(0.0, value))
+
+
+def parse_macro(text: str, name: str) -> float | None:
+    """Grams of one macronutrient from e.g. "Protein: 25g, Fat: 10g, Carbs: 60g"."""
+    text = text or ""
+    # "Protein: ~25g" / "Protein (g): 25", then "25g protein"
+    match = re.search(rf"{name}[^,;\n\d]*?({_RANGE})", text, re.I) or re.search(
+        rf"({_RANGE})\s*g(?:rams)?\s*(?:of\s+)?{name}", text, re.I
+    )
+    if not match:
+        return None
+    return parse_number(match.group(1))
+
+
+def parse_eat_frequency(text: str) -> str | None:
+    """Map the prompt's labels onto ``daily`` / ``occasional`` / ``rare``."""
+    lowered = (text or "").lower()
+    for value, keywords in EAT_FREQUENCY_VALUES.items():
+        if any(keyword in lowered for keyword in keywords):
+            return value
+    return None
+
+
+# ANALYSIS_SCHEMA's eat_frequency enum → the meals.eat_frequency value
+EAT_FREQUENCY_ENUM = {
+    "Can eat daily": "daily",
+    "Occasional treat": "occasional",
+    "Avoid except rarely": "rare",
+}
+
+
+def _clamped_score(value) -> float | None:
+    if not isinstance(value, (int, float)):
+        return None
+    return min(10.0, max(0.0, float(value)))
+
+
+def _grams(value) -> float | None:
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def structured_metrics(data: dict) -> dict[str, float | int | str | None]:
+    """Typed metrics straight from a structured analysis, the shape ``parse_metrics`` returns."""
+    calories = data.get("total_calories")
+    macros = data.get("macronutrients") or {}
+    return {
+        "total_calories": round(calories) if isinstance(calories, (int, float)) else None,
+        "health_score": _clamped_score(data.get("health_score")),
+        "satiety_score": _clamped_score(data.get("satiety_score")),
+        "bloat_score": _clamped_score(data.get("bloat_score")),
+        "tasty_score": _clamped_score(data.get("tasty_score")),
+        "addiction_score": _clamped_score(data.get("addiction_score")),
+        "protein_g": _grams(macros.get("protein_g")),
+        "fat_g": _grams(macros.get("fat_g")),
+        "carbs_g": _grams(macros.get("carbs_g")),
+        "eat_frequency": EAT_FREQUENCY_ENUM.get(data.get("eat_frequency")),
+    }
+
+
+def parse_metrics(parsed: dict[str, str]) -> dict[str, float | int | str | None]:
+    """Typed metrics from a text analysis (legacy rows, or a meal queued
+    without ``structured_metrics``); done once, when a meal is stored."""
+    calories = parse_number(parsed.get("total_calories", ""))
+    macros = parsed.get("macronutrient_estimate", "")
+    return {
+        "total_calories": round(calories) if calories is not None else None,
+        "health_score": parse_score(parsed.get("health_score", "")),
+        "satiety_score": parse_score(parsed.get("satiety_score", "")),
+        "bloat_score": parse_score(parsed.get("bloat_score", "")),
+        "tasty_score": parse_score(parsed.get("tasty_score", "")),
+        "addiction_score": parse_score(parsed.get("addiction_score", "")),
+        "protein_g": parse_macro(macros, "protein"),
+        "fat_g": parse_macro(macros, "fat"),
+        "carbs_g": parse_macro(macros, "carb"),
+        "eat_frequency": parse_eat_frequency(parsed.get("eat_frequency", "")),
+    }
@@ -0,0 +1,131 @@
+"""Backfill — convert legacy ``food_logs`` rows into typed ``meals`` rows.
+
+``food_logs`` (see supabase_schema.sql) keeps every metric as text.  This
+script walks it in id ranges, parses each row once with the same
+``parse_metrics`` used at ingest and inserts it into ``meals``.  Ranges
+are processed by several workers at once, each on its own pooled
+connection.  Meal ids are derived from the legacy id (``food_logs-<id>``),
+so a re-run skips rows that are already converted and an interrupted run
+can simply be started again.  Meals are bucketed on their day in
+``--timezone``, and the rollups, streaks and badges are rebuilt once
+every batch is in.
+
+Usage:
+    cd backend/
+    python backfill_food_logs.py [--batch-size 500] [--workers 4] [--user-id local]
+                                 [--timezone Asia/Kolkata]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.config import settings
+from app.models.schemas import FoodAnalysis
+from app.services import badges, db, rollups, streaks
+from app.services.repository import METRIC_COLUMNS
+from app.utils.parsing import ANALYSIS_FIELDS, parse_metrics, parse_number
+
+LEGACY_COLUMNS = [
+    "id", "timestamp", "image_url", *ANALYSIS_FIELDS,
+    "macros_protein", "macros_fat", "macros_carb",
+]
+
+
+def convert(row: dict, user_id: str, tz: str) -> tuple:
+    """One ``food_logs`` row → a ``meals`` insert tuple."""
+    analysis = FoodAnalysis(**{f: row[f] or "" for f in ANALYSIS_FIELDS}).model_dump()
+    metrics = parse_metrics(analysis)
+    # Older rows carry macros in their own columns ("unspecified" when unknown)
+    legacy_macros = {"macros_protein": "protein_g", "macros_fat": "fat_g", "macros_carb": "carbs_g"}
+    for column, name in legacy_macros.items():
+        if metrics[name] is None:
+            metrics[name] = parse_number(row[column] or "")
+    logged_at = row["timestamp"] or datetime.now(timezone.utc)
+    if isinstance(logged_at, str):
+        logged_at = datetime.fromisoformat(logged_at)
+    return (
+        f"food_logs-{row['id']}",
+        user_id,
+        logged_at,
+        tz,
+        rollups.local_day(logged_at, tz),
+        row["image_url"],
+        json.dumps(analysis),
+        *(metrics[name] for name in METRIC_COLUMNS),
+    )
+
+
+async def backfill_range(low: int, high: int, user_id: str, tz: str) -> int:
+    async with db.get_db().acquire() as conn:
+        rows = await conn.fetch(
+            f"SELECT {', '.join(LEGACY_COLUMNS)} FROM food_logs "
+            "WHERE id >= $1 AND id < $2 ORDER BY id",
+            low, high,
+        )
+    if not rows:
+        return 0
+    values = [convert(row, user_id, tz) for row in rows]
+    columns = ["id", "user_id", "logged_at", "tz", "local_day", "image_url", "analysis", *METRIC_COLUMNS]
+    placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+    async with db.get_db().transaction() as conn:
+        await conn.executemany(
+            f"INSERT INTO meals ({', '.join(columns)}) VALUES ({placeholders}) "
+            "ON CONFLICT (id) DO NOTHING",
+            values,
+        )
+    return len(values)
+
+
+async def main(batch_size: int, workers: int, user_id: str, tz: str) -> None:
+    await db.connect()
+    async with db.get_db().acquire() as conn:
+        bounds = await conn.fetchrow("SELECT min(id) AS low, max(id) AS high FROM food_logs")
+    if bounds is None or bounds["low"] is None:
+        print("food_logs is empty — nothing to backfill")
+        await db.close()
+        return
+
+    ranges = [
+        (low, low + batch_size)
+        for low in range(bounds["low"], bounds["high"] + 1, batch_size)
+    ]
+    print(f"Backfilling ids {bounds['low']}–{bounds['high']} in {len(ranges)} batches, {workers} workers")
+
+    semaphore = asyncio.Semaphore(workers)
+    done = 0
+    t0 = time.time()
+
+    async def run(low: int, high: int) -> None:
+        nonlocal done
+        async with semaphore:
+            converted = await backfill_range(low, high, user_id, tz)
+        done += converted
+
+    await asyncio.gather(*(run(low, high) for low, high in ranges))
+    # Already-converted rows are counted too; their inserts were no-ops
+    print(f"Processed {done} rows in {time.time() - t0:.1f}s")
+
+    # Inserts above bypass the incremental path, so rebuild this user's rollups
+    async with db.get_db().transaction() as conn:
+        days = await rollups.rebuild(conn, user_id)
+        await streaks.recompute(conn, user_id)
+        await badges.replay(conn, user_id)
+    print(f"Rebuilt rollups: {days} day buckets")
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--user-id", default=settings.default_user_id)
+    parser.add_argument("--timezone", default=settings.default_timezone)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.workers, args.user_id, args.timezone))
@@ -2,9 +2,15 @@
 
 Usage:
     cd backend/
-    python batch_test.py
+    python batch_test.py [--mode two_call|fused|both] [--detail full|compact]
+                         [--handoff wait|stream|split]
+
+``--mode both`` runs every image through both pipeline modes and adds a
+comparison (time, GPT vision calls, agreement of the final items) to the
+summary.
 """
 
+import argparse
 import os
 import shutil
 import sys
@@ -13,13 +19,15 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from app.services.pipeline import run_pipeline
+from app.services.image_store import path_for_url
+from app.services.gpt_service import ANALYSIS_DETAILS
+from app.services.label_merges import key as label_key
+from app.services.pipeline import ANALYSIS_HANDOFFS, PIPELINE_MODES, run_pipeline
 from app.utils.image import resize_if_needed
 
 TEST_DIR = Path(__file__).resolve().parent.parent / "test_images"
 RESULTS_DIR = Path(__file__).resolve().parent.parent / "test_results"
 SCREENSHOTS_DIR = RESULTS_DIR / "screenshots"
-MEDIA_DIR = Path(__file__).resolve().parent / "media"
 
 
 def get_all_images() -> list[Path]:
@@ -29,11 +37,19 @@ def get_all_images() -> list[Path]:
     return sorted(images)
 
 
-def run_single(img_path: Path) -> dict:
+def vision_calls(timing: dict) -> int:
+    """Per-item GPT vision calls (box classification, quality checks, fused batches)."""
+    return sum(
+        int(timing.get(k, 0))
+        for k in ("gpt_classification_calls", "pp_quality_gpt_checked", "pp_fused_gpt_calls")
+    )
+
+
+def run_single(img_path: Path, mode: str, detail: str = "full", handoff: str = "wait") -> dict:
     """Run pipeline on one image, return result dict."""
     stem = img_path.stem
     print(f"\n{'='*60}")
-    print(f"  {stem}")
+    print(f"  {stem} [{mode}]")
     print(f"{'='*60}")
 
     image_bytes = img_path.read_bytes()
@@ -41,7 +57,7 @@ def run_single(img_path: Path) -> dict:
 
     t0 = time.time()
     try:
-        response = run_pipeline(image_bytes)
+        response = run_pipeline(image_bytes, mode=mode, detail=detail, handoff=handoff)
         elapsed = time.time() - t0
 
         seg = response.segmentation
@@ -49,27 +65,34 @@ def run_single(img_path: Path) -> dict:
 
         # Copy visualization to screenshots
         if seg.visualization_url:
-            vis_filename = seg.visualization_url.split("/")[-1]
-            vis_src = MEDIA_DIR / "visualizations" / vis_filename
+            vis_src = path_for_url(seg.visualization_url)
             if vis_src.exists():
-                shutil.copy2(vis_src, SCREENSHOTS_DIR / f"{stem}_result.jpg")
+                suffix = "" if mode == "two_call" else f"_{mode}"
+                shutil.copy2(vis_src, SCREENSHOTS_DIR / f"{stem}_result{suffix}.jpg")
 
         # Copy input image to screenshots
         shutil.copy2(img_path, SCREENSHOTS_DIR / f"{stem}_input.jpg")
 
         items = [item.label for item in seg.segmented_items]
+        boxes_in = timing.get("prune_input_count", "?")
+        boxes_out = timing.get("prune_output_count", "?")
         pp_input = timing.get("pp_input_count", "?")
         pp_output = timing.get("pp_output_count", "?")
 
         result = {
             "image": stem,
+            "mode": mode,
             "status": "OK",
             "total_s": round(elapsed, 1),
+            "boxes_confirmed": boxes_in,
+            "boxes_segmented": boxes_out,
             "items_before_pp": pp_input,
             "items_after_pp": pp_output,
             "final_items": items,
             "seg_count": seg.item_count,
             "has_visualization": bool(seg.visualization_url),
+            "vision_calls": vision_calls(timing),
+            "analysis": f"{timing.get('gpt_vision_s', '?')}s / {timing.get('gpt_output_tokens', '?')} tok",
         }
 
         print(f"  OK — {seg.item_count} items in {elapsed:.1f}s: {items}")
@@ -82,19 +105,72 @@ def run_single(img_path: Path) -> dict:
         print(f"  FAIL — {exc}")
         return {
             "image": stem,
+            "mode": mode,
             "status": f"FAIL: {exc}",
             "total_s": round(elapsed, 1),
+            "boxes_confirmed": 0,
+            "boxes_segmented": 0,
             "items_before_pp": 0,
             "items_after_pp": 0,
             "final_items": [],
             "seg_count": 0,
             "has_visualization": False,
+            "vision_calls": 0,
+            "analysis": "—",
         }
 
 
-def write_summary(results: list[dict]):
+def agreement(a: list[str], b: list[str]) -> float:
+    """Jaccard overlap of two final item lists, compared by label key."""
+    keys_a, keys_b = {label_key(x) for x in a}, {label_key(x) for x in b}
+    if not keys_a and not keys_b:
+        return 1.0
+    return len(keys_a & keys_b) / len(keys_a | keys_b)
+
+
+def comparison_lines(results: list[dict]) -> list[str]:
+    """Fused vs two-call per image; the two-call output is the reference."""
+    by_image: dict[str, dict[str, dict]] = {}
+    for r in results:
+        by_image.setdefault(r["image"], {})[r["mode"]] = r
+    pairs = [
+        (runs["two_call"], runs["fused"])
+        for runs in by_image.values()
+        if runs.get("two_call", {}).get("status") == "OK" and runs.get("fused", {}).get("status") == "OK"
+    ]
+    lines = [
+        "",
+        "## Mode comparison (fused vs two-call)",
+        "",
+        "| Image | Two-call time | Fused time | Two-call GPT calls | Fused GPT calls "
+        "| Two-call items | Fused items | Agreement |",
+        "|-------|---------------|------------|--------------------|-----------------"
+        "|----------------|-------------|-----------|",
+    ]
+    for two, fused in pairs:
+        lines.append(
+            f"| {two['image']} | {two['total_s']}s | {fused['total_s']}s "
+            f"| {two['vision_calls']} | {fused['vision_calls']} "
+            f"| {two['seg_count']} | {fused['seg_count']} "
+            f"| {agreement(two['final_items'], fused['final_items']):.0%} |"
+        )
+    if pairs:
+        n = len(pairs)
+        lines.extend([
+            "",
+            f"**Mean time**: two-call {sum(t['total_s'] for t, _ in pairs) / n:.1f}s, "
+            f"fused {sum(f['total_s'] for _, f in pairs) / n:.1f}s",
+            f"**GPT vision calls**: two-call {sum(t['vision_calls'] for t, _ in pairs)}, "
+            f"fused {sum(f['vision_calls'] for _, f in pairs)}",
+            f"**Mean agreement**: {sum(agreement(t['final_items'], f['final_items']) for t, f in pairs) / n:.0%}",
+        ])
+    return lines
+
+
+def write_summary(results: list[dict], detail: str = "full", handoff: str = "wait"):
     """Write markdown summary of all results."""
     summary_path = RESULTS_DIR / "batch_test_results.md"
+    modes = sorted({r["mode"] for r in results})
 
     ok = [r for r in results if r["status"] == "OK"]
     fail = [r for r in results if r["status"] != "OK"]
@@ -106,11 +182,13 @@ def write_summary(results: list[dict]):
         f"**Images tested**: {len(results)}",
         f"**Passed**: {len(ok)} | **Failed**: {len(fail)}",
         f"**Total time**: {sum(r['total_s'] for r in results):.0f}s",
+        f"**Pipeline mode**: {', '.join(modes)} | **Analysis detail**: {detail} "
+        f"| **Analysis hand-off**: {handoff}",
         "",
         "## Results",
         "",
-        "| # | Image | Status | Time | Before PP | After PP | Final Items |",
-        "|---|-------|--------|------|-----------|----------|-------------|",
+        "| # | Image | Mode | Status | Time | Analysis | GPT calls | Boxes | Segmented | Before PP | After PP | Final Items |",
+        "|---|-------|------|--------|------|----------|-----------|-------|-----------|-----------|----------|-------------|",
     ]
 
     for i, r in enumerate(results, 1):
@@ -118,10 +196,14 @@ def write_summary(results: list[dict]):
         if len(items_str) > 60:
             items_str = items_str[:57] + "..."
         lines.append(
-            f"| {i} | {r['image']} | {r['status'][:4]} | {r['total_s']}s "
+            f"| {i} | {r['image']} | {r['mode']} | {r['status'][:4]} | {r['total_s']}s "
+            f"| {r['analysis']} | {r['vision_calls']} | {r['boxes_confirmed']} | {r['boxes_segmented']} "
             f"| {r['items_before_pp']} | {r['items_after_pp']} | {items_str} |"
         )
 
+    if len(modes) > 1:
+        lines.extend(comparison_lines(results))
+
     if fail:
         lines.extend(["", "## Failures", ""])
         for r in fail:
@@ -137,6 +219,13 @@ def write_summary(results: list[dict]):
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=[*PIPELINE_MODES, "both"], default="two_call")
+    parser.add_argument("--detail", choices=ANALYSIS_DETAILS, default="full")
+    parser.add_argument("--handoff", choices=ANALYSIS_HANDOFFS, default="wait")
+    args = parser.parse_args()
+    modes = list(PIPELINE_MODES) if args.mode == "both" else [args.mode]
+
     SCREENSHOTS_DIR.mkdir(parents=True, exist_ok=True)
 
     images = get_all_images()
@@ -144,11 +233,12 @@ def main():
 
     results = []
     for i, img_path in enumerate(images, 1):
-        print(f"\n[{i}/{len(images)}]", end="")
-        result = run_single(img_path)
-        results.append(result)
+        for mode in modes:
+            print(f"\n[{i}/{len(images)}]", end="")
+            result = run_single(img_path, mode, args.detail, args.handoff)
+            results.append(result)
 
-    write_summary(results)
+    write_summary(results, args.detail, args.handoff)
 
     print(f"\n{'='*60}")
     print(f"DONE: {len(results)} images tested")
@@ -0,0 +1,112 @@
+"""Benchmark — badge evaluation cost per logged meal.
+
+Builds a synthetic year of meals and times three ways of keeping badges
+current as each one is logged:
+
+- indexed: the engine, which evaluates only the badges listening on the
+  meal's event keys;
+- every rule: the same incremental state, but every badge checked on
+  every meal;
+- rescan: every badge re-run over the whole history on each meal, which
+  is what evaluating badges on page load amounts to.
+
+The catalogue is inflated to ``--badges`` rules (per-food count badges
+over a larger food list) to show the cost as the rule set grows.
+
+Usage:
+    cd backend/
+    python bench_badges.py [--meals 1500] [--badges 1000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services import badges  # noqa: E402
+
+RESCAN_MEALS = 100
+
+
+def catalogue(size: int) -> list[badges.Badge]:
+    rules = list(badges.BADGES)
+    i = 0
+    while len(rules) < size:
+        food = f"food{i}"
+        for n in badges.FOOD_TARGETS:
+            rules.append(badges.Count(f"{food}_{n}", food, food, f"meal:{food}", n))
+        i += 1
+    return rules[:size]
+
+
+def events(count: int) -> list[badges.Event]:
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1, 8, tzinfo=timezone.utc)
+    out = []
+    for i in range(count):
+        at = start + timedelta(hours=i * 24 * 365 / count)
+        labels = rng.sample(badges.FOODS, 3)
+        metrics = {
+            "health_score": rng.uniform(3, 10),
+            "total_calories": rng.randint(200, 900),
+            "protein_g": rng.uniform(5, 40),
+        }
+        out.append(badges.Event("meal", at, at.date(), badges.meal_tags(labels, metrics)))
+    return out
+
+
+def indexed(engine: badges.Engine, stream: list[badges.Event]) -> float:
+    state: dict = {}
+    t0 = time.perf_counter()
+    for event in stream:
+        engine.evaluate(state, event)
+    return (time.perf_counter() - t0) / len(stream) * 1e6
+
+
+def every_rule(rules: list[badges.Badge], stream: list[badges.Event]) -> float:
+    state: dict = {"progress": {}, "earned": {}}
+    t0 = time.perf_counter()
+    for event in stream:
+        keys = set(event.keys())
+        for badge in rules:
+            if badge.key in state["earned"] or badge.on not in keys:
+                continue
+            if badge.update(state["progress"].setdefault(badge.key, {}), event):
+                state["earned"][badge.key] = event.at.isoformat()
+    return (time.perf_counter() - t0) / len(stream) * 1e6
+
+
+def rescan(engine: badges.Engine, stream: list[badges.Event]) -> float:
+    stream = stream[:RESCAN_MEALS]
+    t0 = time.perf_counter()
+    for n in range(1, len(stream) + 1):
+        state: dict = {}
+        for event in stream[:n]:
+            engine.evaluate(state, event)
+    return (time.perf_counter() - t0) / len(stream) * 1e6
+
+
+def main(meals: int, size: int) -> None:
+    stream = events(meals)
+    print(f"{meals} meals, {len(badges.BADGES)} shipped badges")
+    print(f"\n{'badges':>7} {'indexed µs':>11} {'every rule µs':>14} {f'rescan µs ({RESCAN_MEALS} meals)':>24}")
+    for n in sorted({len(badges.BADGES), size // 4, size}):
+        rules = catalogue(n)
+        engine = badges.Engine(rules)
+        print(
+            f"{len(rules):>7} {indexed(engine, stream):>11.1f} "
+            f"{every_rule(rules, stream):>14.1f} {rescan(engine, stream):>24.1f}"
+        )
+    print("\nRescan cost grows with history; the other two do not.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--meals", type=int, default=1500)
+    parser.add_argument("--badges", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.meals, args.badges)
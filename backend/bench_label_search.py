@@ -0,0 +1,150 @@
+"""Benchmark — food label search over a large, noisy item history.
+
+Generates ``--items`` food items whose labels are noisy variants of a
+few hundred base foods — plurals, trailing periods, capitalisation,
+accents, typos, portions — then times typo-tolerant search and
+autocomplete on the trigram index against a ``LIKE '%query%'`` scan of
+the same rows, and shows what each finds for a few misspelled queries.
+
+Usage:
+    cd backend/
+    python bench_label_search.py [--items 300000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="bench_labels_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir}/bench.sqlite3")
+
+from app.services import db, label_search  # noqa: E402
+from app.services.badges import FOODS  # noqa: E402
+
+USER = "bench-labels"
+REPEAT = 50
+EXTRA_FOODS = [
+    "crème brûlée", "olive", "carrot", "jalapeño", "café latte", "purée", "gnocchi",
+    "aloo gobi", "baingan bharta", "masala dosa", "butter chicken", "gulab jamun",
+]
+QUERIES = ["spinch", "carots", "olives.", "creme brulee", "panner", "chiken curry", "jalapeno"]
+PREFIXES = ["s", "pa", "chi", "cre", "butter c"]
+
+
+def base_foods() -> list[str]:
+    rng = random.Random(1)
+    foods = FOODS + EXTRA_FOODS
+    styles = ["curry", "salad", "soup", "fry", "masala", "tikka", "roll", "bowl", "paratha", "raita"]
+    combos = {f"{rng.choice(foods)} {rng.choice(styles)}" for _ in range(400)}
+    return foods + sorted(combos)
+
+
+def noisy(label: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.2:
+        label += "s"
+    elif roll < 0.3:
+        label += "."
+    elif roll < 0.35 and len(label) > 4:
+        i = rng.randrange(1, len(label) - 1)
+        label = label[:i] + label[i + 1:]  # dropped letter
+    elif roll < 0.4:
+        label = f"{label} ({rng.randint(1, 3)} cups)"
+    return label.title() if rng.random() < 0.5 else label
+
+
+def generate(count: int) -> list[str]:
+    rng = random.Random(0)
+    foods = base_foods()
+    weights = [1 / (rank + 1) for rank in range(len(foods))]  # a few foods dominate
+    return [noisy(food, rng) for food in rng.choices(foods, weights, k=count)]
+
+
+def timed(fn) -> float:
+    fn()
+    samples = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+async def timed_async(fn) -> float:
+    await fn()
+    samples = []
+    for _ in range(REPEAT // 5):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+async def like_scan(query: str) -> list:
+    async with db.get_db().acquire() as conn:
+        return await conn.fetch(
+            "SELECT label, count(*) AS n FROM food_items WHERE user_id = $1 "
+            "AND lower(label) LIKE $2 GROUP BY label ORDER BY n DESC LIMIT 10",
+            USER, f"%{query.lower()}%",
+        )
+
+
+async def main(count: int) -> None:
+    labels = generate(count)
+    counts = Counter(labels)
+    print(f"{count:,} items, {len(counts):,} distinct raw labels")
+
+    t0 = time.perf_counter()
+    index = label_search.LabelIndex()
+    for label, n in counts.items():
+        index.add(label, n)
+    print(f"Index built in {(time.perf_counter() - t0) * 1000:.0f} ms: "
+          f"{len(index.terms):,} terms, {len(index.foods):,} canonical labels, "
+          f"{len(index.postings):,} trigrams")
+
+    await db.connect()
+    created = datetime.now(timezone.utc)
+    async with db.get_db().transaction() as conn:
+        await conn.execute(
+            "INSERT INTO meals (id, user_id, logged_at, analysis) VALUES ($1, $2, $3, '{}')",
+            "bench-meal", USER, created,
+        )
+        await conn.executemany(
+            "INSERT INTO food_items (id, meal_id, user_id, label, created_at) VALUES ($1, $2, $3, $4, $5)",
+            [(uuid.uuid4().hex, "bench-meal", USER, label, created) for label in labels],
+        )
+
+    print(f"\n{'query':<14} {'trigram ms':>10} {'LIKE ms':>8}  top trigram hits / LIKE hits")
+    for query in QUERIES:
+        fuzzy_ms = timed(lambda: index.search(query))
+        like_ms = await timed_async(lambda: like_scan(query))
+        hits = [hit["label"] for hit in index.search(query, 3)]
+        like_hits = [row["label"] for row in await like_scan(query)][:2]
+        print(f"{query:<14} {fuzzy_ms:>10.2f} {like_ms:>8.1f}  {hits} / {like_hits}")
+
+    print(f"\n{'prefix':<14} {'complete ms':>11}  top completions")
+    for prefix in PREFIXES:
+        ms = timed(lambda: index.complete(prefix))
+        print(f"{prefix:<14} {ms:>11.3f}  {[hit['label'] for hit in index.complete(prefix, 4)]}")
+
+    await db.close()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=300_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.items))
@@ -0,0 +1,140 @@
+"""Benchmark — meal feed page latency vs history size, keyset vs OFFSET.
+
+Seeds a throwaway database with one user who has 50 meals and one who has
+50,000, then times fetching a page of 20 at the start and deep into each
+history, with and without filters.  Keyset pages should cost the same at
+any depth; the OFFSET baseline grows with it.
+
+Usage:
+    cd backend/
+    python bench_meal_feed.py                 # temporary SQLite file
+    DATABASE_URL=postgresql://… python bench_meal_feed.py
+"""
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="bench_feed_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir}/bench.sqlite3")
+
+from app.services import db, repository  # noqa: E402
+
+USERS = {"bench-small": 50, "bench-large": 50_000}
+LABELS = ["rice", "dal", "spinach", "roti", "paneer", "salad", "chicken", "curd", "apple", "pasta"]
+PAGE = 20
+REPEAT = 25
+
+
+async def seed(user_id: str, count: int) -> None:
+    rng = random.Random(count)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    meals, items = [], []
+    for i in range(count):
+        meal_id = uuid.uuid4().hex
+        logged_at = start + timedelta(minutes=i * 47 + rng.randint(0, 30))
+        score = round(rng.uniform(2, 10), 1)
+        meals.append((meal_id, user_id, logged_at, score, json.dumps({"health_score": str(score)})))
+        for label in rng.sample(LABELS, 2):
+            items.append((uuid.uuid4().hex, meal_id, user_id, label, logged_at))
+    async with db.get_db().transaction() as conn:
+        await conn.execute("DELETE FROM meals WHERE user_id = $1", user_id)
+        await conn.executemany(
+            "INSERT INTO meals (id, user_id, logged_at, health_score, analysis) "
+            "VALUES ($1, $2, $3, $4, $5)",
+            meals,
+        )
+        await conn.executemany(
+            "INSERT INTO food_items (id, meal_id, user_id, label, created_at) "
+            "VALUES ($1, $2, $3, $4, $5)",
+            items,
+        )
+
+
+async def timed(fn) -> float:
+    """Median wall time of ``fn()`` in milliseconds."""
+    await fn()  # warm caches and prepared statements
+    samples = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+async def cursor_at(user_id: str, offset: int) -> str | None:
+    """Cursor positioned just before row ``offset`` of the feed."""
+    if offset == 0:
+        return None
+    async with db.get_db().acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT logged_at, id FROM meals WHERE user_id = $1 "
+            "ORDER BY logged_at DESC, id DESC LIMIT 1 OFFSET $2",
+            user_id, offset - 1,
+        )
+    return repository.encode_cursor(row["logged_at"], row["id"])
+
+
+async def offset_page(user_id: str, offset: int) -> None:
+    """The same page built the OFFSET way, for comparison."""
+    async with db.get_db().acquire() as conn:
+        rows = await conn.fetch(
+            f"SELECT {repository.MEAL_COLUMNS} FROM meals WHERE user_id = $1 "
+            "ORDER BY logged_at DESC, id DESC LIMIT $2 OFFSET $3",
+            user_id, PAGE, offset,
+        )
+        items = await repository._items_by_meal(conn, [r["id"] for r in rows])
+    for row in rows:
+        repository._meal_record(row, items[row["id"]])
+
+
+async def main() -> None:
+    await db.connect()
+    print(f"Database: {db.get_db().dialect}")
+    for user_id, count in USERS.items():
+        t0 = time.time()
+        await seed(user_id, count)
+        print(f"Seeded {count:,} meals for {user_id} in {time.time() - t0:.1f}s")
+
+    print(f"\n{'user':<12} {'meals':>7} {'depth':>7} {'keyset ms':>10} {'offset ms':>10}")
+    for user_id, count in USERS.items():
+        for depth in sorted({0, count // 2, max(0, count - PAGE)}):
+            cursor = await cursor_at(user_id, depth)
+            keyset = await timed(
+                lambda: repository.list_meals(user_id, limit=PAGE, cursor=cursor)
+            )
+            offset = await timed(lambda: offset_page(user_id, depth))
+            print(f"{user_id:<12} {count:>7,} {depth:>7,} {keyset:>10.2f} {offset:>10.2f}")
+
+    since = datetime(2020, 6, 1, tzinfo=timezone.utc)
+    filters = {
+        "date range": {"since": since, "until": since + timedelta(days=30)},
+        "score 8-10": {"min_score": 8.0, "max_score": 10.0},
+        "label": {"label": "spinach"},
+    }
+    print(f"\n{'user':<12} {'filter':<11} {'page 1 ms':>10}")
+    for user_id, count in USERS.items():
+        for name, kwargs in filters.items():
+            ms = await timed(lambda: repository.list_meals(user_id, limit=PAGE, **kwargs))
+            print(f"{user_id:<12} {name:<11} {ms:>10.2f}")
+
+    async with db.get_db().transaction() as conn:
+        for user_id in USERS:
+            await conn.execute("DELETE FROM meals WHERE user_id = $1", user_id)
+    await db.close()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
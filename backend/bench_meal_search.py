@@ -0,0 +1,122 @@
+"""Benchmark — full-text meal search vs scanning the analysis text.
+
+Seeds a throwaway database with ``--meals`` meals whose analyses are
+assembled from a pool of realistic sentences, then times ranked
+full-text queries (with and without date/score filters) against a
+``LIKE '%term%'`` scan of the analysis column for the same words.
+
+Usage:
+    cd backend/
+    python bench_meal_search.py [--meals 50000]   # temporary SQLite file
+    DATABASE_URL=postgresql://… python bench_meal_search.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+_tmp_dir = tempfile.mkdtemp(prefix="bench_search_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir}/bench.sqlite3")
+
+from app.services import db, meal_search  # noqa: E402
+
+USER = "bench-search"
+REPEAT = 20
+DISHES = ["paneer tikka", "dal tadka", "palak paneer", "chicken biryani", "masala dosa", "poha",
+          "rajma chawal", "idli sambar", "aloo paratha", "grilled fish", "sprouts salad", "gulab jamun"]
+MOODS = ["steady energy through the afternoon", "likely energy crash an hour later",
+         "calm and satisfied", "sluggish and heavy", "alert and focused", "sugar spike then a dip"]
+NOTES = ["high in refined carbs", "good protein and fibre", "fried and oily", "balanced plate",
+         "low in vegetables", "rich in ghee and cream", "light and easy to digest"]
+QUERIES = ["paneer", "energy crash", "crashes", "fried oily", "biryani"]
+
+
+def analysis(rng: random.Random) -> dict:
+    dishes = rng.sample(DISHES, 2)
+    return {
+        "description": f"A plate of {dishes[0]} with {dishes[1]}.",
+        "items": "\n".join(f"- {d}" for d in dishes),
+        "rationale": f"This meal is {rng.choice(NOTES)} and {rng.choice(NOTES)}.",
+        "mood_impact": f"Expect {rng.choice(MOODS)}.",
+        "ideal_comparison": f"Compared to an ideal plate it is {rng.choice(NOTES)}.",
+        "summary": f"{dishes[0].title()}: {rng.choice(NOTES)}.",
+        "health_score": str(rng.randint(2, 10)),
+    }
+
+
+async def seed(count: int) -> None:
+    rng = random.Random(0)
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        a = analysis(rng)
+        rows.append((uuid.uuid4().hex, USER, start + timedelta(hours=i * 3), float(a["health_score"]), json.dumps(a)))
+    async with db.get_db().transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO meals (id, user_id, logged_at, health_score, analysis) VALUES ($1, $2, $3, $4, $5)",
+            rows,
+        )
+
+
+async def like_scan(query: str) -> list:
+    where = " AND ".join(f"lower(analysis) LIKE ${i + 2}" for i in range(len(query.split())))
+    async with db.get_db().acquire() as conn:
+        return await conn.fetch(
+            f"SELECT id FROM meals WHERE user_id = $1 AND {where} ORDER BY logged_at DESC LIMIT 20",
+            USER, *(f"%{word}%" for word in query.lower().split()),
+        )
+
+
+async def timed(fn) -> float:
+    await fn()
+    samples = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+async def main(count: int) -> None:
+    await db.connect()
+    print(f"Database: {db.get_db().dialect}")
+    t0 = time.time()
+    await seed(count)
+    print(f"Seeded {count:,} meals (index maintained on insert) in {time.time() - t0:.1f}s")
+
+    since = datetime(2022, 6, 1, tzinfo=timezone.utc)
+    print(f"\n{'query':<14} {'fts ms':>7} {'filtered ms':>12} {'LIKE ms':>8} {'LIKE hits':>10}  top snippet")
+    for query in QUERIES:
+        fts = await timed(lambda: meal_search.search(USER, query))
+        filtered = await timed(lambda: meal_search.search(
+            USER, query, since=since, until=since + timedelta(days=60), min_score=7
+        ))
+        like = await timed(lambda: like_scan(query))
+        hits = await meal_search.search(USER, query, limit=1)
+        like_hits = len(await like_scan(query))
+        snippet = hits[0]["snippet"] if hits else "-"
+        print(f"{query:<14} {fts:>7.2f} {filtered:>12.2f} {like:>8.2f} {like_hits:>10}  {snippet}")
+
+    async with db.get_db().transaction() as conn:
+        await conn.execute("DELETE FROM meals WHERE user_id = $1", USER)
+    await db.close()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--meals", type=int, default=50_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.meals))
@@ -0,0 +1,102 @@
+"""Benchmark — meal-timing analytics on synthetic histories.
+
+Generates a user who eats breakfast, lunch, dinner and the odd late
+snack for 1, 3 and 10 years in a DST timezone, then times the two
+stages of ``app.services.meal_timing``: resolving local time (UTC
+offsets) and the vectorized analysis.  Prints the clusters found for the
+3-year history and checks that every history's clusters match the
+generated meals (exit status 1 if not).
+
+Usage:
+    cd backend/
+    python bench_meal_timing.py [--timezone Europe/London]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services import meal_timing  # noqa: E402
+
+YEARS = [1, 3, 10]
+REPEAT = 20
+# (local minute, spread in minutes, probability per day)
+MEALS = [(8 * 60, 30, 0.9), (13 * 60 + 15, 40, 0.95), (20 * 60 + 30, 45, 0.95), (23 * 60 + 30, 40, 0.2)]
+# A found centre this close to a generated meal time recovers it
+CENTRE_TOLERANCE = 20
+
+
+def synthetic(years: int, offset_hours: float) -> np.ndarray:
+    """UTC epoch seconds of a meal history ending today, sorted."""
+    rng = np.random.default_rng(years)
+    days = years * 365
+    first = datetime.now(timezone.utc).date().toordinal() - days - date(1970, 1, 1).toordinal()
+    epoch = []
+    for minute, spread, probability in MEALS:
+        eaten = np.flatnonzero(rng.random(days) < probability) + first
+        local = eaten * 86_400 + (minute + rng.normal(0, spread, eaten.size)) * 60
+        epoch.append(local - offset_hours * 3600)
+    return np.sort(np.concatenate(epoch).astype(np.int64))
+
+
+def timed(fn) -> float:
+    fn()
+    samples = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def recovered(clusters: list[dict]) -> bool:
+    """One cluster per generated meal, each centred near its time of day."""
+    if len(clusters) != len(MEALS):
+        return False
+    centres = sorted(c["center_minute"] for c in clusters)
+    for centre, (minute, _spread, _probability) in zip(centres, sorted(MEALS)):
+        apart = abs(centre - minute) % 1440
+        if min(apart, 1440 - apart) > CENTRE_TOLERANCE:
+            return False
+    return True
+
+
+def main(tz: str) -> None:
+    print(f"Timezone {tz}\n")
+    print(f"{'years':>5} {'meals':>7} {'offsets ms':>11} {'analyze ms':>11} {'clusters':>9}")
+    ok = True
+    for years in YEARS:
+        epoch = synthetic(years, 0)
+        offsets = meal_timing.utc_offsets(epoch, tz)
+        epoch = epoch - offsets  # generated times are local; make them real UTC
+        offsets = meal_timing.utc_offsets(epoch, tz)
+        resolve = timed(lambda: meal_timing.utc_offsets(epoch, tz))
+        analyze = timed(lambda: meal_timing.analyze(epoch, offsets))
+        found = meal_timing.analyze(epoch, offsets)
+        ok &= recovered(found["clusters"])
+        status = "OK" if recovered(found["clusters"]) else "MISSED"
+        print(f"{years:>5} {len(epoch):>7,} {resolve:>11.2f} {analyze:>11.2f} {status:>9}")
+        if years == 3:
+            result = found
+
+    print("\n3-year clusters (generated: 08:00, 13:15, 20:30, 23:30 on 20% of days)")
+    for cluster in result["clusters"]:
+        print(f"  {cluster['label']:<10} {cluster['center']}  {cluster['meals']:>5} meals  ±{cluster['spread_minutes']:.0f} min")
+    summary = {k: v for k, v in result.items() if k != "clusters"}
+    print(f"  {summary}")
+    if not ok:
+        sys.exit("\nGenerated meal clusters were not recovered")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timezone", default="Europe/London")
+    args = parser.parse_args()
+    main(args.timezone)
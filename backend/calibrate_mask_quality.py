@@ -0,0 +1,125 @@
+"""Calibrate the mask-quality gate against recorded GPT verdicts.
+
+Reads the JSONL verdict log written by the GPT crop check
+(``app/services/mask_quality.py``) and picks the widest thresholds that
+keep the local decisions within ``--max-error`` of what GPT said.  Each
+verdict counts 1 / its ``checked_rate``: items in the uncertain band are
+always checked, confident ones only at the sample rate, so unweighted
+they would be under-represented next to the band.
+
+  high — lowest score above which GPT rejected at most max-error of items
+  low  — highest score below which GPT kept at most max-error of items
+
+Prints how many logged items each side would have decided locally, and
+with ``--write`` saves the thresholds where the pipeline picks them up.
+
+Usage:
+    cd backend/
+    python calibrate_mask_quality.py [--max-error 0.03] [--min-samples 20] [--write]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services import mask_quality  # noqa: E402
+
+
+def load(path: Path) -> list[tuple[float, bool, float]]:
+    """(score, GPT kept it, weight) per logged verdict, by score."""
+    records = []
+    for line in path.read_text().splitlines():
+        try:
+            entry = json.loads(line)
+            rate = float(entry.get("checked_rate", 1.0))
+            records.append((float(entry["score"]), bool(entry["gpt_keep"]), 1 / rate if rate > 0 else 1.0))
+        except (ValueError, KeyError):
+            continue  # torn or foreign line
+    return sorted(records)
+
+
+def pick_high(records: list[tuple[float, bool, float]], max_error: float, min_samples: int) -> float | None:
+    """Lowest score whose suffix (score ≥ it) GPT rejected at most max_error of, by weight."""
+    best = None
+    rejected = total = 0.0
+    for n, (score, keep, weight) in enumerate(reversed(records), 1):
+        total += weight
+        rejected += weight * (not keep)
+        if n >= min_samples and rejected / total <= max_error:
+            best = score
+    return best
+
+
+def pick_low(records: list[tuple[float, bool, float]], max_error: float, min_samples: int) -> float | None:
+    """Highest score whose prefix (score ≤ it) GPT kept at most max_error of, by weight."""
+    best = None
+    kept = total = 0.0
+    for n, (score, keep, weight) in enumerate(records, 1):
+        total += weight
+        kept += weight * keep
+        if n >= min_samples and kept / total <= max_error:
+            best = score
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log", type=Path, default=mask_quality.log_path())
+    parser.add_argument("--max-error", type=float, default=0.03)
+    parser.add_argument("--min-samples", type=int, default=20)
+    parser.add_argument("--write", action="store_true", help="save the thresholds for the pipeline")
+    args = parser.parse_args()
+
+    if not args.log.exists():
+        sys.exit(f"No verdict log at {args.log}")
+    records = load(args.log)
+    if len(records) < args.min_samples:
+        sys.exit(f"Only {len(records)} verdicts in {args.log}; need {args.min_samples}")
+
+    kept = sum(keep for _, keep, _ in records)
+    print(f"Verdicts: {len(records)} ({kept} kept, {len(records) - kept} rejected by GPT)")
+    current = mask_quality.thresholds()
+    if current is None:
+        print("Current thresholds: none (every item goes to GPT)")
+    else:
+        print(f"Current thresholds: low={current[0]} high={current[1]}")
+
+    high = pick_high(records, args.max_error, args.min_samples)
+    low = pick_low(records, args.max_error, args.min_samples)
+    if high is None:
+        high = 1.01  # nothing is safe to keep unchecked yet
+    if low is None or low >= high:
+        low = 0.0
+    # Weighted, so the shares estimate all items rather than logged ones
+    total = sum(weight for _, _, weight in records)
+    auto_keep = [(keep, weight) for score, keep, weight in records if score >= high]
+    auto_drop = [(keep, weight) for score, keep, weight in records if score <= low]
+    keep_weight = sum(weight for _, weight in auto_keep)
+    drop_weight = sum(weight for _, weight in auto_drop)
+    asked = total - keep_weight - drop_weight
+    keep_wrong = sum(weight for keep, weight in auto_keep if not keep)
+    drop_wrong = sum(weight for keep, weight in auto_drop if keep)
+
+    print(f"\nCalibrated (max error {args.max_error:.0%}): low={low} high={high}")
+    print(f"  kept locally:    {keep_weight / total:>5.0%} of items  ({keep_wrong / max(keep_weight, 1e-9):.1%} GPT had rejected)")
+    print(f"  dropped locally: {drop_weight / total:>5.0%} of items  ({drop_wrong / max(drop_weight, 1e-9):.1%} GPT had kept)")
+    print(f"  still asked:     {asked / total:>5.0%} of items")
+
+    if args.write:
+        path = mask_quality.calibration_path()
+        path.write_text(json.dumps({
+            "low": low,
+            "high": high,
+            "max_error": args.max_error,
+            "samples": len(records),
+            "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, indent=2))
+        print(f"\nWritten to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Local S3-compatible stand-in for development.
+
+Implements just enough of the S3 REST API for ``S3Storage`` (and browsers
+following presigned URLs): path-style object PUT/GET/HEAD/DELETE, single
+byte ranges on GET (boto3 downloads large objects in ranged parts) and
+multipart uploads.  Signatures are not checked and buckets are created on
+first write.  Objects live under ``backend/.local_s3/<bucket>/<key>``.
+
+Usage:
+    cd backend/
+    uvicorn local_s3:app --port 9000
+
+    # then, for the API:
+    STORAGE_BACKEND=s3 S3_ENDPOINT_URL=http://localhost:9000 \\
+    S3_ACCESS_KEY=local S3_SECRET_KEY=local uvicorn app.main:app
+"""
+
+import hashlib
+import json
+import re
+import shutil
+import uuid
+from pathlib import Path
+from xml.etree import ElementTree
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+DATA_DIR = Path(__file__).resolve().parent / ".local_s3"
+UPLOADS_DIR = DATA_DIR / ".multipart"
+
+app = FastAPI(title="local-s3")
+
+_CHUNK_HEADER_RE = re.compile(rb"^([0-9a-fA-F]+)(;[^\r\n]*)?\r\n")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+READ_CHUNK = 64 * 1024
+
+
+def _object_path(bucket: str, key: str) -> Path:
+    root = (DATA_DIR / bucket).resolve()
+    path = (root / key).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError("key escapes bucket")
+    return path
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_name(path.name + ".meta.json")
+
+
+def _error(status: int, code: str, message: str) -> Response:
+    body = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f"<Error><Code>{code}</Code><Message>{message}</Message></Error>"
+    )
+    return Response(body, status_code=status, media_type="application/xml")
+
+
+def _xml(body: str) -> Response:
+    return Response(
+        '<?xml version="1.0" encoding="UTF-8"?>' + body, media_type="application/xml"
+    )
+
+
+def _decode_aws_chunked(body: bytes) -> bytes:
+    """Strip aws-chunked framing (``<hex-size>[;ext]\\r\\n<data>\\r\\n`` ... ``0``)."""
+    out = bytearray()
+    pos = 0
+    while True:
+        match = _CHUNK_HEADER_RE.match(body, pos)
+        if not match:
+            break
+        size = int(match.group(1), 16)
+        pos = match.end()
+        if size == 0:
+            break  # trailing checksum headers follow; ignore them
+        out += body[pos:pos + size]
+        pos += size + 2
+    return bytes(out)
+
+
+async def _read_body(request: Request) -> bytes:
+    body = await request.body()
+    encoding = request.headers.get("content-encoding", "")
+    sha_header = request.headers.get("x-amz-content-sha256", "")
+    if "aws-chunked" in encoding or sha_header.startswith("STREAMING-"):
+        return _decode_aws_chunked(body)
+    return body
+
+
+def _write_object(path: Path, data: bytes, content_type: str, cache_control: str) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    etag = f'"{hashlib.md5(data).hexdigest()}"'
+    _meta_path(path).write_text(json.dumps({
+        "etag": etag,
+        "content_type": content_type,
+        "cache_control": cache_control,
+    }))
+    return etag
+
+
+@app.put("/{bucket}")
+async def create_bucket(bucket: str):
+    (DATA_DIR / bucket).mkdir(parents=True, exist_ok=True)
+    return Response(status_code=200)
+
+
+@app.head("/{bucket}")
+async def head_bucket(bucket: str):
+    return Response(status_code=200 if (DATA_DIR / bucket).is_dir() else 404)
+
+
+@app.put("/{bucket}/{key:path}")
+async def put_object(bucket: str, key: str, request: Request):
+    data = await _read_body(request)
+    upload_id = request.query_params.get("uploadId")
+    if upload_id:
+        part_dir = UPLOADS_DIR / upload_id
+        if not part_dir.is_dir():
+            return _error(404, "NoSuchUpload", "Unknown upload id")
+        part_number = int(request.query_params["partNumber"])
+        (part_dir / f"{part_number:05d}").write_bytes(data)
+        return Response(headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+    etag = _write_object(
+        _object_path(bucket, key),
+        data,
+        request.headers.get("content-type", "application/octet-stream"),
+        request.headers.get("cache-control", ""),
+    )
+    return Response(headers={"ETag": etag})
+
+
+@app.post("/{bucket}/{key:path}")
+async def multipart(bucket: str, key: str, request: Request):
+    if "uploads" in request.query_params:
+        upload_id = uuid.uuid4().hex
+        part_dir = UPLOADS_DIR / upload_id
+        part_dir.mkdir(parents=True)
+        (part_dir / "meta.json").write_text(json.dumps({
+            "bucket": bucket,
+            "key": key,
+            "content_type": request.headers.get("content-type", "application/octet-stream"),
+            "cache_control": request.headers.get("cache-control", ""),
+        }))
+        return _xml(
+            "<InitiateMultipartUploadResult>"
+            f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+            "</InitiateMultipartUploadResult>"
+        )
+
+    upload_id = request.query_params.get("uploadId")
+    part_dir = UPLOADS_DIR / upload_id if upload_id else None
+    if part_dir is None or not part_dir.is_dir():
+        return _error(404, "NoSuchUpload", "Unknown upload id")
+
+    # Assemble the parts the client lists, in the order it lists them
+    root = ElementTree.fromstring(await request.body())
+    numbers = [
+        int(el.text)
+        for el in root.iter()
+        if el.tag.rsplit("}", 1)[-1] == "PartNumber"
+    ]
+    meta = json.loads((part_dir / "meta.json").read_text())
+    data = b"".join((part_dir / f"{n:05d}").read_bytes() for n in numbers)
+    etag = _write_object(
+        _object_path(bucket, key), data, meta["content_type"], meta["cache_control"]
+    )
+    shutil.rmtree(part_dir, ignore_errors=True)
+    return _xml(
+        "<CompleteMultipartUploadResult>"
+        f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>{etag}</ETag>"
+        "</CompleteMultipartUploadResult>"
+    )
+
+
+def _byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """A single ``bytes=a-b`` / ``a-`` / ``-n`` range as inclusive (start, end).
+
+    None means "send the whole object" (no usable range); ValueError means
+    the range cannot be satisfied.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range starts past the end")
+    return start, end
+
+
+def _read_range(path: Path, start: int, length: int):
+    with path.open("rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(READ_CHUNK, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@app.api_route("/{bucket}/{key:path}", methods=["GET", "HEAD"])
+async def get_object(bucket: str, key: str, request: Request):
+    path = _object_path(bucket, key)
+    if not path.is_file():
+        if request.method == "HEAD":
+            return Response(status_code=404)
+        return _error(404, "NoSuchKey", "The specified key does not exist.")
+    meta = json.loads(_meta_path(path).read_text())
+    size = path.stat().st_size
+    headers = {"ETag": meta["etag"], "Accept-Ranges": "bytes"}
+    if meta["cache_control"]:
+        headers["Cache-Control"] = meta["cache_control"]
+
+    # boto3 downloads large objects as concurrent ranged GETs
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            byte_range = _byte_range(range_header, size)
+        except ValueError:
+            response = _error(416, "InvalidRange", "The requested range is not satisfiable.")
+            response.headers["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=meta["content_type"])
+    return StreamingResponse(
+        _read_range(path, start, end - start + 1),
+        status_code=status_code,
+        headers=headers,
+        media_type=meta["content_type"],
+    )
+
+
+@app.delete("/{bucket}/{key:path}")
+async def delete_object(bucket: str, key: str, request: Request):
+    upload_id = request.query_params.get("uploadId")
+    if upload_id:
+        shutil.rmtree(UPLOADS_DIR / upload_id, ignore_errors=True)
+        return Response(status_code=204)
+    path = _object_path(bucket, key)
+    path.unlink(missing_ok=True)
+    _meta_path(path).unlink(missing_ok=True)
+    return Response(status_code=204)
@@ -0,0 +1,47 @@
+"""Rebuild — recompute daily/weekly rollups, streaks and food stats from the meal log.
+
+Rollups are kept up to date on every insert and delete; this is the repair
+path (after a manual edit, a bulk import, or to check for drift).  Runs in
+one transaction, so dashboards never see a half-built state.  Day streaks
+are judged from the daily rollups, so they are recomputed in the same
+transaction, and so is the food library index (``food_stats``).
+
+Usage:
+    cd backend/
+    python rebuild_rollups.py [--user-id USER]   # default: every user
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services import db, food_stats, rollups, streaks
+
+
+async def main(user_id: str | None) -> None:
+    await db.connect()
+    t0 = time.time()
+    async with db.get_db().transaction() as conn:
+        days = await rollups.rebuild(conn, user_id)
+        users = [user_id] if user_id else [
+            r["user_id"] for r in await conn.fetch("SELECT DISTINCT user_id FROM meals")
+        ]
+        for user in users:
+            await streaks.recompute(conn, user)
+        labels = await food_stats.rebuild(conn, user_id)
+    print(
+        f"Rebuilt {days} day buckets and {labels} food labels for {user_id or 'all users'} "
+        f"in {time.time() - t0:.1f}s"
+    )
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.user_id))
@@ -0,0 +1,42 @@
+"""Replay — rebuild badge state from the meal history.
+
+Badge state is updated per logged meal; this re-runs every badge over a
+user's meals in logging order (after changing the catalogue, or to repair
+drift).  Each user is replayed in its own transaction.
+
+Usage:
+    cd backend/
+    python replay_badges.py [--user-id USER]   # default: every user
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services import badges, db
+
+
+async def main(user_id: str | None) -> None:
+    await db.connect()
+    t0 = time.time()
+    async with db.get_db().acquire() as conn:
+        users = [user_id] if user_id else [
+            r["user_id"] for r in await conn.fetch("SELECT DISTINCT user_id FROM meals")
+        ]
+    for user in users:
+        async with db.get_db().transaction() as conn:
+            state = await badges.replay(conn, user)
+        print(f"{user}: {len(state.get('earned', {}))} badges")
+    print(f"Replayed {len(users)} users in {time.time() - t0:.1f}s")
+    await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.user_id))
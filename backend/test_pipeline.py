@@ -30,7 +30,7 @@ from app.utils.image import (  # noqa: E402
     numpy_rgb_to_jpeg_bytes,
     resize_if_needed,
 )
-from app.utils.parsing import extract_item_names  # noqa: E402
+from app.utils.parsing import display_fields, item_names  # noqa: E402
 
 
 def find_test_image() -> Path | None:
@@ -67,19 +67,17 @@ def main():
     parsed, raw_text = analyze_food_image(image_bytes)
     gpt_time = time.time() - t0
     print(f"Time: {gpt_time:.2f}s")
-    for key, val in parsed.items():
+    for key, val in display_fields(parsed).items():
         preview = val[:120].replace("\n", " ") + ("..." if len(val) > 120 else "")
         print(f"  {key}: {preview}")
 
-    item_names = extract_item_names(parsed.get("items", ""))
-    if not item_names:
-        item_names = ["food"]
-    print(f"\nExtracted items: {item_names}")
+    names = item_names(parsed) or ["food"]
+    print(f"\nExtracted items: {names}")
 
     # --- Step 2: YOLO-World-XL Detection ---
     print("\n=== Step 2: YOLO-World-XL Detection ===")
     t1 = time.time()
-    yolo_boxes = detect_with_yolo_world(image_bytes, class_names=item_names)
+    yolo_boxes = detect_with_yolo_world(image_bytes, class_names=names)
     yolo_time = time.time() - t1
     print(f"Time: {yolo_time:.2f}s")
     print(f"Detections: {len(yolo_boxes)}")
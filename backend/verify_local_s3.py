@@ -0,0 +1,122 @@
+"""Verify — round-trip objects through ``S3Storage`` against the local stand-in.
+
+Starts ``local_s3`` on a free port with a temporary data directory and
+checks that what goes up comes back byte for byte: a small object (single
+PUT / GET) and one above the multipart threshold, which boto3 uploads in
+parts and downloads as concurrent ranged GETs.  Also checks the stand-in's
+206 / 416 answers to single ranges directly.
+
+Usage:
+    cd backend/
+    python verify_local_s3.py [--size-mb 12]
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+import local_s3  # noqa: E402
+from app.services.storage import S3Storage  # noqa: E402
+
+THRESHOLD = 8 * 1024 * 1024
+BUCKET = "verify"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(local_s3.app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            sys.exit("local_s3 did not start")
+        time.sleep(0.05)
+    return server
+
+
+def _check(name: str, ok: bool, detail: str = "") -> bool:
+    print(f"  {'OK  ' if ok else 'FAIL'} {name}{f' — {detail}' if detail and not ok else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=12, help="large object size (above 8 MB)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local_s3.DATA_DIR = Path(tmp)
+        local_s3.UPLOADS_DIR = Path(tmp) / ".multipart"
+        port = _free_port()
+        server = _serve(port)
+        endpoint = f"http://127.0.0.1:{port}"
+        storage = S3Storage(
+            BUCKET, endpoint_url=endpoint, access_key="local", secret_key="local",
+            multipart_threshold=THRESHOLD, multipart_chunksize=THRESHOLD,
+        )
+        storage.client.create_bucket(Bucket=BUCKET)
+
+        ok = True
+        print(f"Round trips via {endpoint}")
+        for label, size in (("small", 64 * 1024), ("large", int(args.size_mb * 1024 * 1024))):
+            data = os.urandom(size)
+            key = f"originals/{label}.bin"
+            storage.put(key, data, "application/octet-stream")
+            out = io.BytesIO()
+            storage.download_to(key, out)
+            got = out.getvalue()
+            ok &= _check(
+                f"{label} ({size / 1024 / 1024:.1f} MB) download_to",
+                hashlib.sha256(got).digest() == hashlib.sha256(data).digest(),
+                f"{len(got)} bytes back",
+            )
+            ok &= _check(f"{label} get", storage.get(key) == data)
+
+        print("Ranges")
+        url = f"{endpoint}/{BUCKET}/originals/small.bin"
+        data = storage.get("originals/small.bin")
+        size = len(data)
+        for header, status, body in (
+            ("bytes=10-19", 206, data[10:20]),
+            ("bytes=65530-", 206, data[65530:]),
+            ("bytes=-5", 206, data[-5:]),
+            ("bytes=60000-999999", 206, data[60000:]),
+        ):
+            response = httpx.get(url, headers={"Range": header})
+            ok &= _check(
+                header,
+                response.status_code == status
+                and response.content == body
+                and response.headers["content-length"] == str(len(body)),
+                f"{response.status_code}, {len(response.content)} bytes",
+            )
+        response = httpx.get(url, headers={"Range": f"bytes={size}-"})
+        ok &= _check(
+            "unsatisfiable range",
+            response.status_code == 416 and response.headers.get("content-range") == f"bytes */{size}",
+            str(response.status_code),
+        )
+
+        server.should_exit = True
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
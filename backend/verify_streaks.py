@@ -0,0 +1,54 @@
+"""Verify — compare stored streak state with a full recompute.
+
+Streaks are updated incrementally on every meal insert and delete; this
+walks each user's history from scratch and reports the rules whose stored
+state disagrees.  ``--fix`` writes the recomputed state back.
+
+Usage:
+    cd backend/
+    python verify_streaks.py [--user-id USER] [--fix]   # default: every user
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services import db, streaks
+
+
+async def main(user_id: str | None, fix: bool) -> None:
+    await db.connect()
+    t0 = time.time()
+    async with db.get_db().acquire() as conn:
+        if user_id:
+            users = [user_id]
+        else:
+            users = [r["user_id"] for r in await conn.fetch(
+                "SELECT user_id FROM meals UNION SELECT user_id FROM streaks"
+            )]
+
+    drifted = 0
+    for user in users:
+        async with db.get_db().transaction() as conn:
+            mismatched = await streaks.verify(conn, user)
+            if mismatched and fix:
+                await streaks.recompute(conn, user)
+        if mismatched:
+            drifted += 1
+            print(f"{user}: {', '.join(mismatched)}{' (fixed)' if fix else ''}")
+    print(f"Checked {len(users)} users in {time.time() - t0:.1f}s, {drifted} with drift")
+    await db.close()
+    if drifted and not fix:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", default=None)
+    parser.add_argument("--fix", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.user_id, args.fix))
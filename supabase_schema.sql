@@ -32,3 +32,129 @@ create policy "Allow all actions for now"
 on public.food_logs
 for all
 using (true);
+
+-- Meal log (used by the API; app/services/schema.py creates the same tables)
+create table if not exists public.meals (
+  id text primary key,
+  user_id text not null,
+  logged_at timestamptz not null default now(),
+  image_url text,
+  visualization_url text,
+  health_score real,
+  analysis jsonb not null default '{}'::jsonb,
+  -- Typed metrics, parsed once at ingest
+  total_calories integer,
+  satiety_score real,
+  bloat_score real,
+  tasty_score real,
+  addiction_score real,
+  protein_g real,
+  fat_g real,
+  carbs_g real,
+  eat_frequency text check (eat_frequency in ('daily', 'occasional', 'rare')),
+  -- User's timezone at logging time and the local calendar day there
+  tz text,
+  local_day date,
+  -- Full-text index over the analysis text (app/services/meal_search.py)
+  search tsvector generated always as (
+    setweight(to_tsvector('english', coalesce(analysis->>'description', '') || ' ' || coalesce(analysis->>'items', '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(analysis->>'summary', '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(analysis->>'calories', '') || ' ' || coalesce(analysis->>'rationale', '') || ' ' ||
+      coalesce(analysis->>'ideal_comparison', '') || ' ' || coalesce(analysis->>'mood_impact', '')), 'C')
+  ) stored
+);
+
+create index if not exists meals_user_feed on public.meals (user_id, logged_at desc, id desc, health_score);
+create index if not exists meals_search on public.meals using gin (search);
+create index if not exists meals_user_local_day on public.meals (user_id, local_day);
+
+create table if not exists public.food_items (
+  id text primary key,
+  meal_id text not null references public.meals (id) on delete cascade,
+  user_id text not null,
+  label text not null default '',
+  crop_url text,
+  confidence real not null default 1.0,
+  liked boolean not null default false,
+  created_at timestamptz not null default now(),
+  canonical_label text
+);
+
+create index if not exists food_items_meal on public.food_items (meal_id);
+create index if not exists food_items_user_created_at on public.food_items (user_id, created_at desc);
+create index if not exists food_items_meal_label on public.food_items (meal_id, lower(label));
+create index if not exists food_items_user_canonical on public.food_items (user_id, canonical_label, created_at);
+
+-- Dashboard rollups, maintained with every meal insert/delete
+-- (app/services/rollups.py); weekly buckets start on the ISO Monday
+create table if not exists public.daily_rollups (
+  user_id text not null,
+  day date not null,
+  meal_count integer not null default 0,
+  health_sum real not null default 0,
+  health_count integer not null default 0,
+  health_min real,
+  health_max real,
+  calories_sum integer not null default 0,
+  calories_count integer not null default 0,
+  satiety_sum real not null default 0,
+  satiety_count integer not null default 0,
+  bloat_sum real not null default 0,
+  bloat_count integer not null default 0,
+  primary key (user_id, day)
+);
+
+create table if not exists public.weekly_rollups (
+  user_id text not null,
+  week_start date not null,
+  meal_count integer not null default 0,
+  health_sum real not null default 0,
+  health_count integer not null default 0,
+  health_min real,
+  health_max real,
+  calories_sum integer not null default 0,
+  calories_count integer not null default 0,
+  satiety_sum real not null default 0,
+  satiety_count integer not null default 0,
+  bloat_sum real not null default 0,
+  bloat_count integer not null default 0,
+  primary key (user_id, week_start)
+);
+
+-- Streak state per user and rule (app/services/streaks.py)
+create table if not exists public.streaks (
+  user_id text not null,
+  rule text not null,
+  current_run integer not null default 0,
+  best_run integer not null default 0,
+  last_day date,
+  last_meal_at timestamptz,
+  last_meal_id text,
+  primary key (user_id, rule)
+);
+
+-- Food library index per user and canonical label (app/services/food_stats.py);
+-- recent is a JSON array of per-day meal counts, slot 0 = recent_day
+create table if not exists public.food_stats (
+  user_id text not null,
+  label text not null,
+  meals integer not null default 0,
+  first_seen timestamptz,
+  last_seen timestamptz,
+  health_sum real not null default 0,
+  health_count integer not null default 0,
+  liked_count integer not null default 0,
+  recent_day date,
+  recent text not null default '[]',
+  primary key (user_id, label)
+);
+
+create index if not exists food_stats_user_meals on public.food_stats (user_id, meals desc, label);
+create index if not exists food_stats_user_last_seen on public.food_stats (user_id, last_seen desc, label);
+
+-- Badge progress and earned badges, one JSON document per user
+-- (app/services/badges.py)
+create table if not exists public.badge_state (
+  user_id text primary key,
+  state jsonb not null default '{}'::jsonb
+);